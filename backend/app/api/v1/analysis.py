@@ -1,177 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
 from typing import List
 from uuid import UUID
-import asyncio
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
 
-from app.core.database import get_async_db, AsyncSessionLocal
-from app.models.analysis import AnalysisRun, ApiChange, Impact, AnalysisStatus, ChangeType, Severity, RiskLevel
+from app.core.database import get_async_db
+from app.models.analysis import AnalysisRun, ApiChange, Impact, AnalysisStatus
+from app.models.organization import Organization
 from app.models.service import ApiSpecVersion, Service
-from app.models.consumer import ConsumerDependency, Consumer
 from app.schemas import analysis as schemas
-from app.core.diff_engine import DiffEngine
+from app.core.config import settings
+from app.services.job_queue import JOB_ANALYSIS_BATCH, JOB_ANALYSIS_RUN, enqueue_job, queue_stats
 
 router = APIRouter()
 
-# --- Background Task Worker ---
+# Analysis runs are executed by the worker processes, see app.services.analysis_runner
 
-async def process_analysis_run_task(
-    run_id: UUID, 
-    old_spec_id: UUID, 
-    new_spec_id: UUID
-):
-    """
-    Async Background worker to perform diff and impact analysis.
-    Uses its own AsyncSession to ensure thread/task safety.
-    """
-    print(f"Worker: Starting Analysis Run {run_id}")
-    async with AsyncSessionLocal() as db:
-        try:
-            # 1. Fetch Specs
-            # Use separate queries or aliases? ORM is fine here.
-            stmt = select(ApiSpecVersion).where(ApiSpecVersion.id.in_([old_spec_id, new_spec_id]))
-            result = await db.execute(stmt)
-            specs = {s.id: s for s in result.scalars().all()}
-            
-            old_spec = specs.get(old_spec_id)
-            new_spec = specs.get(new_spec_id)
-            
-            if not old_spec or not new_spec:
-                print(f"Worker: Specs not found for run {run_id}")
-                await _mark_run_failed(db, run_id, "One or both specs not found")
-                return
-
-            # 2. Perform Diff (CPU Bound - Run in Executor to avoid blocking event loop)
-            # We create a wrapper to run the synchronous DiffEngine
-            loop = asyncio.get_running_loop()
-            
-            def run_diff():
-                engine = DiffEngine()
-                return engine.compute_diff(old_spec.raw_spec, new_spec.raw_spec)
-
-            changes_detected = await loop.run_in_executor(None, run_diff)
-            
-            print(f"Worker: Detected {len(changes_detected)} changes")
-
-            # 3. Process Changes and Calculate Impact (IO Bound - Async DB)
-            has_breaking = False
-            total_impacts = 0
-
-            for change_dict in changes_detected:
-                # Create ApiChange record
-                change = ApiChange(
-                    analysis_run_id=run_id,
-                    service_id=new_spec.service_id,
-                    old_spec_id=old_spec.id,
-                    new_spec_id=new_spec.id,
-                    organization_id=new_spec.organization_id,
-                    change_type=change_dict["change_type"],
-                    severity=change_dict["severity"],
-                    http_method=change_dict.get("http_method"), 
-                    path=change_dict.get("path"),
-                    description=change_dict.get("description")
-                )
-                db.add(change)
-                # Need ID for Impact fk, but flushing in loop is ok for batch of this size
-                await db.flush() 
-                await db.refresh(change)
+async def _pending_run(db, old_spec_id, new_spec_id):
+    """The run of a spec pair still queued or running, if any"""
+    result = await db.execute(select(AnalysisRun).where(
+        AnalysisRun.old_spec_id == old_spec_id,
+        AnalysisRun.new_spec_id == new_spec_id,
+        AnalysisRun.status == AnalysisStatus.PENDING
+    ))
+    return result.scalars().first()
 
-                if change.severity == Severity.HIGH:
-                    has_breaking = True
-
-                # Impact Analysis
-                # Find consumers using this endpoint (Service -> Dependency)
-                service_id = new_spec.service_id
-                
-                if change.path:
-                    # If http_method is specified, filter by it. 
-                    # If it's None (Path removal), find ALL dependencies on this path.
-                    stmt_deps = select(ConsumerDependency).where(
-                        ConsumerDependency.service_id == service_id,
-                        ConsumerDependency.path == change.path,
-                        ConsumerDependency.is_deleted == False
-                    )
-                    if change.http_method:
-                        # Case-insensitive comparison (deps stored as lowercase, changes as uppercase)
-                        stmt_deps = stmt_deps.where(
-                            func.upper(ConsumerDependency.http_method) == change.http_method.upper()
-                        )
-                    
-                    result_deps = await db.execute(stmt_deps)
-                    dependencies = result_deps.scalars().all()
-                    
-                    for dep in dependencies:
-                        # Determine Risk
-                        risk = RiskLevel.HIGH if change.severity == Severity.HIGH else RiskLevel.LOW
-                        
-                        impact = Impact(
-                            analysis_run_id=run_id,
-                            api_change_id=change.id,
-                            consumer_id=dep.consumer_id,
-                            consumer_name=dep.consumer_name,
-                            organization_id=new_spec.organization_id,
-                            risk_level=risk
-                        )
-                        db.add(impact)
-                        total_impacts += 1
-
-            # 4. Finalize Run
-            stmt_run = select(AnalysisRun).where(AnalysisRun.id == run_id)
-            result_run = await db.execute(stmt_run)
-            run = result_run.scalars().first()
-            
-            if run:
-                run.status = AnalysisStatus.SUCCESS
-                run.result_summary = f"Detected {len(changes_detected)} changes, {total_impacts} impacted consumers."
-                
-                db.add(run)
-                await db.commit()
-                print(f"Worker: Run {run_id} completed successfully.")
-
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            print(f"Worker: Error processing run {run_id}: {e}")
-            await db.rollback()
-            await _mark_run_failed(db, run_id, str(e))
-
-async def _mark_run_failed(db, run_id, error_msg):
-    try:
-        stmt = select(AnalysisRun).where(AnalysisRun.id == run_id)
-        result = await db.execute(stmt)
-        run = result.scalars().first()
-        if run:
-            run.status = AnalysisStatus.FAILED
-            run.result_summary = f"Error: {error_msg}"
-            db.add(run)
-            await db.commit()
-    except Exception as e:
-        print(f"Worker: Critical failure marking run failed: {e}")
+async def _cancel_superseded_runs(db, service_id, new_spec_id):
+    """Cancel the pending auto-selected runs of a service whose new spec is older than `new_spec_id`"""
+    new_created_at = select(ApiSpecVersion.created_at).where(ApiSpecVersion.id == new_spec_id).scalar_subquery()
+    older_specs = select(ApiSpecVersion.id).where(
+        ApiSpecVersion.service_id == service_id,
+        ApiSpecVersion.created_at < new_created_at
+    )
+    await db.execute(update(AnalysisRun).where(
+        AnalysisRun.service_id == service_id,
+        AnalysisRun.status == AnalysisStatus.PENDING,
+        AnalysisRun.auto_selected == True,
+        AnalysisRun.new_spec_id.in_(older_specs)
+    ).values(
+        status=AnalysisStatus.CANCELLED,
+        completed_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False))
 
+async def _admit_runs(db, organization_id, count):
+    """Refuse `count` new runs with 429 if the organization already has its limit of runs queued or running"""
+    limit = select(Organization.analysis_max_pending).where(Organization.id == organization_id).scalar_subquery()
+    result = await db.execute(select(
+        func.count(AnalysisRun.id),
+        func.coalesce(limit, settings.ANALYSIS_ORG_MAX_PENDING)
+    ).where(
+        AnalysisRun.organization_id == organization_id,
+        AnalysisRun.status == AnalysisStatus.PENDING
+    ))
+    pending, max_pending = result.first()
+    if pending + count > max_pending:
+        raise HTTPException(
+            status_code=429,
+            detail=f"The organization has {pending} analysis runs queued or running (limit {max_pending}), retry later",
+            headers={"Retry-After": str(settings.ANALYSIS_QUEUE_RETRY_AFTER_SECONDS)}
+        )
 
 # --- API Endpoints ---
 
 @router.post("/runs/", response_model=schemas.AnalysisRun)
 async def trigger_analysis_run(
     run_in: schemas.AnalysisRunCreate, 
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_async_db)
 ):
     """
     Trigger a new analysis execution.
     1. Basic validation.
     2. Create PENDING AnalysisRun.
-    3. Dispatch Background Task.
+    3. Queue its job (same transaction) for the analysis workers; 429 with
+       Retry-After if the organization's queue is full.
     4. Return Run immediately.
     """
     # Validate or Auto-Select Specs
     old_id = run_in.old_spec_id
     new_id = run_in.new_spec_id
+    auto_selected = not old_id or not new_id
     
     if not old_id or not new_id:
         # Fetch latest 2 specs for the service
@@ -211,6 +121,17 @@ async def trigger_analysis_run(
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
 
+    # Coalesce: the same pair still queued or running is answered with that run
+    existing = await _pending_run(db, old_id, new_id)
+    if existing:
+        return existing
+
+    # Runs picked for an older "latest" spec are stale now
+    if auto_selected and settings.ANALYSIS_CANCEL_SUPERSEDED_RUNS:
+        await _cancel_superseded_runs(db, run_in.service_id, new_id)
+
+    await _admit_runs(db, specs[0].organization_id, 1)
+
     # Create Run Record
     new_run = AnalysisRun(
         service_id=specs[0].service_id,
@@ -218,23 +139,109 @@ async def trigger_analysis_run(
         old_spec_id=old_id,
         new_spec_id=new_id,
         status=AnalysisStatus.PENDING,
+        auto_selected=auto_selected,
         organization_id=specs[0].organization_id,
         started_at=datetime.utcnow()
     )
     db.add(new_run)
+    try:
+        await db.flush()
+    except IntegrityError:
+        # A concurrent request created the same run first (uq_analysis_runs_pending_pair)
+        await db.rollback()
+        existing = await _pending_run(db, old_id, new_id)
+        if existing:
+            return existing
+        raise
+
+    # Queue the job with the run: a run never exists without its job
+    enqueue_job(db, JOB_ANALYSIS_RUN, {
+        "run_id": str(new_run.id),
+        "old_spec_id": str(old_id),
+        "new_spec_id": str(new_id)
+    }, organization_id=new_run.organization_id)
     await db.commit()
     await db.refresh(new_run)
 
-    # Dispatch Background Task
-    # Note: background_tasks.add_task works with async functions too.
-    background_tasks.add_task(
-        process_analysis_run_task, 
-        new_run.id, 
-        old_id, 
-        new_id
+    return new_run
+
+@router.post("/runs/batch/", response_model=List[schemas.AnalysisRun])
+async def trigger_batch_analysis_run(
+    batch_in: schemas.AnalysisRunBatchCreate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Compare one base spec against several candidate specs (e.g. release branches).
+    Creates one PENDING AnalysisRun per candidate; all of them are diffed by a
+    single queued job that decodes and resolves the base only once.
+    """
+    candidate_ids = list(dict.fromkeys(batch_in.candidate_spec_ids))
+    if not candidate_ids:
+        raise HTTPException(status_code=400, detail="At least one candidate spec is required")
+    if len(candidate_ids) > settings.ANALYSIS_BATCH_MAX_CANDIDATES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.ANALYSIS_BATCH_MAX_CANDIDATES} candidate specs per batch")
+    if batch_in.base_spec_id in candidate_ids:
+        raise HTTPException(status_code=400, detail="The base spec cannot also be a candidate")
+
+    stmt = select(ApiSpecVersion.id, ApiSpecVersion.service_id, ApiSpecVersion.organization_id).where(
+        ApiSpecVersion.id.in_([batch_in.base_spec_id] + candidate_ids)
     )
+    result = await db.execute(stmt)
+    specs = result.all()
+    if len(specs) != len(candidate_ids) + 1:
+        raise HTTPException(status_code=404, detail="One or more spec versions not found")
+    if any(spec.service_id != batch_in.service_id for spec in specs):
+        raise HTTPException(status_code=400, detail="Specs do not belong to the specified service")
 
-    return new_run
+    result_svc = await db.execute(select(Service).where(Service.id == batch_in.service_id))
+    service = result_svc.scalars().first()
+    if not service:
+        raise HTTPException(status_code=404, detail="Service not found")
+
+    # Candidates with a run still queued or running are answered with that run
+    result = await db.execute(select(AnalysisRun).where(
+        AnalysisRun.old_spec_id == batch_in.base_spec_id,
+        AnalysisRun.new_spec_id.in_(candidate_ids),
+        AnalysisRun.status == AnalysisStatus.PENDING
+    ))
+    pending = {run.new_spec_id: run for run in result.scalars().all()}
+
+    runs = [
+        AnalysisRun(
+            service_id=service.id,
+            service_name=service.name,
+            old_spec_id=batch_in.base_spec_id,
+            new_spec_id=candidate_id,
+            status=AnalysisStatus.PENDING,
+            organization_id=service.organization_id,
+            started_at=datetime.utcnow()
+        )
+        for candidate_id in candidate_ids if candidate_id not in pending
+    ]
+    if runs:
+        await _admit_runs(db, service.organization_id, len(runs))
+        db.add_all(runs)
+        try:
+            await db.flush()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="Some of these runs are being created by a concurrent request, retry")
+
+        enqueue_job(db, JOB_ANALYSIS_BATCH, {
+            "base_spec_id": str(batch_in.base_spec_id),
+            "runs": [[str(run.id), str(run.new_spec_id)] for run in runs]
+        }, organization_id=service.organization_id)
+        await db.commit()
+        for run in runs:
+            await db.refresh(run)
+
+    created = {run.new_spec_id: run for run in runs}
+    return [pending.get(candidate_id) or created[candidate_id] for candidate_id in candidate_ids]
+
+@router.get("/queue/", response_model=schemas.AnalysisQueueStats)
+async def get_queue_stats(db: AsyncSession = Depends(get_async_db)):
+    """Depth of the analysis job queue, for monitoring and worker autoscaling"""
+    return await queue_stats(db)
 
 @router.get("/runs/")
 async def list_analysis_runs(
@@ -285,8 +292,14 @@ async def get_analysis_run(run_id: UUID, db: AsyncSession = Depends(get_async_db
 @router.get("/changes/", response_model=List[schemas.ApiChange])
 async def list_api_changes(
     analysis_run_id: UUID, 
+    after_seq: int = Query(None, ge=-1),
+    limit: int = Query(None, ge=1, le=1000),
     db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    Changes of a run in order. Page with `after_seq` (the last seq received)
+    and `limit`; pages are stable while the run is still storing changes.
+    """
     # Verify run exists
     result = await db.execute(select(AnalysisRun).where(AnalysisRun.id == analysis_run_id))
     run = result.scalars().first()
@@ -295,6 +308,11 @@ async def list_api_changes(
          
     # Query changes directly by analysis_run_id (fixes duplication bug)
     query = select(ApiChange).where(ApiChange.analysis_run_id == analysis_run_id)
+    if after_seq is not None:
+        query = query.where(ApiChange.seq > after_seq)
+    query = query.order_by(ApiChange.seq, ApiChange.created_at)
+    if limit is not None:
+        query = query.limit(limit)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -8,6 +8,7 @@ from app.core.database import get_async_db
 from app.models.consumer import Consumer, ConsumerDependency
 from app.models.service import Service
 from app.schemas import consumer as schemas
+from app.services.dependency_index import invalidate_dependency_index
 
 router = APIRouter()
 
@@ -113,6 +114,7 @@ async def add_dependency(
             existing.is_deleted = False
             db.add(existing)
             await db.commit()
+            invalidate_dependency_index(existing.service_id)
             await db.refresh(existing)
             return existing
         else:
@@ -134,6 +136,7 @@ async def add_dependency(
     )
     db.add(dep)
     await db.commit()
+    invalidate_dependency_index(dep.service_id)
     await db.refresh(dep)
     return dep
 
@@ -163,5 +166,6 @@ async def remove_dependency(
     dep.is_deleted = True
     db.add(dep)
     await db.commit()
+    invalidate_dependency_index(dep.service_id)
     await db.refresh(dep)
     return dep
@@ -5,11 +5,27 @@ from typing import List
 from uuid import UUID
 
 from app.core.database import get_async_db
+from app.core.diff_rules import parse_rule_settings
 from app.models.organization import Organization
 from app.schemas import organization as schemas
 
 router = APIRouter()
 
+def _check_diff_rules(diff_rules):
+    if diff_rules is None:
+        return
+    try:
+        parse_rule_settings(diff_rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _check_analysis_limits(values):
+    if "analysis_weight" in values and (values["analysis_weight"] is None or values["analysis_weight"] < 1):
+        raise HTTPException(status_code=400, detail="analysis_weight must be at least 1")
+    for field in ("analysis_max_running", "analysis_max_pending"):
+        if values.get(field) is not None and values[field] < 1:
+            raise HTTPException(status_code=400, detail=f"{field} must be at least 1, or null for the default")
+
 @router.post("/", response_model=schemas.Organization)
 async def create_organization(org_in: schemas.OrganizationCreate, db: AsyncSession = Depends(get_async_db)):
     # Check for existing
@@ -17,6 +33,8 @@ async def create_organization(org_in: schemas.OrganizationCreate, db: AsyncSessi
     if result.scalars().first():
         raise HTTPException(status_code=400, detail="Organization slug already registered")
         
+    _check_diff_rules(org_in.dict().get("diff_rules"))
+    _check_analysis_limits(org_in.dict())
     organization = Organization(**org_in.dict())
     db.add(organization)
     await db.commit()
@@ -55,7 +73,10 @@ async def update_organization(
     if organization is None:
         raise HTTPException(status_code=404, detail="Organization not found")
         
-    for field, value in org_in.dict(exclude_unset=True).items():
+    updates = org_in.dict(exclude_unset=True)
+    _check_diff_rules(updates.get("diff_rules"))
+    _check_analysis_limits(updates)
+    for field, value in updates.items():
         setattr(organization, field, value)
         
     db.add(organization)
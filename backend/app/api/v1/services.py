@@ -1,19 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
 from uuid import UUID
 import json
 import hashlib
+import asyncio
 
 from app.core.database import get_async_db
+from app.core.fingerprint import compute_fingerprints, path_delta
+from app.core.spec_index import build_spec_index
+from app.core.spec_normalizer import normalized_or_none
 from app.models.service import Service, ApiSpecVersion
 from app.models.organization import Organization
 from app.schemas import service as schemas
 from app.schemas import consumer as consumer_schemas
+from app.core.config import settings
+from app.services.job_queue import JOB_AUTO_ANALYSIS, JOB_VERSION_DELTA, enqueue_job
 
 router = APIRouter()
 
+def _precompute_spec(raw_spec: Dict[str, Any], parent_fingerprints: Optional[Dict[str, Any]] = None):
+    """
+    Everything the analysis worker needs besides the raw spec, computed once at upload:
+    (normalized spec or None if already OpenAPI 3, fingerprints, index, paths changed
+    since the parent version or None). Fingerprints and index describe the normalized document.
+    """
+    normalized = normalized_or_none(raw_spec)
+    spec = normalized if normalized is not None else raw_spec
+    fingerprints = compute_fingerprints(spec)
+    delta = path_delta(parent_fingerprints, fingerprints) if parent_fingerprints is not None else None
+    return normalized, fingerprints, build_spec_index(spec, fingerprints), delta
+
 # --- Services ---
 
 @router.post("/", response_model=schemas.Service)
@@ -125,16 +143,50 @@ async def upload_spec(
         # Found exact same content
         raise HTTPException(status_code=409, detail="This spec content has already been uploaded for this service")
 
+    # The previous upload is this version's parent in the service's version chain
+    result = await db.execute(select(ApiSpecVersion.id, ApiSpecVersion.fingerprints).filter(
+        ApiSpecVersion.service_id == service_id,
+        ApiSpecVersion.is_deleted == False
+    ).order_by(ApiSpecVersion.created_at.desc()).limit(1))
+    parent = result.first()
+
+    # Swagger 2 uploads are converted to OpenAPI 3 once, here, and every later diff
+    # uses the stored result. Subtree fingerprints let the diff engine skip unchanged
+    # paths/operations later, the flattened index lets it diff operations and
+    # parameters without the raw spec.
+    # All of it is CPU bound on large specs, keep it off the event loop.
+    loop = asyncio.get_running_loop()
+    normalized_spec, fingerprints, spec_index, delta = await loop.run_in_executor(
+        None, _precompute_spec, spec_in.raw_spec, parent.fingerprints if parent else None
+    )
+
     # Create new version
     new_spec = ApiSpecVersion(
         service_id=service_id,
         version_label=spec_in.version_label,
         raw_spec=spec_in.raw_spec,
+        normalized_spec=normalized_spec,
         spec_hash=spec_hash,
+        fingerprints=fingerprints,
+        spec_index=spec_index,
+        parent_spec_id=parent.id if parent else None,
+        path_delta=delta,
         organization_id=service.organization_id # Inherit org from service
     )
     
     db.add(new_spec)
+    await db.flush()
+
+    # Diff against the parent right away, so comparisons spanning several versions
+    # can be composed from the consecutive diffs (see app.services.version_chain)
+    if parent:
+        enqueue_job(db, JOB_VERSION_DELTA, {"parent_spec_id": str(parent.id), "spec_id": str(new_spec.id)},
+                    organization_id=service.organization_id)
+        # Debounced: a burst of uploads gets one run, see analysis_runner.process_auto_analysis_task
+        if service.auto_analyze:
+            enqueue_job(db, JOB_AUTO_ANALYSIS, {"service_id": str(service_id), "spec_id": str(new_spec.id)},
+                        organization_id=service.organization_id,
+                        delay_seconds=settings.ANALYSIS_AUTO_DEBOUNCE_SECONDS)
     await db.commit()
     await db.refresh(new_spec)
     return new_spec
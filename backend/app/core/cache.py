@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar('V')
+
+
+class LRUCache(Generic[V]):
+    """
+    Small thread-safe LRU map. Bounded by a total weight (by default every
+    entry weighs 1, i.e. the bound is an entry count).
+    """
+
+    def __init__(self, max_weight: int, weigher: Optional[Callable[[V], int]] = None):
+        self.max_weight = max_weight
+        self._weigher = weigher or (lambda value: 1)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._weight = 0
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: V):
+        weight = self._weigher(value)
+        with self._lock:
+            if key in self._data:
+                self._weight -= self._data.pop(key)[1]
+            if weight > self.max_weight:
+                # Larger than the whole cache, not worth evicting everything for
+                return
+            self._data[key] = (value, weight)
+            self._weight += weight
+            while self._weight > self.max_weight:
+                _, (_, evicted_weight) = self._data.popitem(last=False)
+                self._weight -= evicted_weight
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            self._weight -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -4,6 +4,33 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "RuptrAPI"
     # Postgres running in conda env on unix socket /tmp
     DATABASE_URL: str = "postgresql://arjungovindan:@/ruptrapi?host=/tmp"
+
+    # Analysis
+    DIFF_CACHE_MAX_CHANGES: int = 200_000  # In-process diff cache bound (total cached change records)
+    DIFF_EXECUTOR: str = "process"  # "process" (worker processes) or "thread" (default thread pool)
+    DIFF_PROCESS_WORKERS: int = 2  # Size of the diff process pool
+    DIFF_SHARD_MIN_PATHS: int = 2000  # Specs with more paths are diffed in parallel path shards
+    DIFF_STREAM_BATCH_PATHS: int = 1000  # Paths per batch of a run's diff, stored as each batch completes
+    ANALYSIS_BATCH_MAX_CANDIDATES: int = 50  # Candidate specs per batch analysis request
+    DEPENDENCY_INDEX_MAX_ENTRIES: int = 100_000  # In-process dependency index bound (total cached dependencies)
+    ANALYSIS_INSERT_BATCH_SIZE: int = 1000  # Rows per multi-row INSERT when storing changes and impacts
+    ANALYSIS_PERSIST_CHUNK_SIZE: int = 5000  # Changes (with their impacts) stored per transaction, a retried run resumes after the last one
+    VERSION_CHAIN_MAX_STEPS: int = 200  # Longest chain of consecutive diffs composed instead of a direct diff
+
+    # Analysis job queue (python -m app.worker)
+    ANALYSIS_WORKER_CONCURRENCY: int = 4  # Jobs one worker process runs at a time
+    ANALYSIS_WORKER_POLL_SECONDS: float = 1.0  # Idle wait between claims
+    ANALYSIS_WORKER_PREFETCH: int = 2  # Jobs claimed ahead of free slots, so a finished job is replaced without a round trip
+    ANALYSIS_WORKER_DRAIN_SECONDS: int = 120  # On SIGTERM, wait this long for jobs in flight before handing them back
+    ANALYSIS_JOB_LEASE_SECONDS: int = 60  # A job whose worker stops renewing the lease is claimed again
+    ANALYSIS_JOB_MAX_ATTEMPTS: int = 3
+    ANALYSIS_CANCEL_SUPERSEDED_RUNS: bool = False  # Cancel pending auto-selected runs once a newer spec is uploaded
+    ANALYSIS_JOB_RETRY_SECONDS: int = 10  # Backoff before the first retry, doubled on each further one
+    ANALYSIS_ORG_MAX_RUNNING: int = 4  # Jobs of one organization running at once, across all workers
+    ANALYSIS_ORG_MAX_PENDING: int = 200  # Runs of one organization queued or running before new ones are refused
+    ANALYSIS_QUEUE_RETRY_AFTER_SECONDS: int = 30  # Retry-After of a refused run
+    ANALYSIS_AUTO_DEBOUNCE_SECONDS: int = 30  # Uploads to an auto_analyze service this close together get one run
+    ANALYSIS_AUTO_DEBOUNCE_MAX_UPLOADS: int = 200  # Uploads looked back over for the start of a burst; a longer burst starts at the oldest of them
     
     @property
     def ASYNC_DATABASE_URL(self):
@@ -0,0 +1,78 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from app.core.diff_engine import Change
+from app.core.fingerprint import FINGERPRINT_VERSION
+
+
+class Composition(NamedTuple):
+    """
+    A diff across a chain of versions, assembled from its consecutive steps.
+    `changes` holds the changes of every path the steps settle, `ambiguous`
+    the paths that need a direct diff (see compose_deltas), `order` the
+    order a direct diff visits the paths in.
+    """
+    changes: Dict[str, List[Change]]
+    ambiguous: List[str]
+    order: List[str]
+
+    def merge(self, direct: Sequence[Change] = ()) -> List[Change]:
+        """
+        All changes, given `direct`: the diff restricted to the ambiguous paths.
+        Changes are in the order a direct diff of the two versions returns
+        them: grouped by path, in path order, within a path in the engine's order.
+        """
+        by_path = {path: list(changes) for path, changes in self.changes.items()}
+        for change in direct:
+            by_path.setdefault(change.path, []).append(change)
+        rank = {path: i for i, path in enumerate(self.order)}
+        return [change for path in sorted(by_path, key=lambda path: rank.get(path, len(rank))) for change in by_path[path]]
+
+
+def diff_path_order(old_paths: Iterable[str], new_paths: Iterable[str]) -> List[str]:
+    """The order DiffEngine visits paths in: the old version's, then those added in the new one"""
+    order = list(old_paths)
+    seen = set(order)
+    return order + [path for path in new_paths if path not in seen]
+
+
+def compose_deltas(path_deltas: Sequence[Optional[Dict[str, Any]]], deltas: Sequence[Sequence[Change]],
+                   order: Sequence[str]) -> Optional[Composition]:
+    """
+    Compose the diffs of consecutive versions v0 -> v1 -> ... -> vn into the
+    diff v0 -> vn. Step k is given by `path_deltas[k]` (the paths it touched,
+    see fingerprint.path_delta) and `deltas[k]` (its changes). `order` is the
+    path order of the direct diff v0 -> vn (see diff_path_order).
+
+    Changes are a function of the two versions of one path. A path touched by
+    a single step is, before it, identical to v0 and, after it, identical to
+    vn, so that step's changes are exactly its v0 -> vn changes. A path touched
+    by several steps is unchanged if its first and last hashes match; otherwise
+    the steps may cancel out or compound, and it is left for a direct diff.
+
+    None if a step's path delta is missing or from another fingerprint scheme.
+    """
+    if len(path_deltas) != len(deltas):
+        raise ValueError("One path delta is required per step")
+
+    steps: Dict[str, List[int]] = {}
+    for k, delta in enumerate(path_deltas):
+        if not isinstance(delta, dict) or delta.get("version") != FINGERPRINT_VERSION:
+            return None
+        for path in delta["paths"]:
+            steps.setdefault(path, []).append(k)
+
+    changes: Dict[str, List[Change]] = {}
+    ambiguous = []
+    for path, touched in steps.items():
+        if len(touched) == 1:
+            changes[path] = []
+        elif path_deltas[touched[0]]["paths"][path][0] != path_deltas[touched[-1]]["paths"][path][1]:
+            ambiguous.append(path)
+
+    for k, step_changes in enumerate(deltas):
+        for change in step_changes:
+            if change.path in changes and steps[change.path][0] == k:
+                changes[change.path].append(change)
+
+    # Paths whose steps produced no change records carry nothing
+    return Composition({path: found for path, found in changes.items() if found}, sorted(ambiguous), list(order))
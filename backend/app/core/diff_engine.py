@@ -1,132 +1,542 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Collection, FrozenSet, Iterable, Iterator, Optional, Set, Tuple, NamedTuple
 import copy
+from functools import lru_cache
 from app.models.analysis import ChangeType, Severity
+from app.core import diff_rules
+from app.core.diff_rules import RULES, RulePlan, compile_plan
+from app.core.ref_resolver import RefResolver, changed_refs, json_pointer
+from app.core.fingerprint import HTTP_METHODS, usable_fingerprints
+from app.core.spec_index import SpecIndex, PARAMETER, parameter_entry
+
+# Normalized parameter: (pointer, name, in, type, required)
+ParamEntry = Tuple[str, str, str, Optional[str], bool]
+
+# Part of the diff cache key. Bump whenever detection logic or change
+# descriptions change, so results computed by older code are not reused.
+ENGINE_VERSION = "2026.10.17"
+
+CHANGE_FIELDS = ("change_type", "severity", "description", "http_method", "path", "location")
+
+_SEVERITY_RANK = {Severity.LOW: 0, Severity.MEDIUM: 1, Severity.HIGH: 2}
+
+
+def result_version(plan: RulePlan) -> str:
+    """Cache version of results produced with `plan`: the engine version, plus the plan key if customized"""
+    return f"{ENGINE_VERSION}+{plan.key}" if plan.key else ENGINE_VERSION
+
+
+def shard_ranges(path_count: int, shards: int) -> List[Tuple[int, int]]:
+    """Split [0, path_count) into `shards` contiguous, near-equal (start, end) ranges"""
+    shards = max(1, min(shards, path_count))
+    size, extra = divmod(path_count, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+class Change:
+    """
+    One detected change: the rule that produced it (see app.core.diff_rules),
+    the rule's positional params, its severity and where it was found. Change
+    type and the human-readable description are derived from the rule on
+    access, so a diff with hundreds of thousands of changes holds no
+    per-change strings.
+
+    Supports read-only mapping access (change["description"]) over CHANGE_FIELDS.
+    """
+    __slots__ = ("rule", "params", "http_method", "path", "location", "severity")
+
+    def __init__(self,
+                 rule: str,
+                 params: Tuple = (),
+                 http_method: Optional[str] = None,
+                 path: Optional[str] = None,
+                 location: Optional[str] = None,
+                 severity: Optional[Severity] = None):
+        self.rule = rule
+        self.params = params
+        self.http_method = http_method
+        self.path = path
+        self.location = location
+        # Organizations may override a rule's severity (see diff_rules.RulePlan)
+        self.severity = severity or RULES[rule].severity
+
+    @property
+    def change_type(self) -> ChangeType:
+        return RULES[self.rule].change_type
+
+    @property
+    def description(self) -> str:
+        return RULES[self.rule].render(self.params, method=self.http_method, path=self.path)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in CHANGE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in CHANGE_FIELDS else default
+
+    def _key(self) -> tuple:
+        return (self.rule, self.params, self.http_method, self.path, self.location, self.severity)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Change) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return f"Change({self.rule}, {self.http_method} {self.path}, {self.params!r})"
+
+
+def first_blocking_change(changes: Iterable[Change], severity: Severity = Severity.HIGH) -> Optional[Change]:
+    """
+    First breaking change of at least `severity`, or None. Given iter_diff(),
+    the diff stops as soon as one is found (e.g. to fail a CI gate quickly).
+    """
+    for change in changes:
+        if change.change_type == ChangeType.BREAKING and _SEVERITY_RANK[change.severity] >= _SEVERITY_RANK[severity]:
+            return change
+    return None
+
+
+def serialize_changes(changes: Iterable[Change]) -> List[List[Any]]:
+    """
+    Compact, JSON-safe form of a change list, one positional row per change:
+    [rule, severity, http_method, path, location, *params]. Descriptions are not stored.
+    """
+    return [
+        [change.rule, change.severity.value, change.http_method, change.path, change.location, *change.params]
+        for change in changes
+    ]
+
+
+def deserialize_changes(rows: List[List[Any]]) -> List[Change]:
+    return [Change(row[0], tuple(row[5:]), row[2], row[3], row[4], Severity(row[1])) for row in rows]
+
+
+def format_field(parts: Tuple[str, ...]) -> str:
+    """('items', '[]', 'id') -> 'items[].id'"""
+    label = ""
+    for part in parts:
+        if part == "[]":
+            label += "[]"
+        else:
+            label = f"{label}.{part}" if label else part
+    return label
+
+
+def response_class(code: Any) -> str:
+    """'201' / '2XX' -> '2', 'default' -> 'default'"""
+    code = str(code)
+    return code[0] if code[:1].isdigit() else code.lower()
+
+
+# Rule for a removed response, by response class. Clients depend on success
+# and redirect responses; documented errors going away does not break them.
+RESPONSE_REMOVED_RULES = {
+    "2": diff_rules.RESPONSE_REMOVED,
+    "3": diff_rules.RESPONSE_REMOVED,
+    "4": diff_rules.ERROR_RESPONSE_REMOVED,
+    "5": diff_rules.ERROR_RESPONSE_REMOVED,
+    "default": diff_rules.ERROR_RESPONSE_REMOVED,
+}
+
+# is_response -> (media type removed rule, media type added rule)
+MEDIA_TYPE_RULES = {
+    False: (diff_rules.REQUEST_MEDIA_TYPE_REMOVED, diff_rules.REQUEST_MEDIA_TYPE_ADDED),
+    True: (diff_rules.RESPONSE_MEDIA_TYPE_REMOVED, diff_rules.RESPONSE_MEDIA_TYPE_ADDED),
+}
+
+
+def _response_lookup(responses: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Normalized code -> key in `responses`, built from the codes present.
+    Also maps each class digit to its first explicit code, so a range
+    ('2XX') can be matched against explicit codes on the other side.
+    """
+    lookup: Dict[str, str] = {}
+    for code in responses:
+        normalized = str(code).upper()
+        lookup[normalized] = code
+        if normalized.isdigit() and len(normalized) == 3:
+            lookup.setdefault(normalized[0], code)
+    return lookup
+
+
+def _match_response(code: Any, lookup: Dict[str, str]) -> Optional[str]:
+    """The response in `lookup` that answers for `code`: same code, else its range (or the reverse)"""
+    code = str(code).upper()
+    if code in lookup:
+        return lookup[code]
+    if len(code) == 3 and code[0].isdigit():
+        if code[1:].isdigit():
+            return lookup.get(code[0] + "XX")
+        if code[1:] == "XX":
+            return lookup.get(code[0])
+    return None
+
+
+@lru_cache(maxsize=1024)
+def media_essence(media_type: str) -> str:
+    """'Application/JSON; charset=utf-8' -> 'application/json'"""
+    return media_type.split(";", 1)[0].strip().lower()
+
+
+def _media_lookup(content: Dict[str, Any]) -> Dict[str, str]:
+    return {media_essence(media): media for media in content}
+
+
+def _match_media(media_type: str, lookup: Dict[str, str]) -> Optional[str]:
+    """The media type in `lookup` that accepts `media_type`: exact, then 'type/*', then '*/*'"""
+    essence = media_essence(media_type)
+    for candidate in (essence, essence.split("/", 1)[0] + "/*", "*/*"):
+        if candidate in lookup:
+            return lookup[candidate]
+    return None
+
+
+def _schema_identity(resolver: RefResolver, schema: Any) -> Any:
+    ref, node = resolver.deref(schema)
+    return ref or id(node)
+
+
+def _header_type(resolver: RefResolver, header: Any) -> Optional[str]:
+    header = resolver.deref(header)[1]
+    if not isinstance(header, dict):
+        return None
+    # OpenAPI 3 nests the type in `schema`, Swagger 2 headers carry it directly
+    schema = resolver.deref(header.get("schema", header))[1]
+    return schema.get("type") if isinstance(schema, dict) else None
+
+
+class SchemaFinding(NamedTuple):
+    """
+    A change found inside a schema, relative to the schema it was found in.
+    Findings are independent of the operation, so they can be cached per schema
+    pair and fanned out to every operation that uses the pair.
+    """
+    rule: str
+    field: Tuple[str, ...] = ()
+    pointer: str = ""
+    params: Tuple = ()          # rule params following (field, context)
+
+    def lift(self, field_token: str, pointer: str) -> "SchemaFinding":
+        """Re-anchor this finding one level up (under property/items/additionalProperties)."""
+        rule = diff_rules.FIELD_TYPE_CHANGED if self.rule == diff_rules.SCHEMA_TYPE_CHANGED else self.rule
+        return self._replace(rule=rule, field=(field_token,) + self.field, pointer=pointer + self.pointer)
+
+    def change_params(self, context: str) -> Tuple:
+        return (format_field(self.field), context) + self.params
+
+
+class SchemaResult(NamedTuple):
+    """Memoized findings of a schema pair and the pairs on cycles they went through"""
+    findings: List[SchemaFinding]
+    cyclic: FrozenSet[tuple]
+
 
 class DiffEngine:
     """
     Compares two OpenAPI specifications and detects changes.
     """
 
-    def __init__(self):
-        self.changes = []
+    def __init__(self, plan: Optional[RulePlan] = None):
+        # Rules to run and their severities; every rule at its default severity unless given
+        self.plan = plan or compile_plan()
+        self.changes: List[Change] = []
+        # (old $ref, new $ref, is_response) -> (findings, cyclic pairs), shared by every operation using the pair
+        self._schema_cache: Dict[Tuple[str, str, bool], SchemaResult] = {}
+        # (id(old node), id(new node), is_response) -> (findings, cyclic pairs) for inline sub-schemas
+        self._node_cache: Dict[Tuple[int, int, bool], SchemaResult] = {}
+        # Pairs on a cycle the current schema comparison went through, see _diff_schema_node
+        self._cyclic: Set[tuple] = set()
+
+    def compute_diff(self,
+                     old_spec: Optional[Dict[str, Any]],
+                     new_spec: Optional[Dict[str, Any]],
+                     old_fingerprints: Optional[Dict[str, Any]] = None,
+                     new_fingerprints: Optional[Dict[str, Any]] = None,
+                     old_index: Optional[SpecIndex] = None,
+                     new_index: Optional[SpecIndex] = None,
+                     shard: Optional[Tuple[int, int]] = None,
+                     include_added: bool = True,
+                     paths: Optional[Collection[str]] = None) -> List[Change]:
+        """
+        Main entry point. Returns a list of Change records for ApiChange objects.
+        Warning: This does NOT save to DB.
 
-    def compute_diff(self, old_spec: Dict[str, Any], new_spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        Collects iter_diff(); see there for the arguments.
         """
-        Main entry point. Returns a list of dicts representing ApiChange objects.
-        Warning: This does NOT save to DB. It returns dictionaries.
+        self.changes = list(self.iter_diff(
+            old_spec, new_spec, old_fingerprints, new_fingerprints, old_index, new_index, shard, include_added,
+            paths=paths
+        ))
+        return self.changes
+
+    def iter_diff(self,
+                  old_spec: Optional[Dict[str, Any]],
+                  new_spec: Optional[Dict[str, Any]],
+                  old_fingerprints: Optional[Dict[str, Any]] = None,
+                  new_fingerprints: Optional[Dict[str, Any]] = None,
+                  old_index: Optional[SpecIndex] = None,
+                  new_index: Optional[SpecIndex] = None,
+                  shard: Optional[Tuple[int, int]] = None,
+                  include_added: bool = True,
+                  old_refs: Optional[RefResolver] = None,
+                  paths: Optional[Collection[str]] = None) -> Iterator[Change]:
+        """
+        Yield changes as they are found, in the same order compute_diff()
+        returns them. Nothing is accumulated, so callers can persist in batches
+        or stop early (see first_blocking_change) without holding the full set.
+
+        `old_refs` may pass in a resolver built for `old_spec` earlier, so a
+        base diffed against several candidates is resolved once (see compute_batch).
+
+        If both specs come with fingerprints (see app.core.fingerprint) the
+        engine only descends into paths, operations and sections whose hashes
+        differ, so the cost follows the size of the change, not of the spec.
+
+        With fingerprints and a flattened index (see app.core.spec_index) for
+        both sides, paths, operations and parameters are diffed from the compact
+        form. The raw specs may then be None, as long as no request body or
+        response changed (see fingerprint.body_sections_changed).
+
+        `shard` = (index, count) restricts the run to slice `index` of the old
+        spec's paths split into `count` by shard_ranges(), computed from the
+        paths this run actually compares; `include_added` controls whether
+        added paths are reported. Concatenating shards 0..count-1 in order,
+        with include_added only on the last one, gives exactly the serial output.
+        `paths` restricts the run to the given paths (see app.core.diff_compose).
         """
-        self.changes = []
         self.old_spec = old_spec
         self.new_spec = new_spec
 
-        # 1. Compare Paths
-        self._compare_paths()
+        self._old_fp = usable_fingerprints(old_fingerprints)
+        self._new_fp = usable_fingerprints(new_fingerprints)
+        if self._old_fp is None or self._new_fp is None:
+            self._old_fp = self._new_fp = None
 
-        return self.changes
+        self._old_index, self._new_index = old_index, new_index
+        if old_index is None or new_index is None:
+            self._old_index = self._new_index = None
+
+        if (old_spec is None or new_spec is None) and (self._old_fp is None or self._old_index is None):
+            raise ValueError("Raw specs are required unless fingerprints and indexes are given for both sides")
+
+        self.old_refs = old_refs if old_refs is not None else RefResolver(old_spec)
+        self.new_refs = RefResolver(new_spec)
+        self._schema_cache = {}
+        self._node_cache = {}
+        self._cyclic = set()
+
+        if self._old_fp is not None:
+            if self._old_fp["root"] == self._new_fp["root"]:
+                return
+            # Component hashes are transitive already
+            old_components = self._old_fp["components"]
+            new_components = self._new_fp["components"]
+            self._changed_refs = {
+                pointer for pointer in old_components.keys() | new_components.keys()
+                if old_components.get(pointer) != new_components.get(pointer)
+            }
+        else:
+            # Reference graphs are built once per spec; components that are
+            # identical in both specs (transitively) are never compared.
+            self._changed_refs = changed_refs(self.old_refs, self.new_refs)
+
+        # 1. Compare Paths. Node kinds no enabled rule inspects are not visited;
+        # the remaining disabled rules are dropped here.
+        enabled = self.plan.enabled
+        for change in self._compare_paths(shard, include_added, paths):
+            if change.rule in enabled:
+                yield change
+
+    def compute_batch(self,
+                      old_spec: Optional[Dict[str, Any]],
+                      candidates: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[SpecIndex]]],
+                      old_fingerprints: Optional[Dict[str, Any]] = None,
+                      old_index: Optional[SpecIndex] = None) -> List[List[Change]]:
+        """
+        Diff one base spec against several candidates, given as
+        (new_spec, new_fingerprints, new_index). The base's reference graph and
+        lookups are built once and shared; with fingerprints each candidate
+        only costs what differs from the base.
+        """
+        old_refs = RefResolver(old_spec)
+        return [
+            list(self.iter_diff(old_spec, new_spec, old_fingerprints, new_fp, old_index, new_index, old_refs=old_refs))
+            for new_spec, new_fp, new_index in candidates
+        ]
+
+    def _path_fingerprints(self, path: str) -> Optional[Tuple[Dict, Dict]]:
+        """(old, new) fingerprints of a path present in both specs, if known"""
+        if self._old_fp is None:
+            return None
+        old = self._old_fp["paths"].get(path)
+        new = self._new_fp["paths"].get(path)
+        if old is None or new is None:
+            return None
+        return old, new
+
+    def _change(self, 
+                rule: str, 
+                params: Tuple = (), 
+                method: Optional[str] = None, 
+                path: Optional[str] = None,
+                location: Optional[str] = None) -> Change:
+        return Change(rule, params, method, path, location, self.plan.severity.get(rule))
+
+    def _spec_paths(self, spec: Optional[Dict[str, Any]], fingerprints: Optional[Dict[str, Any]]) -> Dict[str, Dict]:
+        if spec is not None:
+            return spec.get("paths", {})
+        # Same keys as the raw `paths` object: path -> method -> (fingerprint, unused)
+        return {path: item["operations"] for path, item in fingerprints["paths"].items()}
 
-    def _add_change(self, 
-                    change_type: ChangeType, 
-                    severity: Severity, 
-                    description: str, 
-                    method: Optional[str] = None, 
-                    path: Optional[str] = None):
-        self.changes.append({
-            "change_type": change_type,
-            "severity": severity,
-            "description": description,
-            "http_method": method,
-            "path": path
-        })
-
-    def _compare_paths(self):
-        old_paths = self.old_spec.get("paths", {})
-        new_paths = self.new_spec.get("paths", {})
+    def _compare_paths(self, shard: Optional[Tuple[int, int]] = None, include_added: bool = True,
+                       only: Optional[Collection[str]] = None):
+        old_paths = self._spec_paths(self.old_spec, self._old_fp)
+        new_paths = self._spec_paths(self.new_spec, self._new_fp)
+        own_paths = old_paths
+        if shard:
+            # Sliced from the same keys that are compared: fingerprints omit
+            # malformed path items that the raw spec still has
+            index, count = shard
+            ordered = list(old_paths)
+            ranges = shard_ranges(len(ordered), count)
+            start, end = ranges[index] if index < len(ranges) else (0, 0)
+            own_paths = ordered[start:end]
+        if only is not None:
+            own_paths = [path for path in own_paths if path in only]
 
         # Removed Paths
-        for path in old_paths:
+        for path in own_paths:
             if path not in new_paths:
-                self._add_change(
-                    ChangeType.BREAKING, 
-                    Severity.HIGH, 
-                    f"Path '{path}' was removed.", 
-                    path=path
+                yield self._change(
+                    diff_rules.PATH_REMOVED, 
+                    path=path,
+                    location=json_pointer("paths", path)
                 )
             else:
-                # Path exists in both, compare operations
-                self._compare_operations(path, old_paths[path], new_paths[path])
+                # Path exists in both, compare operations (unless provably unchanged)
+                fingerprints = self._path_fingerprints(path)
+                if fingerprints and fingerprints[0]["hash"] == fingerprints[1]["hash"]:
+                    continue
+                yield from self._compare_operations(path, old_paths[path], new_paths[path], fingerprints)
+
+        if not include_added:
+            return
 
         # Added Paths
         for path in new_paths:
-            if path not in old_paths:
-                self._add_change(
-                    ChangeType.NON_BREAKING, 
-                    Severity.LOW, 
-                    f"Path '{path}' was added.", 
-                    path=path
+            if path not in old_paths and (only is None or path in only):
+                yield self._change(
+                    diff_rules.PATH_ADDED, 
+                    path=path,
+                    location=json_pointer("paths", path)
                 )
 
-    def _compare_operations(self, path: str, old_path_item: Dict, new_path_item: Dict):
+    def _compare_operations(self, path: str, old_path_item: Dict, new_path_item: Dict, fingerprints: Optional[Tuple[Dict, Dict]] = None):
         # Operations are keys like 'get', 'post', 'put', 'delete', etc.
         # Ignore keys starting with 'x-' or 'parameters' (top-level path params handled separately if needed)
         
-        # Merge keys to iterate
-        all_methods = set(old_path_item.keys()) | set(new_path_item.keys())
+        # Merge keys to iterate (ordered, so output is the same in every process)
+        all_methods = list(old_path_item.keys()) + [m for m in new_path_item.keys() if m not in old_path_item]
         
         for method in all_methods:
             # Only process valid HTTP methods
-            if method.lower() not in {"get", "put", "post", "delete", "options", "head", "patch", "trace"}:
+            if method.lower() not in HTTP_METHODS:
                 continue
             
             method_upper = method.upper()
+            pointer = json_pointer("paths", path, method)
 
             if method not in new_path_item:
-                self._add_change(
-                    ChangeType.BREAKING, 
-                    Severity.HIGH, 
-                    f"Operation {method_upper} {path} was removed.", 
+                yield self._change(
+                    diff_rules.OPERATION_REMOVED, 
                     method=method_upper, 
-                    path=path
+                    path=path,
+                    location=pointer
                 )
                 continue
             
             if method not in old_path_item:
-                self._add_change(
-                    ChangeType.NON_BREAKING, 
-                    Severity.LOW, 
-                    f"Operation {method_upper} {path} was added.", 
+                yield self._change(
+                    diff_rules.OPERATION_ADDED, 
                     method=method_upper, 
-                    path=path
+                    path=path,
+                    location=pointer
                 )
                 continue
 
+            op_fingerprints = None
+            if fingerprints:
+                old_op_fp = fingerprints[0]["operations"].get(method)
+                new_op_fp = fingerprints[1]["operations"].get(method)
+                if old_op_fp and new_op_fp:
+                    if old_op_fp["hash"] == new_op_fp["hash"]:
+                        continue
+                    op_fingerprints = (old_op_fp, new_op_fp)
+
             # Compare specific operation details
-            self._compare_operation_details(
+            yield from self._compare_operation_details(
                 path, 
                 method_upper, 
                 old_path_item[method], 
-                new_path_item[method]
+                new_path_item[method],
+                pointer,
+                op_fingerprints
             )
 
-    def _compare_operation_details(self, path: str, method: str, old_op: Dict, new_op: Dict):
+    def _compare_operation_details(self, path: str, method: str, old_op: Dict, new_op: Dict, pointer: str = "", fingerprints: Optional[Tuple[Dict, Dict]] = None):
+        def changed(section: str) -> bool:
+            return fingerprints is None or fingerprints[0][section] != fingerprints[1][section]
+
+        plan = self.plan
+
         # 1. Compare Parameters
-        self._compare_parameters(path, method, old_op.get("parameters", []), new_op.get("parameters", []))
+        if changed("parameters") and plan.wants(diff_rules.PARAMETER):
+            if self._old_index is not None:
+                old_pmap = self._index_parameter_map(self._old_index, path, method)
+                new_pmap = self._index_parameter_map(self._new_index, path, method)
+            else:
+                old_pmap = self._raw_parameter_map(old_op.get("parameters", []), self.old_refs, pointer)
+                new_pmap = self._raw_parameter_map(new_op.get("parameters", []), self.new_refs, pointer)
+            yield from self._compare_parameters(path, method, old_pmap, new_pmap)
+
+        compare_body = changed("requestBody") and plan.wants(diff_rules.REQUEST_BODY, diff_rules.MEDIA_TYPE, diff_rules.SCHEMA)
+        compare_responses = changed("responses") and plan.wants(
+            diff_rules.RESPONSE, diff_rules.MEDIA_TYPE, diff_rules.HEADER, diff_rules.SCHEMA
+        )
+        if (compare_body or compare_responses) and (self.old_spec is None or self.new_spec is None):
+            raise ValueError(f"Raw specs are required to compare bodies of {method} {path}")
         
         # 2. Compare Request Body
-        self._compare_request_body(path, method, old_op.get("requestBody"), new_op.get("requestBody"))
+        if compare_body:
+            yield from self._compare_request_body(path, method, old_op.get("requestBody"), new_op.get("requestBody"), pointer)
         
         # 3. Compare Responses
-        self._compare_responses(path, method, old_op.get("responses", {}), new_op.get("responses", {}))
+        if compare_responses:
+            yield from self._compare_responses(path, method, old_op.get("responses", {}), new_op.get("responses", {}), pointer)
+
+    def _compare_request_body(self, path: str, method: str, old_body: Optional[Dict], new_body: Optional[Dict], op_pointer: str = ""):
+        """Compare request bodies, per media type"""
+        old_body = self.old_refs.deref(old_body)[1] if old_body else old_body
+        new_body = self.new_refs.deref(new_body)[1] if new_body else new_body
+        pointer = op_pointer + json_pointer("requestBody")
 
-    def _compare_request_body(self, path: str, method: str, old_body: Optional[Dict], new_body: Optional[Dict]):
-        """Compare request body schemas"""
         # Request body removed
         if old_body and not new_body:
-            self._add_change(
-                ChangeType.BREAKING,
-                Severity.HIGH,
-                f"Request body was removed.",
+            yield self._change(
+                diff_rules.REQUEST_BODY_REMOVED,
                 method=method,
-                path=path
+                path=path,
+                location=pointer
             )
             return
         
@@ -134,205 +544,369 @@ class DiffEngine:
         if not old_body and new_body:
             is_required = new_body.get("required", False)
             if is_required:
-                self._add_change(
-                    ChangeType.BREAKING,
-                    Severity.HIGH,
-                    f"Required request body was added.",
+                yield self._change(
+                    diff_rules.REQUIRED_REQUEST_BODY_ADDED,
                     method=method,
-                    path=path
+                    path=path,
+                    location=pointer
                 )
             else:
-                self._add_change(
-                    ChangeType.NON_BREAKING,
-                    Severity.LOW,
-                    f"Optional request body was added.",
+                yield self._change(
+                    diff_rules.OPTIONAL_REQUEST_BODY_ADDED,
                     method=method,
-                    path=path
+                    path=path,
+                    location=pointer
                 )
             return
         
         # Both exist - compare schemas
         if old_body and new_body:
-            old_schema = old_body.get("content", {}).get("application/json", {}).get("schema", {})
-            new_schema = new_body.get("content", {}).get("application/json", {}).get("schema", {})
-            
-            if old_schema or new_schema:
-                self._compare_schema(path, method, old_schema, new_schema, context="request body")
+            yield from self._compare_content(
+                path, method, old_body.get("content"), new_body.get("content"),
+                context="request body",
+                pointer=pointer
+            )
 
-    def _compare_responses(self, path: str, method: str, old_responses: Dict, new_responses: Dict):
-        """Compare response schemas (focusing on 200/2xx responses)"""
-        # Check success responses (200, 201, etc.)
-        success_codes = ["200", "201", "202", "204"]
-        
-        for code in success_codes:
-            old_resp = old_responses.get(code)
-            new_resp = new_responses.get(code)
-            
-            if old_resp and not new_resp:
-                self._add_change(
-                    ChangeType.BREAKING,
-                    Severity.HIGH,
-                    f"Response {code} was removed.",
+    def _compare_responses(self, path: str, method: str, old_responses: Dict, new_responses: Dict, op_pointer: str = ""):
+        """
+        Compare every documented response. Codes are matched through a lookup
+        built from the codes actually present, so an explicit code and the
+        range covering it ('200' / '2XX') are compared with each other.
+        """
+        old_responses = old_responses if isinstance(old_responses, dict) else {}
+        new_responses = new_responses if isinstance(new_responses, dict) else {}
+        old_lookup = _response_lookup(old_responses)
+        new_lookup = _response_lookup(new_responses)
+        compared = set()
+
+        for code in old_responses:
+            new_code = _match_response(code, new_lookup)
+            if new_code is None:
+                yield self._change(
+                    RESPONSE_REMOVED_RULES.get(response_class(code), diff_rules.ERROR_RESPONSE_REMOVED),
+                    (code,),
                     method=method,
-                    path=path
+                    path=path,
+                    location=op_pointer + json_pointer("responses", code)
                 )
                 continue
-            
-            if not old_resp or not new_resp:
+            compared.add((code, new_code))
+            yield from self._compare_response(path, method, new_code, old_responses[code], new_responses[new_code], op_pointer)
+
+        for code in new_responses:
+            old_code = _match_response(code, old_lookup)
+            if old_code is None:
+                yield self._change(
+                    diff_rules.RESPONSE_ADDED,
+                    (code,),
+                    method=method,
+                    path=path,
+                    location=op_pointer + json_pointer("responses", code)
+                )
+            elif (old_code, code) not in compared:
+                yield from self._compare_response(path, method, code, old_responses[old_code], new_responses[code], op_pointer)
+
+    def _compare_response(self, path: str, method: str, code: str, old_resp: Any, new_resp: Any, op_pointer: str):
+        """Compare a matched response pair; `code` is the new spec's key"""
+        old_resp = self.old_refs.deref(old_resp)[1]
+        new_resp = self.new_refs.deref(new_resp)[1]
+        if not isinstance(old_resp, dict) or not isinstance(new_resp, dict):
+            return
+        pointer = op_pointer + json_pointer("responses", code)
+
+        if self.plan.wants(diff_rules.MEDIA_TYPE, diff_rules.SCHEMA):
+            yield from self._compare_content(
+                path, method, old_resp.get("content"), new_resp.get("content"),
+                context=f"response {code}",
+                pointer=pointer
+            )
+        if self.plan.wants(diff_rules.HEADER):
+            yield from self._compare_headers(path, method, code, old_resp.get("headers"), new_resp.get("headers"), pointer)
+
+    def _compare_content(self, path: str, method: str, old_content: Any, new_content: Any, context: str, pointer: str):
+        """
+        Compare the media types of a request body or response. Media types are
+        matched through a lookup (exact type, then 'type/*', then '*/*'), and a
+        schema pair shared by several media types is compared once.
+        """
+        old_content = old_content if isinstance(old_content, dict) else {}
+        new_content = new_content if isinstance(new_content, dict) else {}
+        if not old_content and not new_content:
+            return
+        is_response = context != "request body"
+        removed_rule, added_rule = MEDIA_TYPE_RULES[is_response]
+        old_lookup = _media_lookup(old_content)
+        new_lookup = _media_lookup(new_content)
+        seen = set()
+
+        for media in old_content:
+            new_media = _match_media(media, new_lookup)
+            if new_media is None:
+                yield self._change(
+                    removed_rule,
+                    (media, context),
+                    method=method,
+                    path=path,
+                    location=pointer + json_pointer("content", media)
+                )
                 continue
-            
-            # Compare response schemas
-            old_schema = old_resp.get("content", {}).get("application/json", {}).get("schema", {})
-            new_schema = new_resp.get("content", {}).get("application/json", {}).get("schema", {})
-            
-            if old_schema or new_schema:
-                self._compare_schema(path, method, old_schema, new_schema, context=f"response {code}")
 
-    def _compare_schema(self, path: str, method: str, old_schema: Dict, new_schema: Dict, context: str = "schema"):
-        """Compare two JSON schemas for breaking changes"""
+            old_schema = (old_content[media] or {}).get("schema", {})
+            new_schema = (new_content[new_media] or {}).get("schema", {})
+            pair = (_schema_identity(self.old_refs, old_schema), _schema_identity(self.new_refs, new_schema))
+            if (old_schema or new_schema) and pair not in seen and self.plan.wants(diff_rules.SCHEMA):
+                seen.add(pair)
+                yield from self._compare_schema(
+                    path, method, old_schema, new_schema,
+                    context=context,
+                    pointer=pointer + json_pointer("content", new_media, "schema")
+                )
+
+        for media in new_content:
+            if _match_media(media, old_lookup) is None:
+                yield self._change(
+                    added_rule,
+                    (media, context),
+                    method=method,
+                    path=path,
+                    location=pointer + json_pointer("content", media)
+                )
+
+    def _compare_headers(self, path: str, method: str, code: str, old_headers: Any, new_headers: Any, pointer: str):
+        """Compare response headers (names are case-insensitive)"""
+        old_headers = old_headers if isinstance(old_headers, dict) else {}
+        new_headers = new_headers if isinstance(new_headers, dict) else {}
+        new_by_name = {name.lower(): name for name in new_headers}
+        old_names = {name.lower() for name in old_headers}
+
+        for name, old_header in old_headers.items():
+            new_name = new_by_name.get(name.lower())
+            location = pointer + json_pointer("headers", new_name or name)
+            if new_name is None:
+                yield self._change(diff_rules.RESPONSE_HEADER_REMOVED, (name, code), method=method, path=path, location=location)
+                continue
+            old_type = _header_type(self.old_refs, old_header)
+            new_type = _header_type(self.new_refs, new_headers[new_name])
+            if old_type and new_type and old_type != new_type:
+                yield self._change(
+                    diff_rules.RESPONSE_HEADER_TYPE_CHANGED,
+                    (name, code, old_type, new_type),
+                    method=method,
+                    path=path,
+                    location=location
+                )
+
+        for name in new_headers:
+            if name.lower() not in old_names:
+                yield self._change(
+                    diff_rules.RESPONSE_HEADER_ADDED,
+                    (name, code),
+                    method=method,
+                    path=path,
+                    location=pointer + json_pointer("headers", name)
+                )
+
+    def _compare_schema(self, path: str, method: str, old_schema: Dict, new_schema: Dict, context: str = "schema", pointer: str = ""):
+        """
+        Compare two JSON schemas for breaking changes, recursing into nested
+        objects, array items and additionalProperties. Each change is reported
+        with the JSON pointer of the sub-schema it was found in.
+        """
+        is_response = "response" in context
+        for finding in self._diff_schema_node(old_schema, new_schema, is_response, set()):
+            yield self._change(
+                finding.rule,
+                finding.change_params(context),
+                method=method,
+                path=path,
+                location=pointer + finding.pointer
+            )
+
+    def _diff_schema_node(self, old_node: Any, new_node: Any, is_response: bool, active: Set[tuple]) -> List[SchemaFinding]:
+        """
+        Findings for one (old, new) schema pair, relative to that pair.
+
+        Recursive schemas terminate by skipping a pair that is already being
+        compared further up the stack (`active`), so the findings are those of
+        the pair expanded as if it were the entry point. Results are memoized
+        per pair: component pairs by their $ref, inline sub-schemas by node
+        identity. A result that went through a cycle is stored with the pairs
+        on it and only reused while none of them is in progress, where it
+        would have been cut short; the findings for a pair are the same
+        whatever was compared before it.
+        """
+        old_ref, old_schema = self.old_refs.deref(old_node)
+        new_ref, new_schema = self.new_refs.deref(new_node)
+        if not isinstance(old_schema, dict) or not isinstance(new_schema, dict):
+            return []
+
+        if old_ref and new_ref:
+            if old_ref == new_ref and old_ref not in self._changed_refs:
+                return []
+            key, cache = (old_ref, new_ref, is_response), self._schema_cache
+        else:
+            key, cache = (id(old_schema), id(new_schema), is_response), self._node_cache
+
+        cached = cache.get(key)
+        if cached is not None and cached.cyclic.isdisjoint(active):
+            self._cyclic |= cached.cyclic
+            return cached.findings
+        if key in active:
+            self._cyclic.add(key)
+            return []
+
+        outer_cyclic, self._cyclic = self._cyclic, set()
+        active.add(key)
+        findings = self._schema_findings(old_schema, new_schema, is_response, active)
+        active.discard(key)
+
+        cyclic = self._cyclic
+        if cyclic:
+            cyclic.add(key)
+        if cyclic.isdisjoint(active):
+            cache[key] = SchemaResult(findings, frozenset(cyclic))
+        self._cyclic = outer_cyclic | cyclic
+        return findings
+
+    def _schema_findings(self, old_schema: Dict, new_schema: Dict, is_response: bool, active: Set[tuple]) -> List[SchemaFinding]:
+        """Operation-independent findings for a resolved schema pair"""
+        findings: List[SchemaFinding] = []
+
+        old_type = old_schema.get("type")
+        new_type = new_schema.get("type")
+        if old_type and new_type and old_type != new_type:
+            # Structure is incompatible, nothing below this point is comparable
+            return [SchemaFinding(
+                diff_rules.SCHEMA_TYPE_CHANGED,
+                params=(old_type, new_type)
+            )]
+
         # Compare properties (fields)
         old_props = old_schema.get("properties", {})
         new_props = new_schema.get("properties", {})
-        old_required = set(old_schema.get("required", []))
         new_required = set(new_schema.get("required", []))
         
+        # Findings of disabled rules are never built, so they are not fanned out either
+        enabled = self.plan.enabled
+
         # Check removed fields
-        for field_name in old_props:
-            if field_name not in new_props:
-                if "response" in context:
-                    self._add_change(
-                        ChangeType.BREAKING,
-                        Severity.HIGH,
-                        f"Response field '{field_name}' was removed.",
-                        method=method,
-                        path=path
-                    )
-                else:
-                    self._add_change(
-                        ChangeType.BREAKING,
-                        Severity.MEDIUM,
-                        f"Request field '{field_name}' was removed.",
-                        method=method,
-                        path=path
-                    )
+        removed_rule = diff_rules.RESPONSE_FIELD_REMOVED if is_response else diff_rules.REQUEST_FIELD_REMOVED
+        if removed_rule in enabled:
+            for field_name in old_props:
+                if field_name not in new_props:
+                    findings.append(SchemaFinding(
+                        removed_rule,
+                        (field_name,),
+                        json_pointer("properties", field_name)
+                    ))
         
         # Check added fields
         for field_name in new_props:
+            field_pointer = json_pointer("properties", field_name)
             if field_name not in old_props:
-                if field_name in new_required:
-                    self._add_change(
-                        ChangeType.BREAKING,
-                        Severity.HIGH,
-                        f"Required field '{field_name}' was added to {context}.",
-                        method=method,
-                        path=path
-                    )
-                else:
-                    self._add_change(
-                        ChangeType.NON_BREAKING,
-                        Severity.LOW,
-                        f"Optional field '{field_name}' was added to {context}.",
-                        method=method,
-                        path=path
-                    )
+                added_rule = diff_rules.REQUIRED_FIELD_ADDED if field_name in new_required else diff_rules.OPTIONAL_FIELD_ADDED
+                if added_rule in enabled:
+                    findings.append(SchemaFinding(
+                        added_rule,
+                        (field_name,),
+                        field_pointer
+                    ))
             else:
-                # Field exists in both - check type changes
-                old_field = old_props[field_name]
-                new_field = new_props[field_name]
+                # Field exists in both - recurse (type changes, nested objects)
+                nested = self._diff_schema_node(old_props[field_name], new_props[field_name], is_response, active)
+                findings.extend(f.lift(field_name, field_pointer) for f in nested)
                 
-                old_type = old_field.get("type")
-                new_type = new_field.get("type")
-                
-                if old_type and new_type and old_type != new_type:
-                    self._add_change(
-                        ChangeType.BREAKING,
-                        Severity.HIGH,
-                        f"Field '{field_name}' type changed from '{old_type}' to '{new_type}' in {context}.",
-                        method=method,
-                        path=path
-                    )
+        # Array items and map values
+        for keyword, token in (("items", "[]"), ("additionalProperties", "*")):
+            old_sub = old_schema.get(keyword)
+            new_sub = new_schema.get(keyword)
+            if isinstance(old_sub, dict) and isinstance(new_sub, dict):
+                nested = self._diff_schema_node(old_sub, new_sub, is_response, active)
+                findings.extend(f.lift(token, json_pointer(keyword)) for f in nested)
+
+        return findings
+
 
+    def _raw_parameter_map(self, params: List[Dict], resolver: RefResolver, op_pointer: str) -> Dict[Tuple[str, str], ParamEntry]:
+        """Map parameters by (name, in) unique key, resolving shared parameters (#/components/parameters/...)"""
+        pmap = {}
+        for i, raw_param in enumerate(params):
+            name, param_in, param_type, required = parameter_entry(resolver.deref(raw_param)[1], resolver)
+            if name is not None and param_in is not None:
+                pmap[(name, param_in)] = (op_pointer + json_pointer("parameters", i), name, param_in, param_type, required)
+        return pmap
 
-    def _compare_parameters(self, path: str, method: str, old_params: List[Dict], new_params: List[Dict]):
-        # Map parameters by (name, in) unique key
-        old_pmap = { (p["name"], p["in"]): p for p in old_params if "name" in p and "in" in p }
-        new_pmap = { (p["name"], p["in"]): p for p in new_params if "name" in p and "in" in p }
+    def _index_parameter_map(self, index: SpecIndex, path: str, method: str) -> Dict[Tuple[str, str], ParamEntry]:
+        return {
+            (row.name, row.location): (row.pointer, row.name, row.location, row.type, row.required)
+            for row in index.operation_rows(path, method, PARAMETER)
+        }
 
+    def _compare_parameters(self, path: str, method: str, old_pmap: Dict[Tuple[str, str], ParamEntry], new_pmap: Dict[Tuple[str, str], ParamEntry]):
         # Check Removed
-        for key, old_p in old_pmap.items():
+        for key, (pointer, name, param_in, _, _) in old_pmap.items():
             if key not in new_pmap:
-                self._add_change(
-                    ChangeType.BREAKING,
-                    Severity.MEDIUM,
-                    f"Parameter '{old_p['name']}' (in {old_p['in']}) was removed.",
+                yield self._change(
+                    diff_rules.PARAMETER_REMOVED,
+                    (name, param_in),
                     method=method,
-                    path=path
+                    path=path,
+                    location=pointer
                 )
 
         # Check Added
         for key, new_p in new_pmap.items():
+            pointer, name, param_in, _, is_required = new_p
             if key not in old_pmap:
-                is_required = new_p.get("required", False)
                 if is_required:
-                    self._add_change(
-                        ChangeType.BREAKING,
-                        Severity.HIGH,
-                        f"Required parameter '{new_p['name']}' (in {new_p['in']}) was added.",
+                    yield self._change(
+                        diff_rules.REQUIRED_PARAMETER_ADDED,
+                        (name, param_in),
                         method=method,
-                        path=path
+                        path=path,
+                        location=pointer
                     )
                 else:
-                    self._add_change(
-                        ChangeType.NON_BREAKING,
-                        Severity.LOW,
-                        f"Optional parameter '{new_p['name']}' (in {new_p['in']}) was added.",
+                    yield self._change(
+                        diff_rules.OPTIONAL_PARAMETER_ADDED,
+                        (name, param_in),
                         method=method,
-                        path=path
+                        path=path,
+                        location=pointer
                     )
             else:
                 # Parameter exists in both - check for type changes
-                old_p = old_pmap[key]
-                self._compare_parameter_schema(path, method, old_p, new_p)
+                yield from self._compare_parameter_schema(path, method, old_pmap[key], new_p)
 
-    def _compare_parameter_schema(self, path: str, method: str, old_param: Dict, new_param: Dict):
+    def _compare_parameter_schema(self, path: str, method: str, old_param: ParamEntry, new_param: ParamEntry):
         """Compare schema changes for a parameter that exists in both versions"""
-        param_name = old_param.get("name", "unknown")
-        param_in = old_param.get("in", "unknown")
-        
-        # Get schema (can be direct or nested in schema key)
-        old_schema = old_param.get("schema", old_param)
-        new_schema = new_param.get("schema", new_param)
+        _, param_name, param_in, old_type, old_required = old_param
+        pointer, _, _, new_type, new_required = new_param
         
         # Check type changes
-        old_type = old_schema.get("type")
-        new_type = new_schema.get("type")
-        
         if old_type and new_type and old_type != new_type:
-            self._add_change(
-                ChangeType.BREAKING,
-                Severity.HIGH,
-                f"Parameter '{param_name}' (in {param_in}) type changed from '{old_type}' to '{new_type}'.",
+            yield self._change(
+                diff_rules.PARAMETER_TYPE_CHANGED,
+                (param_name, param_in, old_type, new_type),
                 method=method,
-                path=path
+                path=path,
+                location=pointer
             )
         
         # Check required flag changes
-        old_required = old_param.get("required", False)
-        new_required = new_param.get("required", False)
-        
         if not old_required and new_required:
-            self._add_change(
-                ChangeType.BREAKING,
-                Severity.HIGH,
-                f"Parameter '{param_name}' (in {param_in}) is now required.",
+            yield self._change(
+                diff_rules.PARAMETER_NOW_REQUIRED,
+                (param_name, param_in),
                 method=method,
-                path=path
+                path=path,
+                location=pointer
             )
         elif old_required and not new_required:
-            self._add_change(
-                ChangeType.NON_BREAKING,
-                Severity.LOW,
-                f"Parameter '{param_name}' (in {param_in}) is no longer required.",
+            yield self._change(
+                diff_rules.PARAMETER_NO_LONGER_REQUIRED,
+                (param_name, param_in),
                 method=method,
-                path=path
+                path=path,
+                location=pointer
             )
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.core.diff_engine import Change, DiffEngine, serialize_changes, deserialize_changes, shard_ranges
+from app.core.diff_rules import RulePlan, compile_plan
+from app.core.fingerprint import body_sections_changed
+from app.core.ref_resolver import RefResolver
+from app.core.spec_index import SpecIndex
+from app.core.spec_normalizer import is_swagger2, normalize_spec
+
+
+class DiffRequest(NamedTuple):
+    """
+    Everything a diff needs, as the JSON text stored in the database.
+    Strings pickle as a memcpy, so handing them to a worker process is cheap
+    and the API process never decodes or re-encodes the specs.
+    """
+    old_fingerprints: Optional[str]
+    new_fingerprints: Optional[str]
+    old_index: Optional[str]
+    new_index: Optional[str]
+    old_raw: Optional[str] = None
+    new_raw: Optional[str] = None
+    shard: Optional[Tuple[int, int]] = None  # (index, count), see DiffEngine.iter_diff
+    include_added: bool = True
+    rules: Optional[str] = None     # the organization's rule settings, see diff_rules.parse_rule_settings
+    paths: Optional[Tuple[str, ...]] = None  # diff only these paths, see diff_compose
+
+
+class DiffOutcome(NamedTuple):
+    rows: Optional[List[List[Any]]]  # serialized changes, None if the raw specs are required
+    path_count: int                  # paths in the old spec, when known from its fingerprints
+
+
+def _loads(text: Optional[str]) -> Any:
+    return json.loads(text) if text is not None else None
+
+
+class BatchDiffRequest(NamedTuple):
+    """One base spec against several candidates, each given as (fingerprints, index, raw) JSON text."""
+    old_fingerprints: Optional[str]
+    old_index: Optional[str]
+    old_raw: Optional[str]
+    candidates: Tuple[Tuple[Optional[str], Optional[str], Optional[str]], ...]
+    rules: Optional[str] = None
+
+
+class _Side(NamedTuple):
+    """One decoded side of a diff"""
+    fingerprints: Optional[Dict[str, Any]]
+    index: Optional[SpecIndex]
+    spec: Optional[Dict[str, Any]]
+
+
+# The batches of a streamed diff (see stream_diff) carry the same specs:
+# each process decodes them once, for its first batch
+@lru_cache(maxsize=2)
+def _side(fingerprints: Optional[str], index: Optional[str], raw: Optional[str]) -> _Side:
+    spec = _loads(raw)
+    if is_swagger2(spec):
+        # Uploaded before normalization existed: convert now, and ignore the
+        # fingerprints and index, which describe the Swagger 2 document
+        return _Side(None, None, normalize_spec(spec))
+    return _Side(_loads(fingerprints), SpecIndex.from_stored(_loads(index)), spec)
+
+
+def _diff_rows(old: _Side, new: _Side, plan: RulePlan, shard: Optional[Tuple[int, int]] = None,
+               include_added: bool = True, old_refs: Optional[RefResolver] = None,
+               paths: Optional[FrozenSet[str]] = None) -> Optional[List[List[Any]]]:
+    """Serialized changes between two sides, or None if the raw specs are required but missing"""
+    has_raw = old.spec is not None and new.spec is not None
+    if not has_raw and (old.index is None or new.index is None
+                        or body_sections_changed(old.fingerprints, new.fingerprints, paths)):
+        return None
+
+    # Serialized as they are found, so no list of Change records is built here
+    changes = DiffEngine(plan).iter_diff(
+        old.spec,
+        new.spec,
+        old.fingerprints,
+        new.fingerprints,
+        old.index,
+        new.index,
+        shard=shard,
+        include_added=include_added,
+        old_refs=old_refs,
+        paths=paths
+    )
+    return serialize_changes(changes)
+
+
+def execute_diff(request: DiffRequest) -> DiffOutcome:
+    """Runs in the executor (worker process or thread)."""
+    old_fp = _loads(request.old_fingerprints)
+    path_count = len(old_fp.get("paths", {})) if isinstance(old_fp, dict) else 0
+    # Plans are compiled once per process and distinct rule settings
+    plan = compile_plan(_loads(request.rules))
+
+    rows = _diff_rows(
+        _side(request.old_fingerprints, request.old_index, request.old_raw),
+        _side(request.new_fingerprints, request.new_index, request.new_raw),
+        plan,
+        shard=request.shard,
+        include_added=request.include_added,
+        paths=frozenset(request.paths) if request.paths is not None else None
+    )
+    return DiffOutcome(rows, path_count)
+
+
+def execute_batch_diff(request: BatchDiffRequest) -> List[Optional[List[List[Any]]]]:
+    """
+    Runs in the executor. The base is decoded and resolved once for all
+    candidates of the request. One entry per candidate, as in _diff_rows.
+    """
+    plan = compile_plan(_loads(request.rules))
+    old = _side(request.old_fingerprints, request.old_index, request.old_raw)
+    old_refs = RefResolver(old.spec) if old.spec is not None else None
+    return [_diff_rows(old, _side(*candidate), plan, old_refs=old_refs) for candidate in request.candidates]
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_diff_executor() -> Optional[Executor]:
+    """
+    The long-lived process pool used for diffs, created on first use.
+    None means the event loop's default thread pool (DIFF_EXECUTOR=thread).
+    """
+    global _process_pool
+    if settings.DIFF_EXECUTOR != "process":
+        return None
+    if _process_pool is None:
+        # spawn: never fork a process that holds an event loop and DB connections
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.DIFF_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def shutdown_diff_executor():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def plan_shards(path_count: int) -> List[Optional[Tuple[int, int]]]:
+    """
+    Shards for a spec with `path_count` paths: one per worker process for big
+    specs, a single unbounded shard otherwise (or when diffs run in threads,
+    where the GIL would serialize them anyway).
+    """
+    if settings.DIFF_EXECUTOR != "process" or path_count < settings.DIFF_SHARD_MIN_PATHS:
+        return [None]
+    shards = min(settings.DIFF_PROCESS_WORKERS, path_count // settings.DIFF_SHARD_MIN_PATHS + 1)
+    # Only the count: each worker slices the paths it compares itself
+    return [(index, shards) for index in range(shards)]
+
+
+async def _submit(fn, request):
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_diff_executor(), fn, request)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM killed); start a fresh pool for the next run
+        shutdown_diff_executor()
+        raise
+
+
+async def run_diff(request: DiffRequest, path_count: int = 0) -> Tuple[Optional[List[Change]], int]:
+    """
+    Diff off the event loop. Returns (changes, path count of the old spec);
+    changes is None if the raw specs are required but were not sent.
+
+    Requests carrying raw specs for a large spec (`path_count`, as returned by
+    a previous call) are split into path shards that run in parallel worker
+    processes. Shards are merged in order, so the result equals a serial run.
+    """
+    shards = plan_shards(path_count) if request.old_raw is not None else [None]
+    if len(shards) == 1:
+        outcome = await _submit(execute_diff, request)
+        rows, path_count = outcome.rows, outcome.path_count
+    else:
+        outcomes = await asyncio.gather(*(
+            _submit(execute_diff, request._replace(shard=shard, include_added=(i == len(shards) - 1)))
+            for i, shard in enumerate(shards)
+        ))
+        rows = [row for outcome in outcomes for row in outcome.rows]
+    return (deserialize_changes(rows) if rows is not None else None), path_count
+
+
+async def stream_diff(request: DiffRequest, path_count: int) -> AsyncIterator[Tuple[List[Change], float]]:
+    """
+    A diff with raw specs in batches of DIFF_STREAM_BATCH_PATHS paths of the
+    old spec (`path_count`, as returned by run_diff), yielded in order as
+    (changes, share of the batches done); the added paths come with the last
+    batch. Concatenated, the batches equal a serial run. One batch per worker
+    process runs ahead while the caller consumes the current one, so only
+    those are held however large the diff is.
+    """
+    count = max(1, -(-path_count // settings.DIFF_STREAM_BATCH_PATHS))
+    ahead = settings.DIFF_PROCESS_WORKERS if settings.DIFF_EXECUTOR == "process" else 1
+    batches = iter(range(count))
+    running: deque = deque()
+
+    def submit():
+        index = next(batches, None)
+        if index is not None:
+            shard = request._replace(shard=(index, count), include_added=(index == count - 1))
+            running.append(asyncio.ensure_future(_submit(execute_diff, shard)))
+
+    try:
+        for _ in range(ahead):
+            submit()
+        done = 0
+        while running:
+            outcome = await running.popleft()
+            submit()
+            done += 1
+            yield deserialize_changes(outcome.rows), done / count
+    finally:
+        # Stopped early (a cancelled run, an error): batches not started are dropped
+        for future in running:
+            future.cancel()
+
+
+async def run_batch_diff(request: BatchDiffRequest) -> List[Optional[List[Change]]]:
+    """
+    Diff off the event loop, one entry per candidate (None if the raw specs
+    are required but were not sent). Candidates are split into one chunk per
+    worker process, so the base is decoded once per worker, not per candidate.
+    """
+    chunks = 1
+    if settings.DIFF_EXECUTOR == "process":
+        chunks = min(settings.DIFF_PROCESS_WORKERS, len(request.candidates))
+    ranges = shard_ranges(len(request.candidates), chunks) if request.candidates else []
+    outcomes = await asyncio.gather(*(
+        _submit(execute_batch_diff, request._replace(candidates=request.candidates[start:end]))
+        for start, end in ranges
+    ))
+    return [
+        deserialize_changes(rows) if rows is not None else None
+        for outcome in outcomes for rows in outcome
+    ]
@@ -0,0 +1,199 @@
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional, Tuple
+import hashlib
+
+from app.models.analysis import ChangeType, Severity
+
+
+# Node kinds the diff engine walks. A kind that no enabled rule inspects is not
+# visited at all (see RulePlan.wants).
+PATH = "path"
+OPERATION = "operation"
+PARAMETER = "parameter"
+REQUEST_BODY = "request_body"
+RESPONSE = "response"
+MEDIA_TYPE = "media_type"
+HEADER = "header"
+SCHEMA = "schema"
+NODE_KINDS = (PATH, OPERATION, PARAMETER, REQUEST_BODY, RESPONSE, MEDIA_TYPE, HEADER, SCHEMA)
+
+
+class Rule(NamedTuple):
+    """
+    One kind of detected change. A change record only stores the rule code and
+    the positional `params`; the description is rendered from `template` when
+    it is needed (persistence, API), not when the change is found.
+    Templates may also use the change's own `method` and `path`.
+    """
+    code: str
+    kind: str                   # node kind the rule inspects, see NODE_KINDS
+    change_type: ChangeType
+    severity: Severity
+    template: str
+    params: Tuple[str, ...] = ()
+
+    def render(self, values: Tuple, **context: Any) -> str:
+        return self.template.format(**context, **dict(zip(self.params, values)))
+
+
+PATH_REMOVED = "PATH_REMOVED"
+PATH_ADDED = "PATH_ADDED"
+OPERATION_REMOVED = "OPERATION_REMOVED"
+OPERATION_ADDED = "OPERATION_ADDED"
+PARAMETER_REMOVED = "PARAMETER_REMOVED"
+REQUIRED_PARAMETER_ADDED = "REQUIRED_PARAMETER_ADDED"
+OPTIONAL_PARAMETER_ADDED = "OPTIONAL_PARAMETER_ADDED"
+PARAMETER_TYPE_CHANGED = "PARAMETER_TYPE_CHANGED"
+PARAMETER_NOW_REQUIRED = "PARAMETER_NOW_REQUIRED"
+PARAMETER_NO_LONGER_REQUIRED = "PARAMETER_NO_LONGER_REQUIRED"
+REQUEST_BODY_REMOVED = "REQUEST_BODY_REMOVED"
+REQUIRED_REQUEST_BODY_ADDED = "REQUIRED_REQUEST_BODY_ADDED"
+OPTIONAL_REQUEST_BODY_ADDED = "OPTIONAL_REQUEST_BODY_ADDED"
+RESPONSE_REMOVED = "RESPONSE_REMOVED"
+ERROR_RESPONSE_REMOVED = "ERROR_RESPONSE_REMOVED"
+RESPONSE_ADDED = "RESPONSE_ADDED"
+REQUEST_MEDIA_TYPE_REMOVED = "REQUEST_MEDIA_TYPE_REMOVED"
+REQUEST_MEDIA_TYPE_ADDED = "REQUEST_MEDIA_TYPE_ADDED"
+RESPONSE_MEDIA_TYPE_REMOVED = "RESPONSE_MEDIA_TYPE_REMOVED"
+RESPONSE_MEDIA_TYPE_ADDED = "RESPONSE_MEDIA_TYPE_ADDED"
+RESPONSE_HEADER_REMOVED = "RESPONSE_HEADER_REMOVED"
+RESPONSE_HEADER_ADDED = "RESPONSE_HEADER_ADDED"
+RESPONSE_HEADER_TYPE_CHANGED = "RESPONSE_HEADER_TYPE_CHANGED"
+RESPONSE_FIELD_REMOVED = "RESPONSE_FIELD_REMOVED"
+REQUEST_FIELD_REMOVED = "REQUEST_FIELD_REMOVED"
+REQUIRED_FIELD_ADDED = "REQUIRED_FIELD_ADDED"
+OPTIONAL_FIELD_ADDED = "OPTIONAL_FIELD_ADDED"
+FIELD_TYPE_CHANGED = "FIELD_TYPE_CHANGED"
+SCHEMA_TYPE_CHANGED = "SCHEMA_TYPE_CHANGED"
+
+# Registry of every known rule, by code. Extensions add theirs with register_rule().
+RULES: Dict[str, Rule] = {}
+
+
+def register_rule(rule: Rule) -> Rule:
+    if rule.code in RULES:
+        raise ValueError(f"Rule {rule.code} is already registered")
+    if rule.kind not in NODE_KINDS:
+        raise ValueError(f"Rule {rule.code} inspects unknown node kind '{rule.kind}'")
+    RULES[rule.code] = rule
+    return rule
+
+
+for _rule in (
+    # Paths & operations
+    Rule(PATH_REMOVED, PATH, ChangeType.BREAKING, Severity.HIGH,
+         "Path '{path}' was removed."),
+    Rule(PATH_ADDED, PATH, ChangeType.NON_BREAKING, Severity.LOW,
+         "Path '{path}' was added."),
+    Rule(OPERATION_REMOVED, OPERATION, ChangeType.BREAKING, Severity.HIGH,
+         "Operation {method} {path} was removed."),
+    Rule(OPERATION_ADDED, OPERATION, ChangeType.NON_BREAKING, Severity.LOW,
+         "Operation {method} {path} was added."),
+
+    # Parameters
+    Rule(PARAMETER_REMOVED, PARAMETER, ChangeType.BREAKING, Severity.MEDIUM,
+         "Parameter '{name}' (in {param_in}) was removed.", ("name", "param_in")),
+    Rule(REQUIRED_PARAMETER_ADDED, PARAMETER, ChangeType.BREAKING, Severity.HIGH,
+         "Required parameter '{name}' (in {param_in}) was added.", ("name", "param_in")),
+    Rule(OPTIONAL_PARAMETER_ADDED, PARAMETER, ChangeType.NON_BREAKING, Severity.LOW,
+         "Optional parameter '{name}' (in {param_in}) was added.", ("name", "param_in")),
+    Rule(PARAMETER_TYPE_CHANGED, PARAMETER, ChangeType.BREAKING, Severity.HIGH,
+         "Parameter '{name}' (in {param_in}) type changed from '{old_type}' to '{new_type}'.",
+         ("name", "param_in", "old_type", "new_type")),
+    Rule(PARAMETER_NOW_REQUIRED, PARAMETER, ChangeType.BREAKING, Severity.HIGH,
+         "Parameter '{name}' (in {param_in}) is now required.", ("name", "param_in")),
+    Rule(PARAMETER_NO_LONGER_REQUIRED, PARAMETER, ChangeType.NON_BREAKING, Severity.LOW,
+         "Parameter '{name}' (in {param_in}) is no longer required.", ("name", "param_in")),
+
+    # Request bodies & responses
+    Rule(REQUEST_BODY_REMOVED, REQUEST_BODY, ChangeType.BREAKING, Severity.HIGH,
+         "Request body was removed."),
+    Rule(REQUIRED_REQUEST_BODY_ADDED, REQUEST_BODY, ChangeType.BREAKING, Severity.HIGH,
+         "Required request body was added."),
+    Rule(OPTIONAL_REQUEST_BODY_ADDED, REQUEST_BODY, ChangeType.NON_BREAKING, Severity.LOW,
+         "Optional request body was added."),
+    Rule(RESPONSE_REMOVED, RESPONSE, ChangeType.BREAKING, Severity.HIGH,
+         "Response {code} was removed.", ("code",)),
+    Rule(ERROR_RESPONSE_REMOVED, RESPONSE, ChangeType.NON_BREAKING, Severity.LOW,
+         "Response {code} was removed.", ("code",)),
+    Rule(RESPONSE_ADDED, RESPONSE, ChangeType.NON_BREAKING, Severity.LOW,
+         "Response {code} was added.", ("code",)),
+    Rule(REQUEST_MEDIA_TYPE_REMOVED, MEDIA_TYPE, ChangeType.BREAKING, Severity.HIGH,
+         "Media type '{media_type}' is no longer accepted in {context}.", ("media_type", "context")),
+    Rule(REQUEST_MEDIA_TYPE_ADDED, MEDIA_TYPE, ChangeType.NON_BREAKING, Severity.LOW,
+         "Media type '{media_type}' is now accepted in {context}.", ("media_type", "context")),
+    Rule(RESPONSE_MEDIA_TYPE_REMOVED, MEDIA_TYPE, ChangeType.BREAKING, Severity.MEDIUM,
+         "Media type '{media_type}' was removed from {context}.", ("media_type", "context")),
+    Rule(RESPONSE_MEDIA_TYPE_ADDED, MEDIA_TYPE, ChangeType.NON_BREAKING, Severity.LOW,
+         "Media type '{media_type}' was added to {context}.", ("media_type", "context")),
+    Rule(RESPONSE_HEADER_REMOVED, HEADER, ChangeType.BREAKING, Severity.MEDIUM,
+         "Header '{name}' was removed from response {code}.", ("name", "code")),
+    Rule(RESPONSE_HEADER_ADDED, HEADER, ChangeType.NON_BREAKING, Severity.LOW,
+         "Header '{name}' was added to response {code}.", ("name", "code")),
+    Rule(RESPONSE_HEADER_TYPE_CHANGED, HEADER, ChangeType.BREAKING, Severity.MEDIUM,
+         "Header '{name}' of response {code} type changed from '{old_type}' to '{new_type}'.",
+         ("name", "code", "old_type", "new_type")),
+
+    # Schemas
+    Rule(RESPONSE_FIELD_REMOVED, SCHEMA, ChangeType.BREAKING, Severity.HIGH,
+         "Response field '{field}' was removed.", ("field", "context")),
+    Rule(REQUEST_FIELD_REMOVED, SCHEMA, ChangeType.BREAKING, Severity.MEDIUM,
+         "Request field '{field}' was removed.", ("field", "context")),
+    Rule(REQUIRED_FIELD_ADDED, SCHEMA, ChangeType.BREAKING, Severity.HIGH,
+         "Required field '{field}' was added to {context}.", ("field", "context")),
+    Rule(OPTIONAL_FIELD_ADDED, SCHEMA, ChangeType.NON_BREAKING, Severity.LOW,
+         "Optional field '{field}' was added to {context}.", ("field", "context")),
+    Rule(FIELD_TYPE_CHANGED, SCHEMA, ChangeType.BREAKING, Severity.HIGH,
+         "Field '{field}' type changed from '{old_type}' to '{new_type}' in {context}.",
+         ("field", "context", "old_type", "new_type")),
+    Rule(SCHEMA_TYPE_CHANGED, SCHEMA, ChangeType.BREAKING, Severity.HIGH,
+         "Schema type changed from '{old_type}' to '{new_type}' in {context}.",
+         ("field", "context", "old_type", "new_type")),
+):
+    register_rule(_rule)
+
+
+class RulePlan:
+    """
+    The rules one organization runs, compiled once from its rule settings:
+    enabled rule codes, effective severities and the node kinds worth visiting.
+    `key` identifies the plan in diff cache keys ('' for the default plan).
+    """
+
+    def __init__(self, disabled: FrozenSet[str], overrides: Tuple[Tuple[str, Severity], ...]):
+        self.enabled = frozenset(code for code in RULES if code not in disabled)
+        self.severity: Dict[str, Severity] = {code: RULES[code].severity for code in self.enabled}
+        self.severity.update((code, severity) for code, severity in overrides if code in self.enabled)
+        self.kinds = frozenset(RULES[code].kind for code in self.enabled)
+
+        changed = sorted(disabled) + [f"{code}={severity.value}" for code, severity in sorted(overrides)]
+        self.key = hashlib.blake2b("\0".join(changed).encode("utf-8"), digest_size=8).hexdigest() if changed else ""
+
+    def wants(self, *kinds: str) -> bool:
+        """True if any enabled rule inspects one of `kinds`"""
+        return any(kind in self.kinds for kind in kinds)
+
+
+def parse_rule_settings(settings: Optional[Dict[str, Any]]) -> Tuple[FrozenSet[str], Tuple[Tuple[str, Severity], ...]]:
+    """
+    Validate per-organization rule settings:
+    {"disabled": ["OPTIONAL_FIELD_ADDED"], "severity": {"REQUEST_FIELD_REMOVED": "HIGH"}}
+    Raises ValueError for unknown rule codes or severities.
+    """
+    settings = settings or {}
+    disabled = frozenset(settings.get("disabled") or ())
+    overrides = tuple(sorted((code, Severity(value)) for code, value in (settings.get("severity") or {}).items()))
+    unknown = sorted((disabled | {code for code, _ in overrides}) - RULES.keys())
+    if unknown:
+        raise ValueError(f"Unknown diff rules: {', '.join(unknown)}")
+    return disabled, overrides
+
+
+@lru_cache(maxsize=256)
+def _compile(disabled: FrozenSet[str], overrides: Tuple[Tuple[str, Severity], ...]) -> RulePlan:
+    return RulePlan(disabled, overrides)
+
+
+def compile_plan(settings: Optional[Dict[str, Any]] = None) -> RulePlan:
+    """Dispatch plan for an organization's rule settings, compiled once per distinct settings."""
+    return _compile(*parse_rule_settings(settings))
@@ -0,0 +1,170 @@
+from typing import Any, Collection, Dict, List, Optional
+import hashlib
+import json
+
+from app.core.ref_resolver import RefResolver, iter_refs
+
+# Bump when the hashing scheme changes; fingerprints with another version are ignored.
+FINGERPRINT_VERSION = 1
+
+HTTP_METHODS = {"get", "put", "post", "delete", "options", "head", "patch", "trace"}
+
+# Operation sections the diff engine compares independently
+OPERATION_SECTIONS = ("parameters", "requestBody", "responses")
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _canonical(node: Any) -> str:
+    return json.dumps(node, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class SpecHasher:
+    """
+    Hashes nodes of one spec. A node's hash covers its own content plus the
+    content of every component reachable from it through `$ref`, so a change
+    inside a shared schema changes the hash of every operation that uses it.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.resolver = RefResolver(spec)
+        self._own: Dict[str, str] = {}
+        self.components: Dict[str, str] = {
+            pointer: self._component_hash(pointer) for pointer in self.resolver.graph
+        }
+
+    def _own_hash(self, pointer: str) -> str:
+        if pointer not in self._own:
+            self._own[pointer] = _digest(_canonical(self.resolver.resolve(pointer)))
+        return self._own[pointer]
+
+    def _component_hash(self, pointer: str) -> str:
+        # Transitive closure over the reference graph (cycle safe)
+        closure = set()
+        stack = [pointer]
+        while stack:
+            current = stack.pop()
+            if current in closure:
+                continue
+            closure.add(current)
+            stack.extend(self.resolver.graph.get(current, ()))
+        return _digest(*(f"{p}={self._own_hash(p)}" for p in sorted(closure)))
+
+    def node_hash(self, node: Any) -> str:
+        refs = sorted(set(iter_refs(node)))
+        return _digest(
+            _canonical(node),
+            *(f"{ref}={self.components.get(ref) or self._own_hash(ref)}" for ref in refs)
+        )
+
+
+def compute_fingerprints(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merkle-style fingerprints for a spec, computed bottom-up:
+    operation sections -> operations -> paths -> root.
+
+    {
+        "version": 1,
+        "root": "<hash of all paths>",
+        "paths": {
+            "/users": {
+                "hash": "...",
+                "operations": {"get": {"hash": "...", "parameters": "...", "requestBody": "...", "responses": "..."}}
+            }
+        },
+        "components": {"#/components/schemas/User": "..."}
+    }
+    """
+    hasher = SpecHasher(spec)
+    paths: Dict[str, Any] = {}
+
+    for path, path_item in (spec.get("paths") or {}).items():
+        if not isinstance(path_item, dict):
+            continue
+
+        operations = {}
+        for method, operation in path_item.items():
+            if method.lower() not in HTTP_METHODS or not isinstance(operation, dict):
+                continue
+            operations[method] = {
+                "hash": hasher.node_hash(operation),
+                **{section: hasher.node_hash(operation.get(section)) for section in OPERATION_SECTIONS}
+            }
+
+        # Path-level keys (shared parameters, summary, x-*) also belong to the path hash
+        shared = {key: value for key, value in path_item.items() if key not in operations}
+        paths[path] = {
+            "hash": _digest(
+                hasher.node_hash(shared),
+                *(f"{method}={op['hash']}" for method, op in sorted(operations.items()))
+            ),
+            "operations": operations
+        }
+
+    return {
+        "version": FINGERPRINT_VERSION,
+        "root": _digest(*(f"{path}={item['hash']}" for path, item in sorted(paths.items()))),
+        "paths": paths,
+        "components": hasher.components
+    }
+
+
+def body_sections_changed(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]],
+                          paths: Optional[Collection[str]] = None) -> bool:
+    """
+    True if some operation present in both specs has a different request body
+    or responses hash, i.e. the diff needs the raw schemas. Unknown -> True.
+    `paths` limits the check to the paths a restricted diff looks at.
+    """
+    old, new = usable_fingerprints(old), usable_fingerprints(new)
+    if old is None or new is None:
+        return True
+    if old["root"] == new["root"]:
+        return False
+    for path, old_item in old["paths"].items():
+        if paths is not None and path not in paths:
+            continue
+        new_item = new["paths"].get(path)
+        if new_item is None or new_item["hash"] == old_item["hash"]:
+            continue
+        for method, old_op in old_item["operations"].items():
+            new_op = new_item["operations"].get(method)
+            if new_op is None or new_op["hash"] == old_op["hash"]:
+                continue
+            if new_op["requestBody"] != old_op["requestBody"] or new_op["responses"] != old_op["responses"]:
+                return True
+    return False
+
+
+def usable_fingerprints(fingerprints: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Return the fingerprints if they were produced by the current scheme, else None."""
+    if isinstance(fingerprints, dict) and fingerprints.get("version") == FINGERPRINT_VERSION:
+        return fingerprints
+    return None
+
+
+def path_delta(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    The paths whose content differs between two spec versions, with their
+    hashes on both sides (None where the path is absent). None if either
+    side has no usable fingerprints.
+
+    {"version": 1, "paths": {"/users": ["<old hash>", "<new hash>"], "/orders": [None, "<new hash>"]}}
+    """
+    old, new = usable_fingerprints(old), usable_fingerprints(new)
+    if old is None or new is None:
+        return None
+    paths: Dict[str, List[Optional[str]]] = {}
+    if old["root"] != new["root"]:
+        for path in old["paths"].keys() | new["paths"].keys():
+            old_hash = old["paths"][path]["hash"] if path in old["paths"] else None
+            new_hash = new["paths"][path]["hash"] if path in new["paths"] else None
+            if old_hash != new_hash:
+                paths[path] = [old_hash, new_hash]
+    return {"version": FINGERPRINT_VERSION, "paths": paths}
@@ -0,0 +1,104 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def split_path(path: str) -> List[str]:
+    """Segments of a path; empty segments (leading, trailing or doubled slashes) are dropped"""
+    return [segment for segment in path.split("?", 1)[0].split("/") if segment]
+
+
+def is_template_segment(segment: str) -> bool:
+    return "{" in segment and "}" in segment
+
+
+class _Node:
+    """A segment of the inserted templates. Parameter segments share one child, whatever their name."""
+
+    __slots__ = ("literals", "param", "templates")
+
+    def __init__(self):
+        self.literals: Dict[str, "_Node"] = {}
+        self.param: Optional["_Node"] = None
+        self.templates: List[str] = []
+
+
+class _State:
+    """A compiled state: the trie nodes a path prefix can be at, in priority order."""
+
+    __slots__ = ("literals", "other", "templates")
+
+    def __init__(self):
+        self.literals: Dict[str, "_State"] = {}
+        self.other: Optional["_State"] = None     # any segment without a literal transition
+        self.templates: Tuple[str, ...] = ()
+
+
+class PathTrie:
+    """
+    Routes concrete paths (`/users/123`) and templates with any parameter
+    names (`/users/{userId}`) to the spec path templates they denote
+    (`/users/{id}`).
+
+    As in OpenAPI, a literal segment takes precedence over a parameter at the
+    same position (`/users/me` before `/users/{id}`), with earlier segments
+    deciding first. The trie is compiled into a deterministic automaton when
+    built, so a lookup is one dict probe per segment, whatever the number of
+    templates, and never backtracks.
+    """
+
+    def __init__(self, templates: Iterable[str]):
+        root = _Node()
+        for template in templates:
+            node = root
+            for segment in split_path(template):
+                if is_template_segment(segment):
+                    if node.param is None:
+                        node.param = _Node()
+                    node = node.param
+                else:
+                    node = node.literals.setdefault(segment, _Node())
+            node.templates.append(template)
+        self._start = self._compile(root)
+
+    @staticmethod
+    def _compile(root: _Node) -> _State:
+        # Subset construction over node tuples. A literal segment moves every
+        # node to its literal child, then to its parameter child, in that
+        # order, which keeps the precedence of the backtracking search.
+        states: Dict[Tuple[int, ...], _State] = {}
+        pending: List[Tuple[_State, Tuple[_Node, ...]]] = []
+
+        def state(nodes: Tuple[_Node, ...]) -> Optional[_State]:
+            if not nodes:
+                return None
+            key = tuple(map(id, nodes))
+            found = states.get(key)
+            if found is None:
+                found = states[key] = _State()
+                pending.append((found, nodes))
+            return found
+
+        start = state((root,))
+        while pending:
+            current, nodes = pending.pop()
+            current.templates = next((tuple(node.templates) for node in nodes if node.templates), ())
+            for segment in {segment for node in nodes for segment in node.literals}:
+                current.literals[segment] = state(tuple(
+                    child for node in nodes for child in (node.literals.get(segment), node.param) if child is not None
+                ))
+            current.other = state(tuple(node.param for node in nodes if node.param is not None))
+        return start
+
+    def match(self, path: str) -> Tuple[str, ...]:
+        """
+        The templates `path` routes to: usually one, several only if the
+        templates differ just in parameter names. Empty if none matches.
+        """
+        current: Optional[_State] = self._start
+        for segment in split_path(path):
+            if is_template_segment(segment):
+                current = current.other
+            else:
+                current = current.literals.get(segment, current.other)
+            if current is None:
+                return ()
+        return current.templates
@@ -0,0 +1,158 @@
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+# Sections that hold reusable, referenceable nodes.
+# OpenAPI 3 keeps them under `components`, Swagger 2 at the document root.
+OAS3_COMPONENT_ROOT = "components"
+SWAGGER2_COMPONENT_SECTIONS = ("definitions", "parameters", "responses")
+
+
+# Returned for references that cannot be resolved. Shared so callers that
+# key caches on node identity never see a recycled id.
+UNRESOLVED: Dict[str, Any] = {}
+
+
+def escape_pointer(token: str) -> str:
+    """Escape one JSON pointer reference token (RFC 6901)."""
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def unescape_pointer(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def json_pointer(*tokens: Any) -> str:
+    """Build a JSON pointer (RFC 6901) from unescaped reference tokens."""
+    return "".join("/" + escape_pointer(str(token)) for token in tokens)
+
+
+def iter_refs(node: Any) -> Iterator[str]:
+    """Yield every `$ref` string found anywhere below `node`."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            ref = current.get("$ref")
+            if isinstance(ref, str):
+                yield ref
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+
+
+class RefResolver:
+    """
+    Resolves local `$ref` pointers (e.g. '#/components/schemas/User') for one spec.
+
+    The reference graph (component -> components it references directly) is
+    built once, on first use. Pointer lookups are cached, so resolving the same
+    component from hundreds of operations costs one dict hit.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec or {}
+        self._nodes: Dict[str, Any] = {}
+        self._graph: Optional[Dict[str, Set[str]]] = None
+        self._dependents: Optional[Dict[str, Set[str]]] = None
+
+    @property
+    def graph(self) -> Dict[str, Set[str]]:
+        if self._graph is None:
+            self._graph = {}
+            self._build_graph()
+        return self._graph
+
+    def _iter_components(self) -> Iterator[Tuple[str, Any]]:
+        components = self.spec.get(OAS3_COMPONENT_ROOT)
+        if isinstance(components, dict):
+            for section, items in components.items():
+                if not isinstance(items, dict):
+                    continue
+                for name, node in items.items():
+                    yield f"#/{OAS3_COMPONENT_ROOT}/{escape_pointer(section)}/{escape_pointer(name)}", node
+
+        for section in SWAGGER2_COMPONENT_SECTIONS:
+            items = self.spec.get(section)
+            if not isinstance(items, dict):
+                continue
+            for name, node in items.items():
+                yield f"#/{section}/{escape_pointer(name)}", node
+
+    def _build_graph(self):
+        for pointer, node in self._iter_components():
+            self._nodes[pointer] = node
+            self._graph[pointer] = {ref for ref in iter_refs(node) if ref.startswith("#/")}
+
+    def resolve(self, ref: str) -> Optional[Any]:
+        """Return the node a local `$ref` points to, or None if it cannot be resolved."""
+        if ref in self._nodes:
+            return self._nodes[ref]
+        if not ref.startswith("#/"):
+            # External references (other files / URLs) are not followed
+            return None
+
+        node: Any = self.spec
+        for token in ref[2:].split("/"):
+            token = unescape_pointer(token)
+            if isinstance(node, dict) and token in node:
+                node = node[token]
+            elif isinstance(node, list) and token.isdigit() and int(token) < len(node):
+                node = node[int(token)]
+            else:
+                node = None
+                break
+
+        self._nodes[ref] = node
+        return node
+
+    def deref(self, node: Any) -> Tuple[Optional[str], Any]:
+        """
+        Follow `$ref` chains starting at `node`.
+        Returns (last ref followed or None, resolved node). Unresolvable refs resolve to UNRESOLVED.
+        """
+        ref = None
+        seen = set()
+        while isinstance(node, dict) and isinstance(node.get("$ref"), str):
+            ref = node["$ref"]
+            if ref in seen:
+                # Self-referencing alias chain, nothing more to follow
+                return ref, UNRESOLVED
+            seen.add(ref)
+            resolved = self.resolve(ref)
+            node = resolved if resolved is not None else UNRESOLVED
+        return ref, node
+
+    def dependents(self) -> Dict[str, Set[str]]:
+        """Reverse reference graph: component -> components that reference it. Built once."""
+        if self._dependents is None:
+            self._dependents = {}
+            for pointer, refs in self.graph.items():
+                for ref in refs:
+                    self._dependents.setdefault(ref, set()).add(pointer)
+        return self._dependents
+
+
+def changed_refs(old: RefResolver, new: RefResolver) -> Set[str]:
+    """
+    Components whose content differs between two specs, either directly or
+    through anything they reference. A component missing from this set is
+    identical (including everything reachable from it) in both specs.
+    """
+    changed = {
+        pointer
+        for pointer in old.graph.keys() | new.graph.keys()
+        if old.resolve(pointer) != new.resolve(pointer)
+    }
+
+    # Copied: the resolvers' own reverse graphs are cached and must stay intact
+    reverse = {pointer: set(users) for pointer, users in old.dependents().items()}
+    for pointer, users in new.dependents().items():
+        reverse.setdefault(pointer, set()).update(users)
+
+    stack = list(changed)
+    while stack:
+        pointer = stack.pop()
+        for user in reverse.get(pointer, ()):
+            if user not in changed:
+                changed.add(user)
+                stack.append(user)
+    return changed
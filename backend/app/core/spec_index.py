@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.fingerprint import HTTP_METHODS, SpecHasher
+from app.core.ref_resolver import RefResolver, json_pointer
+
+# Bump when the row layout changes; stored indexes with another version are ignored.
+# 2: built from the normalized (OpenAPI 3) document
+INDEX_VERSION = 2
+
+COLUMNS = ("kind", "path", "method", "location", "name", "type", "required", "fingerprint", "pointer")
+
+OPERATION = "operation"
+PARAMETER = "parameter"
+
+
+class IndexRow(NamedTuple):
+    kind: str
+    path: str
+    method: str                 # lower case HTTP method
+    location: Optional[str]     # parameter 'in'
+    name: Optional[str]
+    type: Optional[str]
+    required: bool
+    fingerprint: Optional[str]
+    pointer: str                # JSON pointer of the node in the spec
+
+
+def parameter_entry(param: Dict[str, Any], resolver: RefResolver) -> Tuple[Optional[str], Optional[str], Optional[str], bool]:
+    """(name, in, type, required) of an already dereferenced parameter"""
+    # Schema can be direct (Swagger 2) or nested in the schema key (OpenAPI 3)
+    schema = resolver.deref(param.get("schema", param))[1]
+    param_type = schema.get("type") if isinstance(schema, dict) else None
+    return param.get("name"), param.get("in"), param_type, bool(param.get("required", False))
+
+
+def build_spec_index(spec: Dict[str, Any], fingerprints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Flatten a spec into one row per operation and parameter, the parts the
+    diff engine reads from it (schemas are compared on the document itself,
+    see DiffEngine.iter_diff). Returned in the compact stored form:
+    {"version": 2, "columns": [...], "rows": [[...], ...]}
+    """
+    hasher = SpecHasher(spec)
+    resolver = hasher.resolver
+    fp_paths = (fingerprints or {}).get("paths", {})
+    rows: List[IndexRow] = []
+
+    for path, path_item in (spec.get("paths") or {}).items():
+        if not isinstance(path_item, dict):
+            continue
+        for method, operation in path_item.items():
+            if method.lower() not in HTTP_METHODS or not isinstance(operation, dict):
+                continue
+            op_pointer = json_pointer("paths", path, method)
+            op_fp = fp_paths.get(path, {}).get("operations", {}).get(method, {}).get("hash")
+            method = method.lower()
+            rows.append(IndexRow(
+                OPERATION, path, method, None, operation.get("operationId"), None, False,
+                op_fp or hasher.node_hash(operation), op_pointer
+            ))
+
+            for i, raw_param in enumerate(operation.get("parameters") or []):
+                param = resolver.deref(raw_param)[1]
+                if not isinstance(param, dict):
+                    continue
+                name, param_in, param_type, required = parameter_entry(param, resolver)
+                if name is None or param_in is None:
+                    continue
+                rows.append(IndexRow(
+                    PARAMETER, path, method, param_in, name, param_type, required,
+                    hasher.node_hash(raw_param), op_pointer + json_pointer("parameters", i)
+                ))
+
+    return {"version": INDEX_VERSION, "columns": list(COLUMNS), "rows": [list(row) for row in rows]}
+
+
+class SpecIndex:
+    """
+    Read side of a stored index. Lookups are grouped per operation once, so
+    the diff engine never walks the raw spec for them.
+    """
+
+    def __init__(self, rows: List[IndexRow]):
+        self.rows = rows
+        self._by_operation: Dict[Tuple[str, str], List[IndexRow]] = {}
+        for row in rows:
+            self._by_operation.setdefault((row.path, row.method), []).append(row)
+
+    @classmethod
+    def from_stored(cls, data: Optional[Dict[str, Any]]) -> Optional["SpecIndex"]:
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return None
+        return cls([IndexRow(*row) for row in data.get("rows", [])])
+
+    def operation_rows(self, path: str, method: str, kind: str) -> List[IndexRow]:
+        return [row for row in self._by_operation.get((path, method.lower()), ()) if row.kind == kind]
@@ -0,0 +1,238 @@
+from typing import Any, Dict, List, Optional
+import copy
+
+from app.core.fingerprint import HTTP_METHODS
+from app.core.ref_resolver import unescape_pointer
+
+DEFAULT_MEDIA_TYPE = "application/json"
+FORM_MEDIA_TYPES = ("application/x-www-form-urlencoded", "multipart/form-data")
+
+# Swagger 2 parameter/header keywords that move into `schema` in OpenAPI 3
+SCHEMA_KEYWORDS = (
+    "type", "format", "items", "collectionFormat", "default", "maximum", "exclusiveMaximum",
+    "minimum", "exclusiveMinimum", "maxLength", "minLength", "pattern", "maxItems",
+    "minItems", "uniqueItems", "enum", "multipleOf"
+)
+
+
+def is_swagger2(spec: Any) -> bool:
+    return isinstance(spec, dict) and str(spec.get("swagger", "")).startswith("2")
+
+
+def normalize_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonical OpenAPI 3 form of a spec. OpenAPI 3 documents are returned as is
+    (same object); Swagger 2 documents are converted into a new document:
+
+    - definitions / parameters / responses move under `components`
+      (body parameters become `components/requestBodies`) and refs are rewritten
+    - `in: body` and `in: formData` parameters become the `requestBody`
+    - response `schema` moves into `content`, one entry per `produces` media type
+    - parameter and header type keywords move into `schema`
+
+    Run once at upload; the diff engine, fingerprints and index only ever see
+    the normalized document.
+    """
+    if not is_swagger2(spec):
+        return spec
+    return _Swagger2Converter(copy.deepcopy(spec)).convert()
+
+
+class _Swagger2Converter:
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self.consumes: List[str] = spec.get("consumes") or [DEFAULT_MEDIA_TYPE]
+        self.produces: List[str] = spec.get("produces") or [DEFAULT_MEDIA_TYPE]
+        shared_params = spec.get("parameters") or {}
+        # Shared parameters that are bodies are referenced as request bodies in OAS3
+        self.body_params = {
+            name for name, param in shared_params.items()
+            if isinstance(param, dict) and param.get("in") in ("body", "formData")
+        }
+
+    def convert(self) -> Dict[str, Any]:
+        spec = self._rewrite_refs(self.spec)
+        out: Dict[str, Any] = {"openapi": "3.0.3"}
+        for key, value in spec.items():
+            if key in ("swagger", "host", "basePath", "schemes", "consumes", "produces", "paths",
+                       "definitions", "parameters", "responses", "securityDefinitions"):
+                continue
+            out[key] = value
+
+        servers = self._servers(spec)
+        if servers:
+            out["servers"] = servers
+
+        out["paths"] = {
+            path: self._path_item(item) if isinstance(item, dict) else item
+            for path, item in (spec.get("paths") or {}).items()
+        }
+
+        components: Dict[str, Any] = {}
+        if spec.get("definitions"):
+            components["schemas"] = spec["definitions"]
+        for name, param in (spec.get("parameters") or {}).items():
+            if name in self.body_params:
+                components.setdefault("requestBodies", {})[name] = self._request_body([param], self.consumes)
+            else:
+                components.setdefault("parameters", {})[name] = self._parameter(param)
+        if spec.get("responses"):
+            components["responses"] = {
+                code: self._response(response, self.produces) for code, response in spec["responses"].items()
+            }
+        if spec.get("securityDefinitions"):
+            components["securitySchemes"] = spec["securityDefinitions"]
+        if components:
+            out["components"] = components
+        return out
+
+    def _rewrite_refs(self, node: Any) -> Any:
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str):
+                node = dict(node, **{"$ref": self._ref(ref)})
+            return {key: self._rewrite_refs(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [self._rewrite_refs(item) for item in node]
+        return node
+
+    def _ref(self, ref: str) -> str:
+        for section, target in (("definitions", "schemas"), ("responses", "responses")):
+            prefix = f"#/{section}/"
+            if ref.startswith(prefix):
+                return f"#/components/{target}/{ref[len(prefix):]}"
+        prefix = "#/parameters/"
+        if ref.startswith(prefix):
+            name = ref[len(prefix):]
+            target = "requestBodies" if unescape_pointer(name) in self.body_params else "parameters"
+            return f"#/components/{target}/{name}"
+        return ref
+
+    def _servers(self, spec: Dict[str, Any]) -> List[Dict[str, str]]:
+        host = spec.get("host")
+        if not host:
+            return [{"url": spec["basePath"]}] if spec.get("basePath") else []
+        base_path = spec.get("basePath", "")
+        return [{"url": f"{scheme}://{host}{base_path}"} for scheme in (spec.get("schemes") or ["https"])]
+
+    def _path_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        shared = item.get("parameters") or []
+        shared_bodies = [p for p in shared if self._is_body(p)]
+        out: Dict[str, Any] = {}
+        for key, value in item.items():
+            if key == "parameters":
+                params = [self._parameter(p) for p in shared if not self._is_body(p)]
+                if params:
+                    out["parameters"] = params
+            elif key.lower() in HTTP_METHODS and isinstance(value, dict):
+                out[key] = self._operation(value, shared_bodies)
+            else:
+                out[key] = value
+        return out
+
+    def _operation(self, operation: Dict[str, Any], shared_bodies: List[Any]) -> Dict[str, Any]:
+        consumes = operation.get("consumes") or self.consumes
+        produces = operation.get("produces") or self.produces
+        params = operation.get("parameters") or []
+        bodies = [p for p in params if self._is_body(p)]
+        if not bodies and shared_bodies:
+            bodies = shared_bodies
+
+        out: Dict[str, Any] = {}
+        for key, value in operation.items():
+            if key in ("consumes", "produces"):
+                continue
+            if key == "parameters":
+                converted = [self._parameter(p) for p in params if not self._is_body(p)]
+                if converted:
+                    out["parameters"] = converted
+            elif key == "responses" and isinstance(value, dict):
+                out["responses"] = {code: self._response(resp, produces) for code, resp in value.items()}
+            else:
+                out[key] = value
+
+        if bodies:
+            out["requestBody"] = self._request_body(bodies, consumes)
+        return out
+
+    def _is_body(self, param: Any) -> bool:
+        if not isinstance(param, dict):
+            return False
+        ref = param.get("$ref")
+        if isinstance(ref, str):
+            return ref.startswith("#/components/requestBodies/")
+        return param.get("in") in ("body", "formData")
+
+    def _request_body(self, params: List[Dict[str, Any]], consumes: List[str]) -> Dict[str, Any]:
+        # A body parameter reference stays a reference, to the shared request body
+        if len(params) == 1 and "$ref" in params[0]:
+            return {"$ref": params[0]["$ref"]}
+
+        body = next((p for p in params if p.get("in") == "body"), None)
+        if body is not None:
+            request_body: Dict[str, Any] = {
+                "content": {media: {"schema": body.get("schema", {})} for media in consumes}
+            }
+            if body.get("description"):
+                request_body["description"] = body["description"]
+            if body.get("required"):
+                request_body["required"] = True
+            return request_body
+
+        # formData parameters become the properties of one object schema
+        schema: Dict[str, Any] = {"type": "object", "properties": {}}
+        required = []
+        for param in params:
+            name = param.get("name")
+            if name is None:
+                continue
+            schema["properties"][name] = self._schema_of(param)
+            if param.get("required"):
+                required.append(name)
+        if required:
+            schema["required"] = required
+        media_types = [media for media in consumes if media in FORM_MEDIA_TYPES] or [FORM_MEDIA_TYPES[0]]
+        request_body = {"content": {media: {"schema": schema} for media in media_types}}
+        if required:
+            request_body["required"] = True
+        return request_body
+
+    def _schema_of(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        schema = {key: node[key] for key in SCHEMA_KEYWORDS if key in node and key != "collectionFormat"}
+        if node.get("type") == "file":
+            schema.update(type="string", format="binary")
+        return schema
+
+    def _parameter(self, param: Any) -> Any:
+        if not isinstance(param, dict) or "$ref" in param:
+            return param
+        out = {key: value for key, value in param.items() if key not in SCHEMA_KEYWORDS and key != "allowEmptyValue"}
+        if "schema" not in param:
+            out["schema"] = self._schema_of(param)
+        if param.get("in") == "path":
+            out["required"] = True
+        return out
+
+    def _response(self, response: Any, produces: List[str]) -> Any:
+        if not isinstance(response, dict) or "$ref" in response:
+            return response
+        out = {key: value for key, value in response.items() if key not in ("schema", "examples", "headers")}
+        out.setdefault("description", "")
+        if "schema" in response:
+            out["content"] = {media: {"schema": response["schema"]} for media in produces}
+        if isinstance(response.get("headers"), dict):
+            out["headers"] = {
+                name: {
+                    **{key: value for key, value in header.items() if key not in SCHEMA_KEYWORDS},
+                    "schema": self._schema_of(header)
+                } if isinstance(header, dict) else header
+                for name, header in response["headers"].items()
+            }
+        return out
+
+
+def normalized_or_none(spec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The normalized document if it differs from `spec` (i.e. needs storing), else None."""
+    normalized = normalize_spec(spec)
+    return normalized if normalized is not spec else None
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from app.core.config import settings
 from app.api.api import api_router
+from app.core.diff_executor import shutdown_diff_executor
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -8,6 +9,10 @@ app = FastAPI(
     version="0.1.0"
 )
 
+@app.on_event("shutdown")
+def shutdown():
+    shutdown_diff_executor()
+
 @app.get("/health")
 def health_check():
     return {"status": "ok", "service": "ruptrapi"}
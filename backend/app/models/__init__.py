@@ -5,5 +5,5 @@ from .consumer import Consumer, ConsumerDependency
 from .organization import Organization
 from .service import Service, ApiSpecVersion
 from .consumer import Consumer, ConsumerDependency
-from .analysis import ApiChange, Impact, AnalysisRun
+from .analysis import ApiChange, Impact, AnalysisRun, DiffCacheEntry, AnalysisJob
 from .user import User
@@ -1,7 +1,7 @@
-from sqlalchemy import Column, String, ForeignKey, Enum, Text, DateTime
+from sqlalchemy import Boolean, Column, String, ForeignKey, Enum, Text, DateTime, JSON, Integer, Index, UniqueConstraint, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from app.models.base import BaseEntity
+from app.models.base import BaseEntity, Base, UUIDMixin, TimestampMixin
 import enum
 
 # Enums
@@ -23,11 +23,19 @@ class AnalysisStatus(str, enum.Enum):
     PENDING = "PENDING"
     SUCCESS = "SUCCESS"
     FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
 
 class ApiChange(BaseEntity):
     __tablename__ = "api_changes"
     
-    analysis_run_id = Column(UUID(as_uuid=True), ForeignKey("analysis_runs.id"), nullable=False)
+    analysis_run_id = Column(UUID(as_uuid=True), ForeignKey("analysis_runs.id"), nullable=False, index=True)
+    seq = Column(Integer, nullable=True)  # Position in the run's changes, None for runs stored before chunking
     service_id = Column(UUID(as_uuid=True), ForeignKey("services.id"), nullable=False)
     old_spec_id = Column(UUID(as_uuid=True), ForeignKey("api_spec_versions.id"), nullable=False)
     new_spec_id = Column(UUID(as_uuid=True), ForeignKey("api_spec_versions.id"), nullable=False)
@@ -36,8 +44,14 @@ class ApiChange(BaseEntity):
     severity = Column(Enum(Severity), nullable=False)
     http_method = Column(String, nullable=True)
     path = Column(String, nullable=True)
+    location = Column(String, nullable=True)  # JSON pointer into the spec, e.g. /paths/~1users/get/...
     description = Column(Text, nullable=False)
 
+    __table_args__ = (
+        # Paging through a run's changes; a chunk is never stored twice
+        Index('uq_api_changes_run_seq', 'analysis_run_id', 'seq', unique=True),
+    )
+
 class Impact(BaseEntity):
     __tablename__ = "impacts"
     
@@ -58,6 +72,63 @@ class AnalysisRun(BaseEntity):
     status = Column(Enum(AnalysisStatus), nullable=False)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
+    auto_selected = Column(Boolean, default=False, nullable=False, server_default=text('false'))  # Specs picked as the latest two
+    result_summary = Column(Text, nullable=True)
+    change_count = Column(Integer, nullable=True)
+    impact_count = Column(Integer, nullable=True)
+    progress = Column(Integer, default=0, nullable=False, server_default=text('0'))  # Percent, written as phases end
+    persisted_changes = Column(Integer, default=0, nullable=False, server_default=text('0'))  # Checkpoint: changes committed so far, in seq order
+    result_key = Column(String, nullable=True)  # Diff the stored changes come from: spec hashes + diff_engine.result_version
+    phases = Column(JSON, nullable=True)  # {phase: {"started_at", "seconds"}}, see analysis_runner.RunTracker
     
     # Relationships can be added if needed
 
+    __table_args__ = (
+        # At most one pending run per spec pair, duplicates are coalesced into it
+        Index('uq_analysis_runs_pending_pair', 'old_spec_id', 'new_spec_id', unique=True,
+              postgresql_where=text("status = 'PENDING'")),
+    )
+
+
+class DiffCacheEntry(Base, UUIDMixin, TimestampMixin):
+    """
+    Content-addressed diff results. Keyed by spec content, not by spec rows,
+    so the same pair of documents uploaded to different services is diffed once.
+    Not tenant data: it is only reachable by presenting both spec hashes.
+    """
+    __tablename__ = "diff_cache_entries"
+
+    old_spec_hash = Column(String, nullable=False)
+    new_spec_hash = Column(String, nullable=False)
+    engine_version = Column(String, nullable=False)  # diff_engine.result_version: engine version (+ rule plan key)
+    change_count = Column(Integer, nullable=False)
+    changes = Column(JSON, nullable=False)  # see diff_engine.serialize_changes
+
+    __table_args__ = (
+        UniqueConstraint('old_spec_hash', 'new_spec_hash', 'engine_version', name='uq_diff_cache_key'),
+    )
+
+
+class AnalysisJob(Base, UUIDMixin, TimestampMixin):
+    """
+    Durable queue of analysis work, consumed by worker processes
+    (`python -m app.worker`), shared fairly between organizations and locked
+    with FOR UPDATE SKIP LOCKED. See app.services.job_queue.claim_jobs.
+    """
+    __tablename__ = "analysis_jobs"
+
+    kind = Column(String, nullable=False)  # job_queue.JOB_* 
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=True)  # Scheduling tenant, None for jobs queued before fair scheduling
+    payload = Column(JSON, nullable=False)  # Arguments of the job's handler
+    status = Column(Enum(JobStatus), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False)  # Not claimed before (retry backoff)
+    leased_until = Column(DateTime, nullable=True)  # A RUNNING job past its lease is claimed again
+    worker_id = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index('ix_analysis_jobs_status_run_after', 'status', 'run_after'),
+        # An organization's oldest due jobs, see job_queue.claim_jobs
+        Index('ix_analysis_jobs_organization_status_run_after', 'organization_id', 'status', 'run_after'),
+    )
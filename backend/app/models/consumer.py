@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, Text, UniqueConstraint
+from sqlalchemy import Column, String, ForeignKey, Index, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.models.base import BaseEntity
@@ -25,4 +25,5 @@ class ConsumerDependency(BaseEntity):
     
     __table_args__ = (
         UniqueConstraint('consumer_id', 'service_id', 'http_method', 'path', name='uq_consumer_dep'),
+        Index('ix_consumer_dependencies_service_path', 'service_id', 'path'),  # Impact matching
     )
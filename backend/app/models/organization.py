@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean
+from sqlalchemy import Column, String, Boolean, JSON, Integer, text
 from app.models.base import BaseOrganizationEntity
 
 class Organization(BaseOrganizationEntity):
@@ -6,3 +6,8 @@ class Organization(BaseOrganizationEntity):
     
     name = Column(String, nullable=False)
     slug = Column(String, nullable=False, unique=True)
+    diff_rules = Column(JSON, nullable=True)  # Disabled rules / severity overrides, see app.core.diff_rules
+    # Analysis scheduling, see app.services.job_queue.claim_jobs. Unset limits use the ANALYSIS_ORG_* settings
+    analysis_weight = Column(Integer, nullable=False, default=1, server_default=text('1'))  # Share of the workers relative to other organizations
+    analysis_max_running = Column(Integer, nullable=True)  # Jobs running at once
+    analysis_max_pending = Column(Integer, nullable=True)  # Runs queued or running before new ones are refused (429)
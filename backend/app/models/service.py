@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, JSON, Integer, Text, UniqueConstraint
+from sqlalchemy import Boolean, Column, String, ForeignKey, JSON, Integer, Text, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from app.models.base import BaseEntity
@@ -9,6 +9,7 @@ class Service(BaseEntity):
     name = Column(String, nullable=False)
     base_path = Column(String, nullable=True)
     description = Column(Text, nullable=True)
+    auto_analyze = Column(Boolean, default=False, nullable=False, server_default=text('false'))  # Analyze each upload against the previous version
     
     specs = relationship("ApiSpecVersion", back_populates="service")
 
@@ -19,6 +20,11 @@ class ApiSpecVersion(BaseEntity):
     version_label = Column(String, nullable=False) # e.g., v1.0, 2024-01-01
     raw_spec = Column(JSON, nullable=False)
     spec_hash = Column(String, nullable=False)
+    fingerprints = Column(JSON, nullable=True)  # Merkle subtree hashes, see app.core.fingerprint
+    spec_index = Column(JSON, nullable=True)  # Flattened operation/parameter rows, see app.core.spec_index
+    normalized_spec = Column(JSON, nullable=True)  # OpenAPI 3 form of Swagger 2 uploads, see app.core.spec_normalizer
+    parent_spec_id = Column(UUID(as_uuid=True), ForeignKey("api_spec_versions.id"), nullable=True)  # Previous upload of the service
+    path_delta = Column(JSON, nullable=True)  # Paths changed since the parent, see fingerprint.path_delta
     
     service = relationship("Service", back_populates="specs")
 
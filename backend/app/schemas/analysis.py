@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from uuid import UUID
 from datetime import datetime
 from enum import Enum
@@ -23,6 +23,7 @@ class AnalysisStatus(str, Enum):
     PENDING = "PENDING"
     SUCCESS = "SUCCESS"
     FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
 
 # ApiChange
 class ApiChangeBase(BaseModel):
@@ -30,11 +31,13 @@ class ApiChangeBase(BaseModel):
     severity: Severity
     http_method: Optional[str] = None
     path: Optional[str] = None
+    location: Optional[str] = None
     description: str
 
 class ApiChange(ApiChangeBase):
     id: UUID
     analysis_run_id: UUID
+    seq: Optional[int] = None  # Position in the run's changes
     service_id: UUID
     old_spec_id: UUID
     new_spec_id: UUID
@@ -69,14 +72,36 @@ class AnalysisRunBase(BaseModel):
 class AnalysisRunCreate(AnalysisRunBase):
     pass
 
+class AnalysisRunBatchCreate(BaseModel):
+    service_id: UUID
+    base_spec_id: UUID
+    candidate_spec_ids: List[UUID]
+
+class AnalysisPhase(BaseModel):
+    started_at: datetime
+    seconds: float
+
 class AnalysisRun(AnalysisRunBase):
     id: UUID
     service_name: str
     status: AnalysisStatus
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    auto_selected: bool = False
+    result_summary: Optional[str] = None
+    change_count: Optional[int] = None
+    impact_count: Optional[int] = None
+    progress: int = 0
+    persisted_changes: int = 0  # Changes stored so far, readable while the run is in flight
+    phases: Optional[Dict[str, AnalysisPhase]] = None  # load, diff, impact, persist
     organization_id: UUID
     created_at: datetime
     
     class Config:
         from_attributes = True
+
+class AnalysisQueueStats(BaseModel):
+    queued: int
+    running: int
+    expired_leases: int
+    oldest_queued_seconds: float
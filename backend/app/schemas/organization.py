@@ -1,11 +1,21 @@
 from pydantic import BaseModel
 from uuid import UUID
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
+
+from app.models.analysis import Severity
+
+class DiffRuleSettings(BaseModel):
+    disabled: List[str] = []
+    severity: Dict[str, Severity] = {}
 
 class OrganizationBase(BaseModel):
     name: str
     slug: str
+    diff_rules: Optional[DiffRuleSettings] = None
+    analysis_weight: int = 1
+    analysis_max_running: Optional[int] = None
+    analysis_max_pending: Optional[int] = None
 
 class OrganizationCreate(OrganizationBase):
     pass
@@ -13,6 +23,10 @@ class OrganizationCreate(OrganizationBase):
 class OrganizationUpdate(BaseModel):
     name: Optional[str] = None
     slug: Optional[str] = None
+    diff_rules: Optional[DiffRuleSettings] = None
+    analysis_weight: Optional[int] = None
+    analysis_max_running: Optional[int] = None
+    analysis_max_pending: Optional[int] = None
     is_deleted: Optional[bool] = None
 
 class Organization(OrganizationBase):
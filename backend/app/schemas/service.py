@@ -25,6 +25,7 @@ class ServiceBase(BaseModel):
     name: str
     base_path: Optional[str] = None
     description: Optional[str] = None
+    auto_analyze: bool = False
 
 class ServiceCreate(ServiceBase):
     organization_id: UUID
@@ -33,6 +34,7 @@ class ServiceUpdate(BaseModel):
     name: Optional[str] = None
     base_path: Optional[str] = None
     description: Optional[str] = None
+    auto_analyze: Optional[bool] = None
     is_deleted: Optional[bool] = None
 
 class Service(ServiceBase):
@@ -58,6 +60,7 @@ class ApiSpecVersion(ApiSpecVersionBase):
     service_id: UUID
     organization_id: UUID
     spec_hash: str
+    parent_spec_id: Optional[UUID] = None
     is_deleted: bool
     created_at: datetime
     
@@ -0,0 +1,676 @@
+"""
+Analysis work: diffs, impact matching and persistence of analysis runs.
+
+Jobs are queued in analysis_jobs by the API and run here, in the worker
+processes (`python -m app.worker`). A job that raises is retried (see
+job_queue.fail_job), so every task is idempotent: runs that are no longer
+PENDING are skipped. Only the engine, models and database layer are imported.
+"""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+import uuid
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, cast, insert, update, Text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.future import select
+from sqlalchemy.orm import defer
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.diff_engine import Change, result_version
+from app.core.diff_executor import BatchDiffRequest, DiffRequest, run_batch_diff, run_diff, stream_diff
+from app.core.diff_rules import compile_plan
+from app.core.path_trie import PathTrie
+from app.models.analysis import AnalysisRun, ApiChange, Impact, AnalysisStatus, Severity, RiskLevel
+from app.models.organization import Organization
+from app.models.service import ApiSpecVersion, Service
+from app.services.dependency_index import get_dependency_index
+from app.services.diff_cache import get_cached_diff, store_diff
+from app.services.job_queue import JOB_ANALYSIS_BATCH, JOB_ANALYSIS_RUN, JOB_AUTO_ANALYSIS, JOB_VERSION_DELTA, enqueue_job
+from app.services.version_chain import compose_from_chain
+
+
+class RunTracker:
+    """
+    Where the time of runs goes: start and duration of each phase (load, diff,
+    impact, persist) and a progress percentage, written to the runs as each
+    phase ends. Written in a session of its own, so the run's transaction
+    stays unaffected and progress is visible while the run is in flight.
+    """
+
+    def __init__(self, run_ids: List[UUID], phases: Dict[str, Dict[str, Any]] = None):
+        self.run_ids = run_ids
+        self.phases = dict(phases or {})
+
+    def for_run(self, run_id: UUID) -> "RunTracker":
+        """A tracker for one run of a batch, carrying the phases shared so far"""
+        return RunTracker([run_id], self.phases)
+
+    @asynccontextmanager
+    async def phase(self, name: str, progress: int = None):
+        """
+        Time the phase `name`; if it completes, record it, and save it with
+        `progress` unless that is None. A phase entered several times (once
+        per chunk) adds up, from its first start.
+        """
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        previous = self.phases.get(name)
+        if previous:
+            self.phases[name] = {"started_at": previous["started_at"], "seconds": round(previous["seconds"] + seconds, 4)}
+        else:
+            self.phases[name] = {"started_at": started_at.isoformat(), "seconds": round(seconds, 4)}
+        if progress is not None:
+            await self.save(progress)
+
+    async def save(self, progress: int):
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(AnalysisRun).where(
+                    AnalysisRun.id.in_(self.run_ids),
+                    AnalysisRun.status == AnalysisStatus.PENDING
+                ).values(phases=self.phases, progress=progress).execution_options(synchronize_session=False))
+                await db.commit()
+        except Exception as e:
+            # Progress is informational, the run goes on
+            print(f"Worker: Recording progress of runs {self.run_ids} failed: {e}")
+
+
+async def handle_analysis_job(kind: str, payload: Dict[str, Any]):
+    """Run a claimed job of the analysis queue"""
+    if kind == JOB_ANALYSIS_RUN:
+        await process_analysis_run_task(UUID(payload["run_id"]), UUID(payload["old_spec_id"]), UUID(payload["new_spec_id"]))
+    elif kind == JOB_ANALYSIS_BATCH:
+        await process_analysis_batch_task(
+            UUID(payload["base_spec_id"]),
+            [(UUID(run_id), UUID(spec_id)) for run_id, spec_id in payload["runs"]]
+        )
+    elif kind == JOB_VERSION_DELTA:
+        await process_version_delta_task(UUID(payload["parent_spec_id"]), UUID(payload["spec_id"]))
+    elif kind == JOB_AUTO_ANALYSIS:
+        await process_auto_analysis_task(UUID(payload["service_id"]), UUID(payload["spec_id"]))
+    else:
+        raise ValueError(f"Unknown analysis job kind: {kind}")
+
+async def abandon_analysis_job(kind: str, payload: Dict[str, Any], error: str):
+    """A job failed for the last time: fail the runs still waiting for it, dropping the chunks they stored"""
+    if kind == JOB_ANALYSIS_RUN:
+        run_ids = [payload["run_id"]]
+    elif kind == JOB_ANALYSIS_BATCH:
+        run_ids = [run_id for run_id, _ in payload["runs"]]
+    else:
+        return
+    async with AsyncSessionLocal() as db:
+        for run_id in await _pending_run_ids(db, [UUID(run_id) for run_id in run_ids]):
+            await _discard_results(db, run_id)
+            await _mark_run_failed(db, run_id, error)
+
+async def process_analysis_run_task(
+    run_id: UUID, 
+    old_spec_id: UUID, 
+    new_spec_id: UUID
+):
+    """
+    Async Background worker to perform diff and impact analysis.
+    Uses its own AsyncSession to ensure thread/task safety.
+    Errors propagate (after rollback) for the queue to retry.
+    """
+    print(f"Worker: Starting Analysis Run {run_id}")
+    tracker = RunTracker([run_id])
+    async with AsyncSessionLocal() as db:
+        try:
+            if not await _pending_run_ids(db, [run_id]):
+                print(f"Worker: Run {run_id} is no longer pending")
+                return
+            if settings.ANALYSIS_CANCEL_SUPERSEDED_RUNS and await _cancel_if_superseded(db, run_id):
+                print(f"Worker: Run {run_id} was superseded by a newer spec")
+                return
+
+            # 1. Fetch Specs
+            async with tracker.phase("load", progress=10):
+                specs = await _load_specs(db, [old_spec_id, new_spec_id])
+                old_spec = specs.get(old_spec_id)
+                new_spec = specs.get(new_spec_id)
+
+                if not old_spec or not new_spec:
+                    print(f"Worker: Specs not found for run {run_id}")
+                    await _mark_run_failed(db, run_id, "One or both specs not found")
+                    return
+
+                # The organization's rule settings, compiled into the plan the diff runs
+                rule_settings = await _rule_settings(db, new_spec.organization_id)
+                plan = compile_plan(rule_settings)
+
+            # 2. Perform Diff (or reuse one), stored batch by batch as it completes
+            changes_detected = _diff_batches(db, old_spec, new_spec, rule_settings, plan)
+            await _persist_run_results(db, run_id, old_spec, new_spec, changes_detected, plan, tracker)
+
+        except Exception as e:
+            print(f"Worker: Error processing run {run_id}: {e}")
+            await db.rollback()
+            raise
+
+async def process_version_delta_task(parent_spec_id: UUID, spec_id: UUID):
+    """
+    Background worker started by an upload: diff the new spec against the
+    previous upload of its service. The stored step lets later comparisons
+    across several versions be composed instead of diffed (see version_chain).
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            specs = await _load_specs(db, [parent_spec_id, spec_id])
+            parent = specs.get(parent_spec_id)
+            spec = specs.get(spec_id)
+            if not parent or not spec:
+                return
+
+            rule_settings = await _rule_settings(db, spec.organization_id)
+            async for _ in _diff_batches(db, parent, spec, rule_settings, compile_plan(rule_settings)):
+                pass
+            await db.commit()
+        except Exception as e:
+            print(f"Worker: Error diffing spec {spec_id} against its parent {parent_spec_id}: {e}")
+            await db.rollback()
+            raise
+
+def debounce_base(spec_id: UUID, latest: Sequence[Tuple[UUID, datetime]], window: timedelta) -> Optional[UUID]:
+    """
+    The spec an automatic run of `spec_id` compares against. `latest` holds
+    (id, created_at) of the service's specs, newest first. Uploads less than
+    `window` apart form a burst; the run goes from the last spec before the
+    burst (or the oldest given) to its last one. None if `spec_id` is not the
+    newest spec (a later upload's job takes over) or has nothing before it.
+    """
+    if not latest or latest[0][0] != spec_id:
+        return None
+    for (_, newer_at), (older_id, older_at) in zip(latest, latest[1:]):
+        if newer_at - older_at > window:
+            return older_id
+    return latest[-1][0] if len(latest) > 1 else None
+
+async def process_auto_analysis_task(service_id: UUID, spec_id: UUID):
+    """
+    Queued by an upload to an auto_analyze service, due ANALYSIS_AUTO_DEBOUNCE_SECONDS
+    later. Uploads closer together than that form a burst: only the job of its
+    last spec queues a run, comparing that spec with the last one before the burst.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            result = await db.execute(select(ApiSpecVersion.id, ApiSpecVersion.created_at).where(
+                ApiSpecVersion.service_id == service_id,
+                ApiSpecVersion.is_deleted == False
+            ).order_by(ApiSpecVersion.created_at.desc()).limit(settings.ANALYSIS_AUTO_DEBOUNCE_MAX_UPLOADS + 1))
+            latest = result.all()
+            if not latest or latest[0].id != spec_id:
+                print(f"Worker: Spec {spec_id} was superseded within its debounce window")
+                return
+            old_id = debounce_base(spec_id, latest, timedelta(seconds=settings.ANALYSIS_AUTO_DEBOUNCE_SECONDS))
+            if old_id is None:
+                return
+
+            # Already queued or done (a manual run, or this job's previous attempt)
+            result = await db.execute(select(AnalysisRun.id).where(
+                AnalysisRun.old_spec_id == old_id,
+                AnalysisRun.new_spec_id == spec_id,
+                AnalysisRun.status.in_([AnalysisStatus.PENDING, AnalysisStatus.SUCCESS])
+            ).limit(1))
+            if result.first() is not None:
+                return
+
+            result = await db.execute(select(Service).where(Service.id == service_id))
+            service = result.scalars().first()
+            if service is None or not service.auto_analyze:
+                return
+            run = AnalysisRun(
+                service_id=service_id,
+                service_name=service.name,
+                old_spec_id=old_id,
+                new_spec_id=spec_id,
+                status=AnalysisStatus.PENDING,
+                auto_selected=True,
+                organization_id=service.organization_id,
+                started_at=datetime.utcnow()
+            )
+            db.add(run)
+            try:
+                await db.flush()
+            except IntegrityError:
+                # Triggered by hand meanwhile (uq_analysis_runs_pending_pair)
+                await db.rollback()
+                return
+            enqueue_job(db, JOB_ANALYSIS_RUN, {
+                "run_id": str(run.id),
+                "old_spec_id": str(old_id),
+                "new_spec_id": str(spec_id)
+            }, organization_id=service.organization_id)
+            await db.commit()
+            print(f"Worker: Queued automatic analysis run {run.id} for specs {old_id} -> {spec_id}")
+        except Exception as e:
+            print(f"Worker: Error queueing the automatic analysis of spec {spec_id}: {e}")
+            await db.rollback()
+            raise
+
+async def _diff_batches(db, old_spec, new_spec, rule_settings, plan) -> AsyncIterator[Tuple[List[Change], float]]:
+    """
+    Changes between two spec versions as (changes, share done) batches: from
+    the diff cache, composed from the stored diffs of the versions in between,
+    or diffed directly, in that order of preference. A direct diff of the raw
+    specs is streamed a batch of paths at a time (see stream_diff). New results
+    are stored in the cache (in the caller's transaction) once complete, unless
+    larger than the in-process cache could hold (DIFF_CACHE_MAX_CHANGES).
+    """
+    # Unless this exact content pair was diffed before with the same rules
+    changes = await get_cached_diff(db, old_spec.spec_hash, new_spec.spec_hash, plan)
+    if changes is not None:
+        print(f"Worker: Diff cache hit for specs {old_spec.id} -> {new_spec.id}")
+        yield changes, 1.0
+        return
+
+    composition = await compose_from_chain(db, old_spec, new_spec, plan)
+    if composition is not None:
+        # Only the paths the steps cannot settle are diffed
+        direct = []
+        if composition.ambiguous:
+            direct = await _direct_diff(db, old_spec, new_spec, rule_settings, tuple(composition.ambiguous))
+        changes = composition.merge(direct)
+        print(f"Worker: Composed diff for specs {old_spec.id} -> {new_spec.id}, {len(composition.ambiguous)} paths diffed directly")
+        await store_diff(db, old_spec.spec_hash, new_spec.spec_hash, plan, changes)
+        yield changes, 1.0
+        return
+
+    # CPU Bound - runs in the diff process pool. Fingerprints and the
+    # index are enough unless a request body or response changed,
+    # only then is the spec itself (the heavy column) fetched.
+    request = await _diff_request(db, old_spec, new_spec, rule_settings)
+    changes, path_count = await run_diff(request)
+    if changes is not None:
+        await store_diff(db, old_spec.spec_hash, new_spec.spec_hash, plan, changes)
+        yield changes, 1.0
+        return
+
+    (old_raw,) = await _spec_json_text(db, old_spec.id, _DIFFED_SPEC)
+    (new_raw,) = await _spec_json_text(db, new_spec.id, _DIFFED_SPEC)
+    kept = []
+    async for batch, done in stream_diff(request._replace(old_raw=old_raw, new_raw=new_raw), path_count):
+        if kept is not None:
+            kept.extend(batch)
+            if len(kept) > settings.DIFF_CACHE_MAX_CHANGES:
+                kept = None
+        yield batch, done
+    if kept is not None:
+        await store_diff(db, old_spec.spec_hash, new_spec.spec_hash, plan, kept)
+
+async def _diff_request(db, old_spec, new_spec, rule_settings, paths=None) -> DiffRequest:
+    old_fp, old_index = await _spec_json_text(db, old_spec.id, ApiSpecVersion.fingerprints, ApiSpecVersion.spec_index)
+    new_fp, new_index = await _spec_json_text(db, new_spec.id, ApiSpecVersion.fingerprints, ApiSpecVersion.spec_index)
+    return DiffRequest(old_fp, new_fp, old_index, new_index, rules=json.dumps(rule_settings), paths=paths)
+
+async def _direct_diff(db, old_spec, new_spec, rule_settings, paths=None) -> List[Change]:
+    """Diff two spec versions in one piece, all paths or only `paths`"""
+    request = await _diff_request(db, old_spec, new_spec, rule_settings, paths)
+    changes, path_count = await run_diff(request)
+    if changes is None:
+        (old_raw,) = await _spec_json_text(db, old_spec.id, _DIFFED_SPEC)
+        (new_raw,) = await _spec_json_text(db, new_spec.id, _DIFFED_SPEC)
+        # Large specs are split into path shards diffed in parallel
+        changes, _ = await run_diff(request._replace(old_raw=old_raw, new_raw=new_raw), path_count)
+    return changes
+
+async def _single_batch(changes: List[Change]) -> AsyncIterator[Tuple[List[Change], float]]:
+    yield changes, 1.0
+
+async def process_analysis_batch_task(base_spec_id: UUID, runs: List[Tuple[UUID, UUID]]):
+    """
+    Background worker for a batch: one base spec against several candidates,
+    `runs` holding (run_id, candidate spec id). The base is decoded once per
+    diff worker process for all candidates; each run is then persisted on its own.
+    Errors propagate (after rollback) for the queue to retry; runs that failed
+    to persist are retried once the others are stored.
+    """
+    print(f"Worker: Starting batch of {len(runs)} runs against spec {base_spec_id}")
+    async with AsyncSessionLocal() as db:
+        try:
+            pending = set(await _pending_run_ids(db, [run_id for run_id, _ in runs]))
+            runs = [(run_id, spec_id) for run_id, spec_id in runs if run_id in pending]
+            if not runs:
+                return
+
+            # Loading and diffing are shared, each run records the whole batch's phases
+            tracker = RunTracker([run_id for run_id, _ in runs])
+            async with tracker.phase("load", progress=10):
+                specs = await _load_specs(db, [base_spec_id] + [spec_id for _, spec_id in runs])
+                base = specs.get(base_spec_id)
+                if base is None:
+                    for run_id, _ in runs:
+                        await _mark_run_failed(db, run_id, "Base spec not found")
+                    return
+
+                rule_settings = await _rule_settings(db, base.organization_id)
+                plan = compile_plan(rule_settings)
+
+            async with tracker.phase("diff", progress=60):
+                results = await _batch_results(db, base, runs, specs, rule_settings, plan)
+
+        except Exception as e:
+            print(f"Worker: Error processing batch against spec {base_spec_id}: {e}")
+            await db.rollback()
+            raise
+
+        failed = []
+        for run_id, spec_id in runs:
+            candidate = specs.get(spec_id)
+            if candidate is None:
+                await _mark_run_failed(db, run_id, "Candidate spec not found")
+                continue
+            try:
+                changes = _single_batch(results[candidate.spec_hash])
+                await _persist_run_results(db, run_id, base, candidate, changes, plan, tracker.for_run(run_id))
+            except Exception as e:
+                print(f"Worker: Error processing run {run_id}: {e}")
+                await db.rollback()
+                failed.append(run_id)
+        if failed:
+            # Retried: the runs stored in full are no longer pending, the others resume from their checkpoints
+            raise RuntimeError(f"Storing {len(failed)} of {len(runs)} runs failed")
+
+async def _batch_results(db, base, runs, specs, rule_settings, plan) -> Dict[str, List[Change]]:
+    """Changes of the batch by candidate spec hash: cache hits first, the rest diffed once per distinct content"""
+    results: Dict[str, List[Change]] = {}
+    missing: Dict[str, ApiSpecVersion] = {}
+    for _, spec_id in runs:
+        candidate = specs.get(spec_id)
+        if candidate is None or candidate.spec_hash in results or candidate.spec_hash in missing:
+            continue
+        cached = await get_cached_diff(db, base.spec_hash, candidate.spec_hash, plan)
+        if cached is not None:
+            results[candidate.spec_hash] = cached
+        else:
+            missing[candidate.spec_hash] = candidate
+
+    if missing:
+        computed = await _batch_diff(db, base, list(missing.values()), rule_settings)
+        for spec_hash, changes in zip(missing, computed):
+            results[spec_hash] = changes
+            await store_diff(db, base.spec_hash, spec_hash, plan, changes)
+        print(f"Worker: Batch diffed {len(missing)} candidates, {len(results) - len(missing)} cache hits")
+    return results
+
+async def _batch_diff(db, base, candidates, rule_settings) -> List[List[Change]]:
+    """Diff `base` against every candidate spec, fetching raw specs only for candidates that need them"""
+    columns = (ApiSpecVersion.fingerprints, ApiSpecVersion.spec_index)
+    base_fp, base_index = await _spec_json_text(db, base.id, *columns)
+    entries = []
+    for candidate in candidates:
+        fingerprints, index = await _spec_json_text(db, candidate.id, *columns)
+        entries.append((fingerprints, index, None))
+    request = BatchDiffRequest(base_fp, base_index, None, tuple(entries), rules=json.dumps(rule_settings))
+
+    results = await run_batch_diff(request)
+    need_raw = [i for i, changes in enumerate(results) if changes is None]
+    if need_raw:
+        (base_raw,) = await _spec_json_text(db, base.id, _DIFFED_SPEC)
+        raw_entries = []
+        for i in need_raw:
+            (raw,) = await _spec_json_text(db, candidates[i].id, _DIFFED_SPEC)
+            raw_entries.append(entries[i][:2] + (raw,))
+        retried = await run_batch_diff(request._replace(old_raw=base_raw, candidates=tuple(raw_entries)))
+        for i, changes in zip(need_raw, retried):
+            results[i] = changes
+    return results
+
+async def _persist_run_results(db, run_id, old_spec, new_spec, batches, plan, tracker=None):
+    """
+    Store the changes of a run with their consumer impacts and mark it
+    successful. `batches` yields the changes in order as (changes, share
+    done), as the diff produces them (see _diff_batches). They are numbered
+    (seq) and stored ANALYSIS_PERSIST_CHUNK_SIZE at a time, with their
+    impacts, one transaction per chunk, so a run holds one chunk and the
+    batches in flight, not the whole diff. Each chunk commits a checkpoint on
+    the run (persisted_changes): readers can page through the changes stored
+    so far, and a retried run resumes after the last committed chunk instead
+    of starting over, if its diff is the same one (same specs, engine version
+    and rules, see result_key).
+    """
+    tracker = tracker or RunTracker([run_id])
+    result_key = f"{old_spec.spec_hash}:{new_spec.spec_hash}:{result_version(plan)}"
+    size = settings.ANALYSIS_PERSIST_CHUNK_SIZE
+
+    # 3. Process Changes and Calculate Impact. Dependencies are matched in
+    # memory (see dependency_index); the database is only written to, with
+    # client generated ids and multi-row batches.
+    # Consumers may have registered a concrete path or other parameter names,
+    # they are routed to the templates of both specs first.
+    async with tracker.phase("impact"):
+        spec_paths = await _spec_paths(db, old_spec.id) + await _spec_paths(db, new_spec.id)
+        trie = PathTrie(dict.fromkeys(spec_paths))
+        dependencies = (await get_dependency_index(db, new_spec.service_id)).route(trie)
+
+    run = await _lock_pending_run(db, run_id)
+    if run is None:
+        return
+    resumed = run.persisted_changes
+    if resumed and run.result_key != result_key:
+        # Chunks of another diff (e.g. the rules or the engine changed before this retry)
+        await _discard_results(db, run_id)
+        resumed = 0
+    if resumed:
+        print(f"Worker: Run {run_id} resumes after {resumed} stored changes")
+    else:
+        run.impact_count = 0
+    db.add(run)
+    # Not locked while diffing
+    await db.commit()
+
+    async def store(chunk, position, done, last):
+        """Store `chunk` from `position` on; False if the run is no longer pending"""
+        run = await _lock_pending_run(db, run_id)
+        if run is None:
+            return False
+        async with tracker.phase("impact"):
+            change_rows, impact_rows = _result_rows(run_id, old_spec, new_spec, chunk, position, dependencies)
+        async with tracker.phase("persist"):
+            # Changes first, impacts reference them
+            await _bulk_insert(db, ApiChange, change_rows)
+            await _bulk_insert(db, Impact, impact_rows)
+
+        position += len(chunk)
+        run.persisted_changes = position
+        run.result_key = result_key
+        run.impact_count += len(impact_rows)
+        run.phases = dict(tracker.phases)
+
+        # 4. Finalize Run with its last chunk
+        if last:
+            run.status = AnalysisStatus.SUCCESS
+            run.change_count = position
+            run.result_summary = f"Detected {position} changes, {run.impact_count} impacted consumers."
+            run.progress = 100
+            run.completed_at = datetime.utcnow()
+        else:
+            run.progress = min(60 + int(40 * done), 99)
+        db.add(run)
+        await db.commit()
+        return True
+
+    position, seen, done = resumed, 0, 0.0
+    chunk: List[Change] = []
+    try:
+        while True:
+            async with tracker.phase("diff"):
+                batch = await _next_batch(batches)
+            if batch is None:
+                break
+            changes, done = batch
+            # Changes before the checkpoint were stored by a previous attempt
+            chunk.extend(changes[max(resumed - seen, 0):])
+            seen += len(changes)
+            while len(chunk) >= size:
+                if not await store(chunk[:size], position, done, last=False):
+                    return
+                position += size
+                chunk = chunk[size:]
+    finally:
+        # Stops the diff if the run ended early
+        await batches.aclose()
+
+    if await store(chunk, position, done, last=True):
+        print(f"Worker: Run {run_id} completed successfully with {position + len(chunk)} changes "
+              f"in {sum(p['seconds'] for p in tracker.phases.values()):.2f}s.")
+
+async def _next_batch(batches):
+    try:
+        return await batches.__anext__()
+    except StopAsyncIteration:
+        return None
+
+async def _lock_pending_run(db, run_id):
+    """
+    The run, locked until the caller's transaction ends, if still pending.
+    A run cancelled meanwhile loses the results stored so far (committed).
+    """
+    result_run = await db.execute(select(AnalysisRun).where(AnalysisRun.id == run_id).with_for_update())
+    run = result_run.scalars().first()
+    if run is None:
+        await db.rollback()
+        return None
+    if run.status != AnalysisStatus.PENDING:
+        status = run.status.value
+        if run.status == AnalysisStatus.CANCELLED:
+            await _discard_results(db, run_id)
+            await db.commit()
+        else:
+            await db.rollback()
+        print(f"Worker: Run {run_id} was {status} meanwhile, results discarded.")
+        return None
+    return run
+
+def _result_rows(run_id, old_spec, new_spec, changes, first_seq, dependencies):
+    """ApiChange and Impact rows of `changes`, numbered from `first_seq`"""
+    change_rows = []
+    impact_rows = []
+    for seq, detected in enumerate(changes, first_seq):
+        # ApiChange row (the description is rendered here, once)
+        change_id = uuid.uuid4()
+        change_rows.append(dict(
+            id=change_id,
+            analysis_run_id=run_id,
+            seq=seq,
+            service_id=new_spec.service_id,
+            old_spec_id=old_spec.id,
+            new_spec_id=new_spec.id,
+            organization_id=new_spec.organization_id,
+            change_type=detected.change_type,
+            severity=detected.severity,
+            http_method=detected.http_method, 
+            path=detected.path,
+            location=detected.location,
+            description=detected.description
+        ))
+
+        # Impact Analysis: consumers using this endpoint (Service -> Dependency)
+        if detected.path:
+            # Determine Risk
+            risk = RiskLevel.HIGH if detected.severity == Severity.HIGH else RiskLevel.LOW
+            for dep in dependencies.match(detected.http_method, detected.path):
+                impact_rows.append(dict(
+                    id=uuid.uuid4(),
+                    analysis_run_id=run_id,
+                    api_change_id=change_id,
+                    consumer_id=dep.consumer_id,
+                    consumer_name=dep.consumer_name,
+                    organization_id=new_spec.organization_id,
+                    risk_level=risk
+                ))
+    return change_rows, impact_rows
+
+async def _discard_results(db, run_id):
+    """Delete the stored changes and impacts of a run (in the caller's transaction)"""
+    await db.execute(delete(Impact).where(Impact.analysis_run_id == run_id))
+    await db.execute(delete(ApiChange).where(ApiChange.analysis_run_id == run_id))
+    await db.execute(update(AnalysisRun).where(AnalysisRun.id == run_id).values(persisted_changes=0, impact_count=0))
+
+async def _bulk_insert(db, model, rows):
+    """Multi-row INSERTs of ANALYSIS_INSERT_BATCH_SIZE rows each (column defaults still apply)"""
+    size = settings.ANALYSIS_INSERT_BATCH_SIZE
+    for start in range(0, len(rows), size):
+        await db.execute(insert(model), rows[start:start + size])
+
+async def _load_specs(db, spec_ids):
+    """
+    Spec versions by id. Only the spec hashes are needed for a cache hit. The
+    heavy JSON columns are loaded later, as text, and only if needed.
+    """
+    stmt = select(ApiSpecVersion).options(
+        defer(ApiSpecVersion.raw_spec),
+        defer(ApiSpecVersion.normalized_spec),
+        defer(ApiSpecVersion.fingerprints),
+        defer(ApiSpecVersion.spec_index)
+    ).where(ApiSpecVersion.id.in_(spec_ids))
+    result = await db.execute(stmt)
+    return {s.id: s for s in result.scalars().all()}
+
+async def _rule_settings(db, organization_id):
+    result = await db.execute(select(Organization.diff_rules).where(Organization.id == organization_id))
+    return result.scalars().first()
+
+# The document diffs run on: the OpenAPI 3 form of Swagger 2 uploads, else the upload itself
+_DIFFED_SPEC = func.coalesce(ApiSpecVersion.normalized_spec, ApiSpecVersion.raw_spec)
+
+async def _spec_json_text(db, spec_id, *columns):
+    """JSON columns of a spec as their stored text, ready to hand to the diff executor"""
+    stmt = select(*(cast(column, Text) for column in columns)).where(ApiSpecVersion.id == spec_id)
+    result = await db.execute(stmt)
+    return tuple(result.first())
+
+async def _spec_paths(db, spec_id):
+    """The path templates of a spec, read from its fingerprints (or the spec) inside the database"""
+    paths = func.coalesce(ApiSpecVersion.fingerprints["paths"], _DIFFED_SPEC["paths"])
+    result = await db.execute(select(func.json_object_keys(paths)).where(ApiSpecVersion.id == spec_id))
+    return list(result.scalars().all())
+
+async def _pending_run_ids(db, run_ids):
+    result = await db.execute(select(AnalysisRun.id).where(
+        AnalysisRun.id.in_(run_ids),
+        AnalysisRun.status == AnalysisStatus.PENDING
+    ))
+    return list(result.scalars().all())
+
+async def _cancel_if_superseded(db, run_id):
+    """Cancel an auto-selected run if its service got a newer spec since it was queued (commits)"""
+    result = await db.execute(select(AnalysisRun).where(AnalysisRun.id == run_id))
+    run = result.scalars().first()
+    if not run or not run.auto_selected:
+        return False
+    new_created_at = select(ApiSpecVersion.created_at).where(ApiSpecVersion.id == run.new_spec_id).scalar_subquery()
+    result = await db.execute(select(ApiSpecVersion.id).where(
+        ApiSpecVersion.service_id == run.service_id,
+        ApiSpecVersion.is_deleted == False,
+        ApiSpecVersion.created_at > new_created_at
+    ).limit(1))
+    if result.first() is None:
+        return False
+    run.status = AnalysisStatus.CANCELLED
+    run.completed_at = datetime.utcnow()
+    db.add(run)
+    await db.commit()
+    return True
+
+async def _mark_run_failed(db, run_id, error_msg):
+    try:
+        stmt = select(AnalysisRun).where(AnalysisRun.id == run_id)
+        result = await db.execute(stmt)
+        run = result.scalars().first()
+        if run:
+            run.status = AnalysisStatus.FAILED
+            run.result_summary = f"Error: {error_msg}"
+            run.completed_at = datetime.utcnow()
+            db.add(run)
+            await db.commit()
+    except Exception as e:
+        print(f"Worker: Critical failure marking run failed: {e}")
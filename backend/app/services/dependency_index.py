@@ -0,0 +1,112 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.path_trie import PathTrie
+from app.models.consumer import ConsumerDependency
+
+
+class DependencyRef(NamedTuple):
+    consumer_id: UUID
+    consumer_name: str
+
+
+class DependencyIndex:
+    """The live consumer dependencies of one service, by endpoint."""
+
+    __slots__ = ("by_endpoint", "by_path", "size", "stamp")
+
+    def __init__(self, dependencies: Iterable[Tuple[str, str, UUID, str]], stamp: Optional[Tuple[Any, ...]] = None):
+        # (METHOD, path) -> deps and path -> deps, from (http_method, path, consumer_id, consumer_name) rows
+        self.by_endpoint: Dict[Tuple[str, str], List[DependencyRef]] = {}
+        self.by_path: Dict[str, List[DependencyRef]] = {}
+        self.size = 0
+        self.stamp = stamp  # State of the service's dependency rows it was built from, see _stamp
+        for http_method, path, consumer_id, consumer_name in dependencies:
+            ref = DependencyRef(consumer_id, consumer_name)
+            self.by_endpoint.setdefault((http_method.upper(), path), []).append(ref)
+            self.by_path.setdefault(path, []).append(ref)
+            self.size += 1
+
+    def route(self, trie: PathTrie) -> "DependencyIndex":
+        """
+        This index keyed by spec path templates instead of the paths the
+        consumers registered: `/users/123` and `/users/{userId}` both become
+        `/users/{id}` if the spec has it. Paths no template matches are kept.
+        """
+        routed = DependencyIndex(())
+        for (http_method, path), refs in self.by_endpoint.items():
+            for template in trie.match(path) or (path,):
+                routed.by_endpoint.setdefault((http_method, template), []).extend(refs)
+                routed.by_path.setdefault(template, []).extend(refs)
+                routed.size += len(refs)
+        return routed
+
+    def match(self, http_method: Optional[str], path: str) -> List[DependencyRef]:
+        """
+        Dependencies on an endpoint. Without a method (path removal) ALL
+        dependencies on the path match. Methods match case-insensitively
+        (deps stored as lowercase, changes as uppercase).
+        """
+        if http_method is None:
+            return self.by_path.get(path, [])
+        return self.by_endpoint.get((http_method.upper(), path), [])
+
+
+# Weighted by dependency count, like the diff cache by change count
+_indexes: LRUCache[DependencyIndex] = LRUCache(
+    settings.DEPENDENCY_INDEX_MAX_ENTRIES,
+    weigher=lambda index: max(index.size, 1)
+)
+# Bumped on invalidation, so a load racing with a dependency edit is not cached
+_generations: Dict[UUID, int] = {}
+
+
+async def _stamp(db: AsyncSession, service_id: UUID) -> Tuple[Any, ...]:
+    """
+    Row count and latest update of a service's dependency rows, deleted ones
+    included: any add, edit or (soft) delete changes it, whichever process made it.
+    """
+    result = await db.execute(select(func.count(), func.max(ConsumerDependency.updated_at)).where(
+        ConsumerDependency.service_id == service_id
+    ))
+    return tuple(result.first())
+
+
+async def get_dependency_index(db: AsyncSession, service_id: UUID) -> DependencyIndex:
+    """
+    The dependency index of a service, loaded on first use. The dependencies
+    are edited through the API while analyses run in worker processes, whose
+    cache invalidate_dependency_index cannot reach, so a cached index is
+    checked against the database (one aggregate query) before each use.
+    """
+    generation = _generations.get(service_id, 0)
+    stamp = await _stamp(db, service_id)
+    index = _indexes.get(service_id)
+    if index is not None and index.stamp == stamp:
+        return index
+
+    result = await db.execute(select(
+        ConsumerDependency.http_method,
+        ConsumerDependency.path,
+        ConsumerDependency.consumer_id,
+        ConsumerDependency.consumer_name
+    ).where(
+        ConsumerDependency.service_id == service_id,
+        ConsumerDependency.is_deleted == False
+    ))
+    index = DependencyIndex(result.all(), stamp)
+    if _generations.get(service_id, 0) == generation:
+        _indexes.put(service_id, index)
+    return index
+
+
+def invalidate_dependency_index(service_id: UUID):
+    """Drop this process's cached index of a service; call after its dependencies change."""
+    _generations[service_id] = _generations.get(service_id, 0) + 1
+    _indexes.pop(service_id)
@@ -0,0 +1,77 @@
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import tuple_
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.diff_engine import Change, result_version, serialize_changes, deserialize_changes
+from app.core.diff_rules import RulePlan
+from app.models.analysis import DiffCacheEntry
+
+# In-process front of the persistent cache. Weighted by change count so a
+# handful of huge diffs cannot pin an unbounded amount of memory.
+_memory_cache: LRUCache[List[List[Any]]] = LRUCache(
+    settings.DIFF_CACHE_MAX_CHANGES,
+    weigher=lambda rows: max(len(rows), 1)
+)
+
+
+def _key(old_spec_hash: str, new_spec_hash: str, plan: RulePlan):
+    return (old_spec_hash, new_spec_hash, result_version(plan))
+
+
+async def get_cached_diff(db: AsyncSession, old_spec_hash: str, new_spec_hash: str, plan: RulePlan) -> Optional[List[Change]]:
+    """Changes for a spec pair computed earlier by the current engine version and rule plan, or None."""
+    key = _key(old_spec_hash, new_spec_hash, plan)
+    rows = _memory_cache.get(key)
+    if rows is None:
+        result = await db.execute(select(DiffCacheEntry.changes).where(
+            DiffCacheEntry.old_spec_hash == old_spec_hash,
+            DiffCacheEntry.new_spec_hash == new_spec_hash,
+            DiffCacheEntry.engine_version == key[2]
+        ))
+        rows = result.scalars().first()
+        if rows is None:
+            return None
+        _memory_cache.put(key, rows)
+    return deserialize_changes(rows)
+
+
+async def get_cached_diffs(db: AsyncSession, pairs: Sequence[Tuple[str, str]], plan: RulePlan) -> List[Optional[List[Change]]]:
+    """get_cached_diff() for several (old hash, new hash) pairs, with one query for the memory misses."""
+    keys = [_key(old_spec_hash, new_spec_hash, plan) for old_spec_hash, new_spec_hash in pairs]
+    found = {key: _memory_cache.get(key) for key in keys}
+    missing = [key for key, rows in found.items() if rows is None]
+    if missing:
+        result = await db.execute(select(
+            DiffCacheEntry.old_spec_hash, DiffCacheEntry.new_spec_hash, DiffCacheEntry.changes
+        ).where(
+            tuple_(DiffCacheEntry.old_spec_hash, DiffCacheEntry.new_spec_hash).in_([key[:2] for key in missing]),
+            DiffCacheEntry.engine_version == result_version(plan)
+        ))
+        for old_spec_hash, new_spec_hash, rows in result.all():
+            key = _key(old_spec_hash, new_spec_hash, plan)
+            found[key] = rows
+            _memory_cache.put(key, rows)
+    return [deserialize_changes(found[key]) if found[key] is not None else None for key in keys]
+
+
+async def store_diff(db: AsyncSession, old_spec_hash: str, new_spec_hash: str, plan: RulePlan, changes: List[Change]):
+    """
+    Record a computed diff. Joins the caller's transaction; concurrent runs on
+    the same pair are harmless (first writer wins).
+    """
+    rows = serialize_changes(changes)
+    key = _key(old_spec_hash, new_spec_hash, plan)
+    _memory_cache.put(key, rows)
+    stmt = insert(DiffCacheEntry).values(
+        old_spec_hash=old_spec_hash,
+        new_spec_hash=new_spec_hash,
+        engine_version=key[2],
+        change_count=len(rows),
+        changes=rows
+    ).on_conflict_do_nothing(constraint='uq_diff_cache_key')
+    await db.execute(stmt)
@@ -0,0 +1,228 @@
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+from uuid import UUID
+
+from sqlalchemy import Float, and_, cast, func, literal, or_, true, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.models.analysis import AnalysisJob, JobStatus
+from app.models.organization import Organization
+
+# Job kinds, see app.services.analysis_runner.handle_analysis_job
+JOB_ANALYSIS_RUN = "analysis_run"
+JOB_ANALYSIS_BATCH = "analysis_batch"
+JOB_VERSION_DELTA = "version_delta"
+JOB_AUTO_ANALYSIS = "auto_analysis"
+
+# Leases and backoff use the database clock, so workers on different hosts agree
+_NOW = func.timezone("utc", func.now())
+
+
+class ClaimedJob(NamedTuple):
+    id: UUID
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int  # including the current one
+
+
+def enqueue_job(db: AsyncSession, kind: str, payload: Dict[str, Any], organization_id: Optional[UUID] = None,
+                delay_seconds: float = 0) -> AnalysisJob:
+    """
+    Queue a job for `organization_id`, whose limits and weight apply to it
+    (see claim_jobs), due in `delay_seconds`. Joins the caller's transaction:
+    the job exists once the caller commits, together with the rows it refers
+    to (e.g. its run).
+    """
+    run_after = _NOW + timedelta(seconds=delay_seconds) if delay_seconds else _NOW
+    job = AnalysisJob(kind=kind, payload=payload, organization_id=organization_id,
+                      status=JobStatus.QUEUED, attempts=0, run_after=run_after)
+    db.add(job)
+    return job
+
+
+def _claimable():
+    """Due queued jobs, and running jobs whose worker let the lease expire (it died or hung)"""
+    return or_(
+        and_(AnalysisJob.status == JobStatus.QUEUED, AnalysisJob.run_after <= _NOW),
+        and_(AnalysisJob.status == JobStatus.RUNNING, AnalysisJob.leased_until < _NOW)
+    )
+
+
+async def claim_jobs(db: AsyncSession, worker_id: str, limit: int) -> List[ClaimedJob]:
+    """
+    Lease up to `limit` jobs for `worker_id` (commits): due queued jobs, and
+    running jobs whose worker let the lease expire (it died or hung). Rows
+    other workers are claiming are skipped, not waited for.
+
+    Organizations share the workers by weight, not by arrival order. Each
+    organization offers only its oldest due jobs up to its free slots
+    (analysis_max_running, else ANALYSIS_ORG_MAX_RUNNING, minus the jobs it has
+    running), read off ix_analysis_jobs_organization_status_run_after, so a
+    claim costs the same however deep one organization's backlog is. A
+    candidate's turn is (jobs of its organization running + its rank) / weight:
+    the first job of an idle organization goes before the tenth of a busy one,
+    whatever their ages. Expired leases and jobs queued without an
+    organization go first. Claims running at the same instant may each take
+    an organization's last free slot, so limits can be exceeded briefly.
+    """
+    running = select(func.count()).where(
+        AnalysisJob.organization_id == Organization.id,
+        AnalysisJob.status == JobStatus.RUNNING,
+        AnalysisJob.leased_until >= _NOW
+    ).correlate(Organization).scalar_subquery()
+    orgs = select(
+        Organization.id.label("organization_id"),
+        running.label("running"),
+        func.coalesce(Organization.analysis_max_running, settings.ANALYSIS_ORG_MAX_RUNNING).label("max_running"),
+        func.coalesce(Organization.analysis_weight, 1).label("weight")
+    ).subquery("orgs")
+
+    queued = aliased(AnalysisJob)
+    oldest = select(queued.id, queued.run_after).where(
+        queued.organization_id == orgs.c.organization_id,
+        queued.status == JobStatus.QUEUED,
+        queued.run_after <= _NOW
+    ).order_by(queued.run_after).limit(
+        func.least(func.greatest(orgs.c.max_running - orgs.c.running, 0), limit)
+    ).lateral("oldest")
+
+    fair = select(
+        oldest.c.id, orgs.c.organization_id, oldest.c.run_after, orgs.c.running, orgs.c.weight,
+        literal(1).label("priority")
+    ).select_from(orgs.join(oldest, true()))
+    # Few rows: running jobs are bounded by the workers, unowned jobs predate fair scheduling
+    unscoped = select(
+        AnalysisJob.id, AnalysisJob.organization_id, AnalysisJob.run_after, literal(0), literal(1), literal(0)
+    ).where(or_(
+        and_(AnalysisJob.status == JobStatus.RUNNING, AnalysisJob.leased_until < _NOW),
+        and_(AnalysisJob.status == JobStatus.QUEUED, AnalysisJob.run_after <= _NOW, AnalysisJob.organization_id.is_(None))
+    )).limit(limit)
+    candidates = union_all(fair, unscoped).subquery("candidates")
+
+    rank = func.row_number().over(partition_by=candidates.c.organization_id, order_by=candidates.c.run_after)
+    ranked = select(
+        candidates.c.id,
+        candidates.c.priority,
+        candidates.c.run_after,
+        (cast(candidates.c.running + rank, Float) / candidates.c.weight).label("turn")
+    ).subquery("ranked")
+    picked = select(ranked.c.id).order_by(ranked.c.priority, ranked.c.turn, ranked.c.run_after).limit(limit)
+
+    # Locked and checked again: another worker may have claimed a candidate meanwhile
+    claimable = select(AnalysisJob.id).where(
+        AnalysisJob.id.in_(picked.scalar_subquery()), _claimable()
+    ).with_for_update(skip_locked=True)
+
+    stmt = update(AnalysisJob).where(AnalysisJob.id.in_(claimable.scalar_subquery())).values(
+        status=JobStatus.RUNNING,
+        attempts=AnalysisJob.attempts + 1,
+        leased_until=_NOW + timedelta(seconds=settings.ANALYSIS_JOB_LEASE_SECONDS),
+        worker_id=worker_id,
+        updated_at=_NOW
+    ).returning(
+        AnalysisJob.id, AnalysisJob.kind, AnalysisJob.payload, AnalysisJob.attempts
+    ).execution_options(synchronize_session=False)
+    result = await db.execute(stmt)
+    jobs = [ClaimedJob(*row) for row in result.all()]
+    await db.commit()
+    return jobs
+
+
+async def extend_leases(db: AsyncSession, job_ids: Iterable[UUID], worker_id: str) -> Set[UUID]:
+    """Renew the leases of jobs held by `worker_id` (commits). Returns the jobs still leased to it."""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return set()
+    result = await db.execute(update(AnalysisJob).where(
+        AnalysisJob.id.in_(job_ids),
+        AnalysisJob.worker_id == worker_id,
+        AnalysisJob.status == JobStatus.RUNNING
+    ).values(
+        leased_until=_NOW + timedelta(seconds=settings.ANALYSIS_JOB_LEASE_SECONDS),
+        updated_at=_NOW
+    ).returning(AnalysisJob.id).execution_options(synchronize_session=False))
+    held = set(result.scalars().all())
+    await db.commit()
+    return held
+
+
+async def release_jobs(db: AsyncSession, job_ids: Iterable[UUID], worker_id: str):
+    """
+    Hand jobs held by `worker_id` back to the queue (commits), due at once.
+    For jobs it claimed but did not finish, e.g. when shutting down: the
+    attempt is not counted.
+    """
+    job_ids = list(job_ids)
+    if not job_ids:
+        return
+    await db.execute(update(AnalysisJob).where(
+        AnalysisJob.id.in_(job_ids),
+        AnalysisJob.worker_id == worker_id,
+        AnalysisJob.status == JobStatus.RUNNING
+    ).values(
+        status=JobStatus.QUEUED,
+        attempts=AnalysisJob.attempts - 1,
+        run_after=_NOW,
+        leased_until=None,
+        worker_id=None,
+        updated_at=_NOW
+    ).execution_options(synchronize_session=False))
+    await db.commit()
+
+
+async def complete_job(db: AsyncSession, job_id: UUID, worker_id: str) -> bool:
+    """Mark a job done (commits). False if it is no longer leased to `worker_id`, whose result then does not count."""
+    result = await db.execute(update(AnalysisJob).where(
+        AnalysisJob.id == job_id,
+        AnalysisJob.worker_id == worker_id,
+        AnalysisJob.status == JobStatus.RUNNING
+    ).values(
+        status=JobStatus.DONE, leased_until=None, updated_at=_NOW
+    ).execution_options(synchronize_session=False))
+    await db.commit()
+    return result.rowcount > 0
+
+
+async def fail_job(db: AsyncSession, job: ClaimedJob, worker_id: str, error: str) -> Optional[bool]:
+    """
+    Record a failed attempt (commits). The job is queued again after an
+    exponential backoff while it has attempts left; returns whether it was.
+    None if the job is no longer leased to `worker_id`: its new owner decides.
+    """
+    retry = job.attempts < settings.ANALYSIS_JOB_MAX_ATTEMPTS
+    values = dict(leased_until=None, last_error=error, updated_at=_NOW)
+    if retry:
+        backoff = settings.ANALYSIS_JOB_RETRY_SECONDS * 2 ** (job.attempts - 1)
+        values.update(status=JobStatus.QUEUED, run_after=_NOW + timedelta(seconds=backoff))
+    else:
+        values.update(status=JobStatus.FAILED)
+    result = await db.execute(update(AnalysisJob).where(
+        AnalysisJob.id == job.id,
+        AnalysisJob.worker_id == worker_id,
+        AnalysisJob.status == JobStatus.RUNNING
+    ).values(**values).execution_options(synchronize_session=False))
+    await db.commit()
+    if result.rowcount == 0:
+        return None
+    return retry
+
+
+async def queue_stats(db: AsyncSession) -> Dict[str, Any]:
+    """Queue depth: jobs waiting and running, expired leases and the age of the oldest due job."""
+    result = await db.execute(select(
+        func.count().filter(AnalysisJob.status == JobStatus.QUEUED),
+        func.count().filter(AnalysisJob.status == JobStatus.RUNNING),
+        func.count().filter(and_(AnalysisJob.status == JobStatus.RUNNING, AnalysisJob.leased_until < _NOW)),
+        func.min(AnalysisJob.run_after).filter(and_(AnalysisJob.status == JobStatus.QUEUED, AnalysisJob.run_after <= _NOW)),
+        _NOW
+    ).where(AnalysisJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])))
+    queued, running, expired, oldest_due, now = result.first()
+    return {
+        "queued": queued,
+        "running": running,
+        "expired_leases": expired,
+        "oldest_queued_seconds": (now - oldest_due).total_seconds() if oldest_due else 0.0
+    }
@@ -0,0 +1,66 @@
+from typing import Any, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.diff_compose import Composition, compose_deltas, diff_path_order
+from app.core.diff_rules import RulePlan
+from app.core.fingerprint import usable_fingerprints
+from app.models.service import ApiSpecVersion
+from app.services.diff_cache import get_cached_diffs
+
+
+async def version_chain(db: AsyncSession, old_spec: ApiSpecVersion, new_spec: ApiSpecVersion) -> Optional[List[Any]]:
+    """
+    The uploads leading from `old_spec` to `new_spec` (both included, oldest
+    first) as (id, parent_spec_id, spec_hash) rows, following parent links back
+    from `new_spec`. Deleted versions on the way count too, their deltas still
+    describe the documents. None if `old_spec` is not an ancestor within
+    VERSION_CHAIN_MAX_STEPS.
+    """
+    result = await db.execute(select(
+        ApiSpecVersion.id, ApiSpecVersion.parent_spec_id, ApiSpecVersion.spec_hash
+    ).where(ApiSpecVersion.service_id == new_spec.service_id))
+    rows = {row.id: row for row in result.all()}
+
+    chain = []
+    current = rows.get(new_spec.id)
+    while current is not None and len(chain) <= settings.VERSION_CHAIN_MAX_STEPS:
+        chain.append(current)
+        if current.id == old_spec.id:
+            return chain[::-1]
+        current = rows.get(current.parent_spec_id)
+    return None
+
+
+async def compose_from_chain(db: AsyncSession, old_spec: ApiSpecVersion, new_spec: ApiSpecVersion, plan: RulePlan) -> Optional[Composition]:
+    """
+    The diff between two versions of a service composed from the stored diffs
+    of the consecutive versions in between (see diff_compose.compose_deltas),
+    or None if they are not two or more steps apart on one chain, a step was
+    not diffed (with this rule plan) yet, or either end has no usable
+    fingerprints to take the direct diff's path order from.
+    """
+    chain = await version_chain(db, old_spec, new_spec)
+    if chain is None or len(chain) < 3:
+        return None
+
+    deltas = await get_cached_diffs(db, [(a.spec_hash, b.spec_hash) for a, b in zip(chain, chain[1:])], plan)
+    if any(delta is None for delta in deltas):
+        return None
+
+    result = await db.execute(select(ApiSpecVersion.id, ApiSpecVersion.path_delta).where(
+        ApiSpecVersion.id.in_([row.id for row in chain[1:]])
+    ))
+    path_deltas = dict(result.all())
+
+    result = await db.execute(select(ApiSpecVersion.id, ApiSpecVersion.fingerprints).where(
+        ApiSpecVersion.id.in_([old_spec.id, new_spec.id])
+    ))
+    fingerprints = {spec_id: usable_fingerprints(fp) for spec_id, fp in result.all()}
+    old_fp, new_fp = fingerprints.get(old_spec.id), fingerprints.get(new_spec.id)
+    if old_fp is None or new_fp is None:
+        return None
+    order = diff_path_order(old_fp["paths"], new_fp["paths"])
+    return compose_deltas([path_deltas.get(row.id) for row in chain[1:]], deltas, order)
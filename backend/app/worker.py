@@ -0,0 +1,194 @@
+"""
+Analysis worker: `python -m app.worker [--concurrency N] [--cpu-workers N] [--prefetch N]`
+
+Runs the jobs queued in analysis_jobs (see app.services.job_queue), up to
+`--concurrency` at a time (ANALYSIS_WORKER_CONCURRENCY), with diffs in a pool
+of `--cpu-workers` processes (DIFF_PROCESS_WORKERS). Up to `--prefetch` jobs
+(ANALYSIS_WORKER_PREFETCH) are claimed ahead of free slots, so a finished job
+is replaced without waiting for the database. Leases of running and
+prefetched jobs are renewed together.
+
+Only the engine, models and database layer are imported, not the API. Scale
+it independently of the API; any number of workers can share the queue.
+
+SIGTERM / SIGINT stop claiming and hand prefetched jobs back to the queue.
+Jobs in flight get ANALYSIS_WORKER_DRAIN_SECONDS to finish; the rest are
+cancelled and handed back too, without counting the attempt.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import traceback
+from collections import deque
+from typing import Deque, Dict, Iterable
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.diff_executor import shutdown_diff_executor
+from app.services.analysis_runner import abandon_analysis_job, handle_analysis_job
+from app.services.job_queue import ClaimedJob, claim_jobs, complete_job, extend_leases, fail_job, release_jobs
+
+
+class Worker:
+
+    def __init__(self, concurrency: int, prefetch: int = 0, drain_seconds: float = 0):
+        self.id = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.prefetch = prefetch
+        self.drain_seconds = drain_seconds
+        self.running: Dict[asyncio.Task, ClaimedJob] = {}
+        self.buffered: Deque[ClaimedJob] = deque()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+
+    def stop(self):
+        print(f"Worker {self.id}: stopping, {len(self.running)} jobs in flight, {len(self.buffered)} prefetched")
+        self._stopping = True
+        self._wakeup.set()
+
+    async def run(self):
+        print(f"Worker {self.id}: started, concurrency {self.concurrency}, prefetch {self.prefetch}, "
+              f"{settings.DIFF_PROCESS_WORKERS} diff processes")
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            while not self._stopping:
+                self._wakeup.clear()
+                while self.buffered and len(self.running) < self.concurrency:
+                    self._start(self.buffered.popleft())
+
+                wanted = self.concurrency + self.prefetch - len(self.running) - len(self.buffered)
+                jobs = []
+                if wanted > 0:
+                    try:
+                        async with AsyncSessionLocal() as db:
+                            jobs = await claim_jobs(db, self.id, wanted)
+                    except Exception as e:
+                        print(f"Worker {self.id}: claiming jobs failed: {e}")
+                if jobs:
+                    self.buffered.extend(jobs)
+                    continue
+                # Nothing due or no room: wait for a slot, the next poll or stop
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.ANALYSIS_WORKER_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+            await self._drain()
+        finally:
+            heartbeat.cancel()
+        print(f"Worker {self.id}: stopped")
+
+    async def _drain(self):
+        prefetched = [job.id for job in self.buffered]
+        self.buffered.clear()
+        await self._release(prefetched)
+
+        if not self.running:
+            return
+        done, pending = await asyncio.wait(set(self.running), timeout=self.drain_seconds)
+        if not pending:
+            return
+        print(f"Worker {self.id}: {len(pending)} jobs still running after {self.drain_seconds}s, handing them back")
+        unfinished = [self.running[task].id for task in pending]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await self._release(unfinished)
+
+    async def _release(self, job_ids: Iterable[UUID]):
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await release_jobs(db, job_ids, self.id)
+        except Exception as e:
+            # Their leases expire and other workers claim them again
+            print(f"Worker {self.id}: handing back {len(job_ids)} jobs failed: {e}")
+
+    def _start(self, job: ClaimedJob):
+        task = asyncio.create_task(self._execute(job))
+        self.running[task] = job
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self.running.pop(task, None)
+        self._wakeup.set()
+
+    async def _execute(self, job: ClaimedJob):
+        print(f"Worker {self.id}: job {job.id} ({job.kind}), attempt {job.attempts}")
+        try:
+            if job.attempts > settings.ANALYSIS_JOB_MAX_ATTEMPTS:
+                # Claimed again after its workers kept dying (expired leases)
+                raise RuntimeError(f"Abandoned after {job.attempts - 1} attempts")
+            await handle_analysis_job(job.kind, job.payload)
+        except Exception as e:
+            traceback.print_exc()
+            await self._failed(job, str(e) or type(e).__name__)
+        else:
+            async with AsyncSessionLocal() as db:
+                if not await complete_job(db, job.id, self.id):
+                    print(f"Worker {self.id}: job {job.id} finished after losing its lease")
+
+    async def _failed(self, job: ClaimedJob, error: str):
+        async with AsyncSessionLocal() as db:
+            retry = await fail_job(db, job, self.id, error)
+        if retry is False:
+            await abandon_analysis_job(job.kind, job.payload, error)
+
+    async def _heartbeat(self):
+        """Renew the leases of every job held, running or prefetched, in one statement"""
+        interval = settings.ANALYSIS_JOB_LEASE_SECONDS / 3
+        while True:
+            await asyncio.sleep(interval)
+            held = {job.id for job in self.running.values()} | {job.id for job in self.buffered}
+            try:
+                async with AsyncSessionLocal() as db:
+                    kept = await extend_leases(db, held, self.id)
+            except Exception as e:
+                print(f"Worker {self.id}: renewing leases failed: {e}")
+                continue
+            lost = held - kept
+            if lost:
+                print(f"Worker {self.id}: lost the lease of jobs {', '.join(map(str, lost))}")
+                # Another worker may own them now: prefetched ones are dropped, running ones cancelled
+                self.buffered = deque(job for job in self.buffered if job.id not in lost)
+                for task, job in list(self.running.items()):
+                    if job.id in lost:
+                        task.cancel()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.worker", description="Run queued analysis jobs.")
+    parser.add_argument("--concurrency", type=int, default=settings.ANALYSIS_WORKER_CONCURRENCY,
+                        help="jobs run at a time (default: %(default)s)")
+    parser.add_argument("--cpu-workers", type=int, default=settings.DIFF_PROCESS_WORKERS,
+                        help="size of the diff process pool (default: %(default)s)")
+    parser.add_argument("--prefetch", type=int, default=settings.ANALYSIS_WORKER_PREFETCH,
+                        help="jobs claimed ahead of free slots (default: %(default)s)")
+    parser.add_argument("--drain-seconds", type=float, default=settings.ANALYSIS_WORKER_DRAIN_SECONDS,
+                        help="on SIGTERM, time given to jobs in flight (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.cpu_workers < 1 or args.prefetch < 0 or args.drain_seconds < 0:
+        parser.error("--concurrency and --cpu-workers must be positive, --prefetch and --drain-seconds not negative")
+    return args
+
+
+async def main(args: argparse.Namespace):
+    # The diff process pool is created on first use, so this sizes it
+    settings.DIFF_PROCESS_WORKERS = args.cpu_workers
+    worker = Worker(args.concurrency, args.prefetch, args.drain_seconds)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        shutdown_diff_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -3,6 +3,8 @@ Comprehensive test script for DiffEngine detection enhancements
 Tests all scenarios from the user's test matrix
 """
 
+import copy
+
 from app.core.diff_engine import DiffEngine
 
 def test_parameter_removal():
@@ -240,6 +242,667 @@ def test_response_type_change():
     assert any("type changed" in c['description'].lower() and "count" in c['description'].lower() for c in changes), "Response type change not detected!"
     print("✅ PASS")
 
+def test_shared_component_ref():
+    print("\n=== Test: Shared $ref Component ===")
+    def make_spec(user_props):
+        ref_response = {
+            "200": {
+                "content": {
+                    "application/json": {
+                        "schema": {"$ref": "#/components/schemas/User"}
+                    }
+                }
+            }
+        }
+        return {
+            "paths": {
+                "/users": {"get": {"responses": ref_response}},
+                "/users/{id}": {"get": {"responses": ref_response}},
+                "/teams": {"get": {"responses": {"200": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Team"}}}}}}}
+            },
+            "components": {
+                "schemas": {
+                    "User": {"properties": user_props},
+                    "Team": {"properties": {"name": {"type": "string"}}}
+                }
+            }
+        }
+
+    old_spec = make_spec({"id": {"type": "string"}, "email": {"type": "string"}})
+    new_spec = make_spec({"id": {"type": "string"}})
+
+    engine = DiffEngine()
+    changes = engine.compute_diff(old_spec, new_spec)
+
+    print(f"Found {len(changes)} changes:")
+    for c in changes:
+        print(f"  - {c['severity']}/{c['change_type']}: {c['path']} {c['description']}")
+
+    removed = [c for c in changes if "email" in c['description'] and "removed" in c['description'].lower()]
+    assert {c['path'] for c in removed} == {"/users", "/users/{id}"}, "Shared component change not fanned out!"
+    assert not any(c['path'] == "/teams" for c in changes), "Unchanged component reported changes!"
+    assert list(engine._schema_cache) == [("#/components/schemas/User", "#/components/schemas/User", True)], "Component pair was compared more than once!"
+    print("✅ PASS")
+
+def test_nested_and_recursive_schema():
+    print("\n=== Test: Nested & Recursive Schemas ===")
+    def make_spec(city_type, node_props):
+        return {
+            "paths": {
+                "/tree": {
+                    "post": {
+                        "requestBody": {
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "type": "object",
+                                        "properties": {
+                                            "address": {
+                                                "type": "object",
+                                                "properties": {"city": {"type": city_type}}
+                                            },
+                                            "root": {"$ref": "#/components/schemas/Node"}
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+            "components": {
+                "schemas": {
+                    "Node": {
+                        "type": "object",
+                        "properties": node_props
+                    }
+                }
+            }
+        }
+
+    children = {"type": "array", "items": {"$ref": "#/components/schemas/Node"}}
+    old_spec = make_spec("string", {"label": {"type": "string"}, "children": children})
+    new_spec = make_spec("integer", {"children": children})
+
+    engine = DiffEngine()
+    changes = engine.compute_diff(old_spec, new_spec)
+
+    print(f"Found {len(changes)} changes:")
+    for c in changes:
+        print(f"  - {c['severity']}/{c['change_type']}: {c['description']} @ {c['location']}")
+
+    assert any(
+        "address.city" in c['description'] and "type changed" in c['description']
+        and c['location'].endswith("/schema/properties/address/properties/city")
+        for c in changes
+    ), "Nested type change not detected!"
+    assert any(
+        "root.label" in c['description'] and "removed" in c['description'].lower()
+        for c in changes
+    ), "Change inside recursive schema not detected!"
+    print("✅ PASS")
+
+def test_fingerprint_skip():
+    print("\n=== Test: Fingerprint Subtree Skipping ===")
+    from app.core.fingerprint import compute_fingerprints
+
+    def make_spec(order_props):
+        paths = {
+            f"/items/{i}": {"get": {"parameters": [{"name": "q", "in": "query", "schema": {"type": "string"}}]}}
+            for i in range(50)
+        }
+        paths["/orders"] = {
+            "get": {"responses": {"200": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Order"}}}}}}
+        }
+        return {"paths": paths, "components": {"schemas": {"Order": {"properties": order_props}}}}
+
+    old_spec = make_spec({"id": {"type": "string"}, "total": {"type": "number"}})
+    new_spec = make_spec({"id": {"type": "string"}})
+    old_fp = compute_fingerprints(old_spec)
+    new_fp = compute_fingerprints(new_spec)
+
+    # Only the operation using the changed component has a different hash
+    changed_paths = [p for p in old_fp["paths"] if old_fp["paths"][p]["hash"] != new_fp["paths"][p]["hash"]]
+    assert changed_paths == ["/orders"], f"Unexpected changed paths: {changed_paths}"
+
+    full = DiffEngine().compute_diff(old_spec, new_spec)
+    fast = DiffEngine().compute_diff(old_spec, new_spec, old_fp, new_fp)
+    print(f"Found {len(fast)} changes:")
+    for c in fast:
+        print(f"  - {c['severity']}/{c['change_type']}: {c['description']}")
+
+    assert fast == full, "Fingerprint-guided diff differs from full diff!"
+    assert DiffEngine().compute_diff(old_spec, old_spec, old_fp, compute_fingerprints(old_spec)) == [], "Identical specs reported changes!"
+    print("✅ PASS")
+
+def test_index_only_diff():
+    print("\n=== Test: Diff From Flattened Index ===")
+    from app.core.fingerprint import compute_fingerprints, body_sections_changed
+    from app.core.spec_index import build_spec_index, SpecIndex
+
+    old_spec = {
+        "paths": {
+            "/users": {
+                "get": {
+                    "parameters": [
+                        {"$ref": "#/components/parameters/Limit"},
+                        {"name": "q", "in": "query", "schema": {"type": "string"}}
+                    ],
+                    "responses": {"200": {"content": {"application/json": {"schema": {"properties": {"id": {"type": "string"}}}}}}}
+                },
+                "delete": {}
+            }
+        },
+        "components": {"parameters": {"Limit": {"name": "limit", "in": "query", "schema": {"type": "integer"}}}}
+    }
+    new_spec = copy.deepcopy(old_spec)
+    new_spec["paths"]["/users"]["get"]["parameters"][1]["required"] = True
+    new_spec["components"]["parameters"]["Limit"]["schema"]["type"] = "string"
+    del new_spec["paths"]["/users"]["delete"]
+
+    old_fp, new_fp = compute_fingerprints(old_spec), compute_fingerprints(new_spec)
+    old_index = SpecIndex.from_stored(build_spec_index(old_spec, old_fp))
+    new_index = SpecIndex.from_stored(build_spec_index(new_spec, new_fp))
+    assert not body_sections_changed(old_fp, new_fp), "Only parameters changed, raw specs should not be needed!"
+
+    full = DiffEngine().compute_diff(old_spec, new_spec)
+    indexed = DiffEngine().compute_diff(None, None, old_fp, new_fp, old_index, new_index)
+    print(f"Found {len(indexed)} changes:")
+    for c in indexed:
+        print(f"  - {c['severity']}/{c['change_type']}: {c['description']}")
+
+    assert sorted(map(str, indexed)) == sorted(map(str, full)), "Index-based diff differs from raw diff!"
+    assert len(indexed) == 3, "Expected type change, now-required and operation removal!"
+
+    # Null sections the engine tolerates must not fail the upload either
+    sloppy = {"paths": {"/users": {
+        "get": {"parameters": None, "responses": {"200": {"content": None}}},
+        "post": {
+            "parameters": ["limit", {"name": "q", "in": "query"}],
+            "requestBody": {"content": {"application/json": None}},
+            "responses": {"200": {"content": {"application/json": {"schema": {"required": None, "properties": {}}}}}}
+        }
+    }}}
+    rows = SpecIndex.from_stored(build_spec_index(sloppy, compute_fingerprints(sloppy))).rows
+    assert [(row.kind, row.method, row.name) for row in rows] == [
+        ("operation", "get", None), ("operation", "post", None), ("parameter", "post", "q")
+    ], "Unexpected rows for a spec with null sections!"
+    print("✅ PASS")
+
+def test_sharded_diff_matches_serial():
+    print("\n=== Test: Sharded Diff == Serial Diff ===")
+    from app.core.fingerprint import compute_fingerprints
+
+    def make_spec(n, typ):
+        return {"paths": {
+            f"/r{i}": {
+                "get": {"parameters": [{"name": "id", "in": "query", "schema": {"type": typ if i % 3 == 0 else "string"}}]},
+                "post": {}
+            } for i in range(n)
+        }}
+
+    old_spec = make_spec(40, "string")
+    new_spec = make_spec(45, "integer")
+    del new_spec["paths"]["/r7"]
+
+    serial = DiffEngine().compute_diff(old_spec, new_spec)
+    sharded = []
+    for i in range(4):
+        sharded.extend(DiffEngine().compute_diff(old_spec, new_spec, shard=(i, 4), include_added=(i == 3)))
+
+    print(f"Serial: {len(serial)} changes, sharded over 4 shards: {len(sharded)} changes")
+    assert sharded == serial, "Sharded output differs from serial output!"
+
+    # Malformed path items are in the raw spec but not in its fingerprints, whose
+    # path count sizes the shards: the paths after them must still be compared
+    old_spec["paths"] = dict({"/broken": None}, **old_spec["paths"])
+    del new_spec["paths"]["/r39"]
+    path_count = len(compute_fingerprints(old_spec)["paths"])
+    serial = DiffEngine().compute_diff(old_spec, new_spec)
+    for shards in (2, 3, path_count):
+        sharded = []
+        for i in range(shards):
+            sharded.extend(DiffEngine().compute_diff(old_spec, new_spec, shard=(i, shards), include_added=(i == shards - 1)))
+        assert sharded == serial, f"Sharded output over {shards} shards differs from serial output!"
+    assert any(change.path == "/r39" for change in serial), "Last path removal was lost!"
+
+    # Recursive components: each shard expands the cycles it reaches on its own
+    old_spec, new_spec = cyclic_spec("string"), cyclic_spec("integer")
+    serial = DiffEngine().compute_diff(old_spec, new_spec)
+    for shards in range(2, len(old_spec["paths"]) + 1):
+        sharded = []
+        for i in range(shards):
+            sharded.extend(DiffEngine().compute_diff(old_spec, new_spec, shard=(i, shards), include_added=(i == shards - 1)))
+        assert sharded == serial, f"Sharded output over {shards} shards differs from serial output on recursive schemas!"
+    print("✅ PASS")
+
+def test_streamed_diff_matches_serial():
+    print("\n=== Test: Streamed Diff == Serial Diff ===")
+    import asyncio
+    import json
+    from app.core.config import settings
+    from app.core.diff_executor import DiffRequest, stream_diff
+
+    old_spec, new_spec = cyclic_spec("string"), cyclic_spec("integer")
+    del new_spec["paths"]["/z"]
+    new_spec["paths"]["/new"] = old_spec["paths"]["/x"]
+    serial = DiffEngine().compute_diff(old_spec, new_spec)
+    request = DiffRequest(None, None, None, None, json.dumps(old_spec), json.dumps(new_spec))
+
+    async def collect(limit=None):
+        batches = []
+        async for changes, done in stream_diff(request, len(old_spec["paths"])):
+            batches.append((changes, done))
+            if len(batches) == limit:
+                break
+        return batches
+
+    executor, batch_paths = settings.DIFF_EXECUTOR, settings.DIFF_STREAM_BATCH_PATHS
+    settings.DIFF_EXECUTOR, settings.DIFF_STREAM_BATCH_PATHS = "thread", 2
+    try:
+        batches = asyncio.run(collect())
+        # The caller stops early: the rest is never yielded
+        assert len(asyncio.run(collect(limit=1))) == 1, "Stream went on after the caller stopped!"
+    finally:
+        settings.DIFF_EXECUTOR, settings.DIFF_STREAM_BATCH_PATHS = executor, batch_paths
+
+    print(f"Serial: {len(serial)} changes, streamed in {len(batches)} batches: {[len(changes) for changes, _ in batches]}")
+    assert len(batches) == 3, "Expected one batch per 2 paths of the old spec!"
+    assert [done for _, done in batches] == [1 / 3, 2 / 3, 1.0], "Share done not reported per batch!"
+    assert [change for changes, _ in batches for change in changes] == serial, "Streamed output differs from serial output!"
+    print("✅ PASS")
+
+def test_change_records_round_trip():
+    print("\n=== Test: Compact Change Records ===")
+    from app.core.diff_engine import serialize_changes, deserialize_changes
+    from app.models.analysis import ChangeType, Severity
+
+    old_spec = {"paths": {"/users": {"get": {"parameters": [{"name": "id", "in": "path", "required": True, "schema": {"type": "string"}}]}}}}
+    new_spec = {"paths": {"/users": {"get": {"parameters": [{"name": "id", "in": "path", "required": True, "schema": {"type": "integer"}}]}}}}
+
+    changes = DiffEngine().compute_diff(old_spec, new_spec)
+    for c in changes:
+        print(f"  - {c.rule} {c.params}: {c.description}")
+
+    assert not hasattr(changes[0], "__dict__"), "Change records should be slotted!"
+    assert changes[0].change_type == ChangeType.BREAKING and changes[0]['severity'] == Severity.HIGH
+    assert changes[0].description == "Parameter 'id' (in path) type changed from 'string' to 'integer'."
+
+    rows = serialize_changes(changes)
+    assert not any(changes[0].description in map(str, row) for row in rows), "Descriptions should not be serialized!"
+    assert deserialize_changes(rows) == changes, "Round trip changed the records!"
+    print("✅ PASS")
+
+def test_iter_diff_streams_and_stops_early():
+    print("\n=== Test: Streaming Diff ===")
+    from app.core.diff_engine import first_blocking_change
+
+    old_spec = {"paths": {f"/r{i}": {"get": {}} for i in range(50)}}
+    new_spec = copy.deepcopy(old_spec)
+    new_spec["paths"]["/added"] = {"get": {}}
+    for i in (3, 20, 40):
+        del new_spec["paths"][f"/r{i}"]
+
+    engine = DiffEngine()
+    assert list(engine.iter_diff(old_spec, new_spec)) == DiffEngine().compute_diff(old_spec, new_spec)
+
+    consumed = []
+    stream = engine.iter_diff(old_spec, new_spec)
+    blocking = first_blocking_change(consumed.append(c) or c for c in stream)
+    print(f"First blocking change after {len(consumed)} changes: {blocking.description}")
+    assert blocking.path == "/r3" and len(consumed) == 1, "Diff did not stop at the first blocking change!"
+    assert first_blocking_change(DiffEngine().iter_diff(old_spec, old_spec)) is None
+    print("✅ PASS")
+
+def test_swagger2_normalization():
+    print("\n=== Test: Swagger 2 Normalization ===")
+    from app.core.spec_normalizer import normalize_spec
+
+    def make_spec(id_type):
+        return {
+            "swagger": "2.0",
+            "host": "api.example.com",
+            "basePath": "/v1",
+            "paths": {
+                "/users": {
+                    "post": {
+                        "parameters": [
+                            {"name": "body", "in": "body", "required": True, "schema": {"$ref": "#/definitions/User"}},
+                            {"$ref": "#/parameters/Trace"}
+                        ],
+                        "responses": {"201": {"description": "Created", "schema": {"$ref": "#/definitions/User"}}}
+                    }
+                }
+            },
+            "parameters": {"Trace": {"name": "X-Trace", "in": "header", "type": "string"}},
+            "definitions": {"User": {"type": "object", "properties": {"id": {"type": id_type}, "name": {"type": "string"}}}}
+        }
+
+    old_spec = normalize_spec(make_spec("string"))
+    new_spec = normalize_spec(make_spec("integer"))
+    operation = old_spec["paths"]["/users"]["post"]
+
+    assert old_spec["servers"] == [{"url": "https://api.example.com/v1"}]
+    assert operation["requestBody"]["content"]["application/json"]["schema"] == {"$ref": "#/components/schemas/User"}
+    assert operation["parameters"] == [{"$ref": "#/components/parameters/Trace"}]
+    assert old_spec["components"]["parameters"]["Trace"]["schema"] == {"type": "string"}
+    assert normalize_spec(old_spec) is old_spec, "OpenAPI 3 documents should pass through unchanged!"
+
+    changes = DiffEngine().compute_diff(old_spec, new_spec)
+    for c in changes:
+        print(f"  - {c['severity']}/{c['change_type']}: {c['description']} @ {c['location']}")
+
+    assert {c['location'] for c in changes} == {
+        "/paths/~1users/post/requestBody/content/application~1json/schema/properties/id",
+        "/paths/~1users/post/responses/201/content/application~1json/schema/properties/id"
+    }, "Swagger 2 body and response schema changes not detected!"
+    print("✅ PASS")
+
+def test_all_response_codes_and_media_types():
+    print("\n=== Test: Response Codes, Media Types and Headers ===")
+    item = {"type": "object", "properties": {"id": {"type": "string"}}}
+    old_spec = {"paths": {"/items": {"post": {
+        "requestBody": {"content": {
+            "application/vnd.item+json": {"schema": item},
+            "multipart/form-data": {"schema": item},
+            "text/plain": {"schema": {"type": "string"}}
+        }},
+        "responses": {
+            "200": {"content": {"application/json": {"schema": item}},
+                    "headers": {"X-Rate-Limit": {"schema": {"type": "integer"}}}},
+            "404": {"description": "Not found"},
+            "default": {"content": {"application/problem+json": {"schema": {"type": "object", "properties": {"title": {"type": "string"}}}}}}
+        }
+    }}}}
+    new_spec = copy.deepcopy(old_spec)
+    operation = new_spec["paths"]["/items"]["post"]
+    del operation["requestBody"]["content"]["text/plain"]
+    operation["requestBody"]["content"]["multipart/form-data"]["schema"] = {"type": "object", "properties": {"id": {"type": "integer"}}}
+    operation["responses"]["2XX"] = operation["responses"].pop("200")
+    operation["responses"]["2XX"]["headers"]["x-rate-limit"] = operation["responses"]["2XX"]["headers"].pop("X-Rate-Limit")
+    operation["responses"]["2XX"]["headers"]["x-rate-limit"]["schema"]["type"] = "string"
+    del operation["responses"]["404"]
+    del operation["responses"]["default"]["content"]["application/problem+json"]["schema"]["properties"]["title"]
+
+    changes = DiffEngine().compute_diff(old_spec, new_spec)
+    for c in changes:
+        print(f"  - {c['severity']}/{c['change_type']}: {c['description']} @ {c['location']}")
+    found = {(c.rule, c['location'].split("/post/")[1]) for c in changes}
+
+    assert found == {
+        ("FIELD_TYPE_CHANGED", "requestBody/content/multipart~1form-data/schema/properties/id"),
+        ("REQUEST_MEDIA_TYPE_REMOVED", "requestBody/content/text~1plain"),
+        ("RESPONSE_HEADER_TYPE_CHANGED", "responses/2XX/headers/x-rate-limit"),
+        ("ERROR_RESPONSE_REMOVED", "responses/404"),
+        ("RESPONSE_FIELD_REMOVED", "responses/default/content/application~1problem+json/schema/properties/title"),
+    }, f"Unexpected changes: {found}"
+    print("✅ PASS")
+
+def test_rule_plan():
+    print("\n=== Test: Per-Organization Rule Plan ===")
+    from app.core.diff_engine import result_version
+    from app.core.diff_rules import compile_plan
+    from app.models.analysis import Severity
+
+    old_spec = {"paths": {"/users": {"get": {
+        "parameters": [{"name": "limit", "in": "query", "schema": {"type": "integer"}}],
+        "responses": {"200": {"content": {"application/json": {"schema": {
+            "type": "object", "properties": {"id": {"type": "string"}, "name": {"type": "string"}}
+        }}}}}
+    }}}}
+    new_spec = copy.deepcopy(old_spec)
+    operation = new_spec["paths"]["/users"]["get"]
+    operation["parameters"] = []
+    schema = operation["responses"]["200"]["content"]["application/json"]["schema"]
+    del schema["properties"]["name"]
+    schema["properties"]["email"] = {"type": "string"}
+
+    settings = {"disabled": ["OPTIONAL_FIELD_ADDED", "PARAMETER_REMOVED"], "severity": {"RESPONSE_FIELD_REMOVED": "MEDIUM"}}
+    plan = compile_plan(settings)
+    assert compile_plan(copy.deepcopy(settings)) is plan, "Plans should be compiled once per distinct settings!"
+    assert compile_plan().key == "" and plan.key and result_version(plan) != result_version(compile_plan())
+
+    everything = DiffEngine().compute_diff(old_spec, new_spec)
+    changes = DiffEngine(plan).compute_diff(old_spec, new_spec)
+    for c in changes:
+        print(f"  - {c['severity']}/{c['change_type']}: {c['description']}")
+
+    assert {c.rule for c in everything} == {"OPTIONAL_FIELD_ADDED", "PARAMETER_REMOVED", "RESPONSE_FIELD_REMOVED"}
+    assert [(c.rule, c.severity) for c in changes] == [("RESPONSE_FIELD_REMOVED", Severity.MEDIUM)]
+
+    try:
+        compile_plan({"disabled": ["NO_SUCH_RULE"]})
+        assert False, "Unknown rule accepted!"
+    except ValueError:
+        pass
+    print("✅ PASS")
+
+def test_batch_diff_matches_pairwise():
+    print("\n=== Test: Batch Diff Against One Base ===")
+    import json
+    from app.core.diff_executor import BatchDiffRequest, execute_batch_diff
+    from app.core.fingerprint import compute_fingerprints
+    from app.core.spec_index import build_spec_index
+
+    base = {"paths": {f"/r{i}": {"get": {"parameters": [{"name": "q", "in": "query", "schema": {"type": "string"}}]}} for i in range(30)}}
+    candidates = []
+    for n in range(4):
+        candidate = copy.deepcopy(base)
+        candidate["paths"][f"/r{n}"]["get"]["parameters"][0]["required"] = True
+        del candidate["paths"][f"/r{10 + n}"]
+        candidates.append(candidate)
+
+    pairwise = [DiffEngine().compute_diff(base, candidate) for candidate in candidates]
+    batched = DiffEngine().compute_batch(base, [(candidate, None, None) for candidate in candidates])
+    assert batched == pairwise, "Batch diff differs from pairwise diffs!"
+
+    def stored(spec):
+        fp = compute_fingerprints(spec)
+        return json.dumps(fp), json.dumps(build_spec_index(spec, fp))
+
+    base_fp, base_index = stored(base)
+    rows = execute_batch_diff(BatchDiffRequest(
+        base_fp, base_index, None, tuple(stored(candidate) + (None,) for candidate in candidates)
+    ))
+    print(f"{len(candidates)} candidates: {[len(r) for r in rows]} changes each")
+    from app.core.diff_engine import deserialize_changes
+    assert [deserialize_changes(r) for r in rows] == pairwise, "Index-only batch diff differs!"
+    print("✅ PASS")
+
+def test_composed_chain_diff_matches_direct():
+    print("\n=== Test: Version Chain Composition ===")
+    from app.core.diff_compose import compose_deltas, diff_path_order
+    from app.core.fingerprint import compute_fingerprints, path_delta
+
+    def op(param_type, fields=("id", "name")):
+        return {"get": {
+            "parameters": [{"name": "x", "in": "query", "schema": {"type": param_type}}],
+            "responses": {"200": {"description": "ok", "content": {"application/json": {"schema": {
+                "type": "object", "properties": {field: {"type": "string"} for field in fields}
+            }}}}}
+        }}
+
+    v0 = {"paths": {"/a": op("string"), "/b": op("string"), "/c": op("string"), "/e": op("string")}}
+    v1 = copy.deepcopy(v0)
+    v1["paths"]["/a"] = op("integer")            # /a changes twice and differs end to end
+    del v1["paths"]["/b"]                        # /b is removed and restored unchanged
+    v1["paths"]["/e"] = op("integer")            # /e changes and is changed back
+    v2 = copy.deepcopy(v1)
+    v2["paths"]["/a"] = op("boolean")
+    v2["paths"]["/d"] = op("string")             # added once
+    v2["paths"]["/e"] = op("string")
+    v3 = copy.deepcopy(v2)
+    v3["paths"]["/b"] = op("string")
+    v3["paths"]["/c"] = op("string", ("id",))    # changed once
+
+    chain = [v0, v1, v2, v3]
+    fps = [compute_fingerprints(spec) for spec in chain]
+    path_deltas = [path_delta(a, b) for a, b in zip(fps, fps[1:])]
+    deltas = [DiffEngine().compute_diff(a, b, fa, fb) for a, b, fa, fb in zip(chain, chain[1:], fps, fps[1:])]
+
+    def compose(chain):
+        fps = [compute_fingerprints(spec) for spec in chain]
+        path_deltas = [path_delta(a, b) for a, b in zip(fps, fps[1:])]
+        deltas = [DiffEngine().compute_diff(a, b, fa, fb) for a, b, fa, fb in zip(chain, chain[1:], fps, fps[1:])]
+        order = diff_path_order(fps[0]["paths"], fps[-1]["paths"])
+        return compose_deltas(path_deltas, deltas, order), path_deltas, deltas, order
+
+    composition, path_deltas, deltas, order = compose([v0, v1, v2, v3])
+    print(f"Composed paths: {sorted(composition.changes)}, ambiguous: {composition.ambiguous}")
+    assert composition.ambiguous == ["/a"], "Only /a needs a direct diff!"
+    restricted = DiffEngine().compute_diff(v0, v3, paths=composition.ambiguous)
+    assert {c.path for c in restricted} == {"/a"}, "Restricted diff left its paths!"
+
+    # Same changes in the same order as the direct diff
+    direct = DiffEngine().compute_diff(v0, v3)
+    assert composition.merge(restricted) == direct, "Composed diff differs from the direct diff!"
+
+    assert compose_deltas([path_deltas[0], None, path_deltas[2]], deltas, order) is None, "Missing path delta was ignored!"
+
+    # Recursive components, and a path added ahead of the others
+    c0 = cyclic_spec("string")
+    c1 = copy.deepcopy(c0)
+    c1["components"]["schemas"]["C"]["properties"]["t"] = {"type": "integer"}
+    c2 = copy.deepcopy(c1)
+    c2["components"]["schemas"]["Z"]["properties"]["w"] = {"type": "integer"}
+    c2["paths"] = dict({"/new": c2["paths"]["/x"]}, **c2["paths"])
+    composition, _, _, _ = compose([c0, c1, c2])
+    assert composition.changes and composition.ambiguous, "Chain should be settled in part by the steps!"
+    restricted = DiffEngine().compute_diff(c0, c2, paths=composition.ambiguous)
+    assert composition.merge(restricted) == DiffEngine().compute_diff(c0, c2), "Composed diff differs from the direct diff on recursive schemas!"
+    print("✅ PASS")
+
+def test_path_trie_routing():
+    print("\n=== Test: Path Template Routing ===")
+    from app.core.path_trie import PathTrie
+
+    trie = PathTrie(["/users", "/users/{id}", "/users/me", "/users/{id}/orders/{orderId}",
+                     "/a/{x}", "/{y}/b", "/files/{name}.{ext}"])
+    cases = {
+        "/users/123": ("/users/{id}",),
+        "/users/{userId}": ("/users/{id}",),           # parameter names are normalized
+        "/users/me": ("/users/me",),                   # literal before parameter
+        "/users/": ("/users",),
+        "/users/7/orders/{oid}": ("/users/{id}/orders/{orderId}",),
+        "/users/me/orders/9": ("/users/{id}/orders/{orderId}",),  # falls back to the parameter
+        "/a/b": ("/a/{x}",),                           # earlier segments decide first
+        "/z/b": ("/{y}/b",),
+        "/files/report.pdf": ("/files/{name}.{ext}",),
+        "/users/1/unknown": (),
+        "/orders": (),
+    }
+    for path, expected in cases.items():
+        print(f"  {path} -> {trie.match(path)}")
+        assert trie.match(path) == expected, f"{path} routed to {trie.match(path)}, expected {expected}"
+
+    renamed = PathTrie(["/users/{id}", "/users/{userId}"])
+    assert renamed.match("/users/1") == ("/users/{id}", "/users/{userId}"), "Renamed parameter templates not both matched!"
+    print("✅ PASS")
+
+def test_mutually_recursive_schemas_any_path_order():
+    print("\n=== Test: Mutually Recursive Schemas ===")
+    def spec(comment_fields):
+        def get(ref):
+            return {"get": {"responses": {"200": {"description": "ok", "content": {"application/json": {
+                "schema": {"$ref": ref}
+            }}}}}}
+        return {
+            "paths": {"/comments": get("#/components/schemas/Comment"), "/users": get("#/components/schemas/User")},
+            "components": {"schemas": {
+                "User": {"type": "object", "properties": {"latest": {"$ref": "#/components/schemas/Comment"}}},
+                "Comment": {"type": "object", "properties": dict(
+                    {"author": {"$ref": "#/components/schemas/User"}},
+                    **{field: {"type": "string"} for field in comment_fields}
+                )}
+            }}
+        }
+
+    old_spec, new_spec = spec(["text"]), spec([])
+    changes = DiffEngine().compute_diff(old_spec, new_spec)
+    for change in changes:
+        print(f"  {change.path}: {change.description}")
+    removals = {(change.path, change.location) for change in changes}
+    assert any(path == "/users" and "latest/properties/text" in location for path, location in removals), \
+        "Removal reached through the cycle from /users was lost!"
+
+    # Each path alone reports what the full diff reports for it
+    for path in ("/comments", "/users"):
+        alone = DiffEngine().compute_diff(old_spec, new_spec, paths=[path])
+        assert alone == [change for change in changes if change.path == path], f"{path} differs when diffed alone!"
+    print("✅ PASS")
+
+def cyclic_spec(field_type):
+    """X, Y, Z mutually recursive; A recursive with a nested self-recursive C. Leaf fields typed `field_type`."""
+    def ref(name):
+        return {"$ref": f"#/components/schemas/{name}"}
+    def get(name):
+        return {"get": {"responses": {"200": {"description": "ok", "content": {"application/json": {"schema": ref(name)}}}}}}
+    def obj(**props):
+        return {"type": "object", "properties": props}
+    return {
+        "paths": {f"/{name.lower()}": get(name) for name in ("X", "Y", "Z", "A", "C")},
+        "components": {"schemas": {
+            "X": obj(y=ref("Y"), v={"type": field_type}),
+            "Y": obj(x=ref("X"), z=ref("Z")),
+            "Z": obj(y=ref("Y"), w={"type": field_type}),
+            "A": obj(a=ref("A"), b={"type": "array", "items": obj(a=ref("A"), c=ref("C"))}),
+            "C": obj(c=ref("C"), x=ref("X"), t={"type": field_type})
+        }}
+    }
+
+def test_cyclic_schemas_path_independent():
+    print("\n=== Test: Cyclic Schemas Independent Of Path Order ===")
+    old_spec, new_spec = cyclic_spec("string"), cyclic_spec("integer")
+    changes = DiffEngine().compute_diff(old_spec, new_spec)
+    by_path = {}
+    for change in changes:
+        by_path.setdefault(change.path, []).append(change)
+    for path, found in by_path.items():
+        print(f"  {path}: {len(found)} changes")
+    y_fields = {change.location.split("/schema")[-1] for change in by_path["/y"]}
+    # Y is not expanded again below itself, whichever path reached X or Z first
+    assert y_fields == {"/properties/x/properties/v", "/properties/z/properties/w"}, f"Unexpected findings for /y: {y_fields}"
+
+    # Each path alone reports what the full diff reports for it, whatever was diffed before
+    for path in old_spec["paths"]:
+        alone = DiffEngine().compute_diff(old_spec, new_spec, paths=[path])
+        assert alone == by_path.get(path, []), f"{path} differs when diffed alone!"
+    # Same for the full diff with the paths in the opposite order
+    def reverse_paths(spec):
+        return dict(spec, paths=dict(reversed(list(spec["paths"].items()))))
+    for change in DiffEngine().compute_diff(reverse_paths(old_spec), reverse_paths(new_spec)):
+        assert change in by_path[change.path], f"{change.path} differs when the paths are diffed in another order!"
+        by_path[change.path].remove(change)
+    assert not any(by_path.values()), "Changes lost when the paths are diffed in another order!"
+    print("✅ PASS")
+
+def test_auto_analysis_debounce():
+    print("\n=== Test: Auto Analysis Debounce ===")
+    import uuid
+    from datetime import datetime, timedelta
+    from app.services.analysis_runner import debounce_base
+
+    window = timedelta(seconds=30)
+    t0 = datetime(2026, 1, 1)
+    v1, v2, v3, v4 = (uuid.uuid4() for _ in range(4))
+
+    def latest(*uploads):
+        # (id, seconds after t0), given oldest first; the runner reads newest first
+        return [(spec_id, t0 + timedelta(seconds=at)) for spec_id, at in reversed(uploads)]
+
+    assert debounce_base(v1, latest((v1, 0)), window) is None, "A single upload has nothing to compare with!"
+    assert debounce_base(v2, latest((v1, 0), (v2, 300)), window) == v1, "Upload after a quiet period not compared with the previous one!"
+    # v2, v3, v4 arrive 10s apart after a quiet period: one run, v1 -> v4
+    burst = latest((v1, 0), (v2, 300), (v3, 310), (v4, 320))
+    assert debounce_base(v4, burst, window) == v1, "Burst not compared with the spec before it!"
+    assert debounce_base(v3, burst, window) is None, "Superseded spec still queued a run!"
+    # A gap just over the window ends the burst
+    assert debounce_base(v3, latest((v1, 0), (v2, 10), (v3, 40.001)), window) == v2, "Gap over the window not respected!"
+    assert debounce_base(v3, latest((v1, 0), (v2, 10), (v3, 40)), window) == v1, "Gap of exactly the window split the burst!"
+    # The whole history is one burst: compared with the oldest spec given
+    assert debounce_base(v3, latest((v1, 0), (v2, 5), (v3, 10)), window) == v1, "History-long burst not compared with its first spec!"
+    print("✅ PASS")
+
 if __name__ == "__main__":
     print("=" * 60)
     print("DiffEngine Enhanced Detection Test Suite")
@@ -251,6 +914,23 @@ if __name__ == "__main__":
         test_response_field_removal()
         test_response_field_addition()
         test_response_type_change()
+        test_shared_component_ref()
+        test_nested_and_recursive_schema()
+        test_fingerprint_skip()
+        test_index_only_diff()
+        test_sharded_diff_matches_serial()
+        test_streamed_diff_matches_serial()
+        test_change_records_round_trip()
+        test_iter_diff_streams_and_stops_early()
+        test_swagger2_normalization()
+        test_all_response_codes_and_media_types()
+        test_rule_plan()
+        test_batch_diff_matches_pairwise()
+        test_composed_chain_diff_matches_direct()
+        test_path_trie_routing()
+        test_mutually_recursive_schemas_any_path_order()
+        test_cyclic_schemas_path_independent()
+        test_auto_analysis_debounce()
         
         print("\n" + "=" * 60)
         print("✅ ALL TESTS PASSED!")